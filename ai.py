@@ -0,0 +1,198 @@
+'''
+Autoplayer: picks where to put the current piece by trying every placement of it and of the
+preview piece and scoring the resulting boards.
+
+A placement is a distinct rotation of the piece (from the precompiled tables in pieces.py) at a
+column, rotated at the top and dropped straight down. Boards are scored from column surfaces
+(top occupied row of every column) and the number of holes. Both are computed once per search
+and updated from the columns the piece covers, so a candidate costs O(width); only candidates
+that complete rows rebuild their features from the row masks. Best values of the preview piece
+on a board are memoized in an LRU transposition cache keyed on the board rows.
+'''
+from collections import namedtuple, OrderedDict
+
+from pieces import PIECETABLES
+
+# Weights of the board features, from the well known hand-tuned linear evaluation
+# (aggregate height, completed lines, holes, bumpiness)
+Weights = namedtuple('Weights', 'height lines holes bumpiness')
+WEIGHTS = Weights(-0.510066, 0.760666, -0.35663, -0.184483)
+
+CACHESIZE = 20000   # Boards remembered by the transposition cache
+
+# rotation    - index into PieceTable.rotations
+# rowMasks    - rotation.rowMasks, for line clear checks
+# minDx       - first column of the piece relative to its origin
+# bottoms     - lowest dy of the piece in each of its columns (left to right)
+# tops        - highest dy of the piece in each of its columns
+PlacementShape = namedtuple('PlacementShape', 'rotation rowMasks minDx maxDx bottoms tops')
+
+# Where a piece should go: rotation index, x and y of its origin, and score of the result
+Placement = namedtuple('Placement', 'rotation x y value')
+
+def compilePlacementShapes(table):
+    shapes = []
+    seen = set()
+    for rotationIndex, rotation in enumerate(table.rotations):
+        # Rotations that differ only by an offset give the same placements
+        key = frozenset((dx - rotation.minDx, dy - rotation.minDy) for dx, dy in rotation.cells)
+        if key in seen:
+            continue
+        seen.add(key)
+        bottoms = tuple(bottom for column, bottom in rotation.columnBottoms)
+        tops = tuple(min(dy for dx, dy in rotation.cells if dx == column) for column, bottom in rotation.columnBottoms)
+        shapes.append(PlacementShape(rotationIndex, rotation.rowMasks, rotation.minDx, rotation.maxDx, bottoms, tops))
+    return tuple(shapes)
+
+# Indexed like PIECETABLES
+PLACEMENTSHAPES = tuple(compilePlacementShapes(table) for table in PIECETABLES)
+
+# Column surfaces (top occupied row, height for an empty column) and number of holes of a board
+def computeFeatures(rows, width, height):
+    surfaces = [height] * width
+    holes = 0
+    covered = 0
+    for y, mask in enumerate(rows):
+        newTops = mask & ~covered
+        while newTops:
+            lowBit = newTops & -newTops
+            surfaces[lowBit.bit_length() - 1] = y
+            newTops ^= lowBit
+        holes += bin(covered & ~mask).count('1')
+        covered |= mask
+    return surfaces, holes
+
+class TranspositionCache:
+    def __init__(self, maxSize=CACHESIZE):
+        self.maxSize = maxSize
+        self.values = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Stored value or None
+    def get(self, key):
+        value = self.values.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.values.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.values[key] = value
+        if len(self.values) > self.maxSize:
+            self.values.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.values.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self.values), 'hitRate': self.hits / lookups if lookups else 0.0}
+
+class Autoplayer:
+    def __init__(self, weights=WEIGHTS, cacheSize=CACHESIZE, usePreview=True):
+        self.weights = weights
+        self.usePreview = usePreview
+        self.cache = TranspositionCache(cacheSize) if cacheSize else None
+        # Placements scored so far, for placements/s
+        self.placements = 0
+
+    # Best placement of table on the board, looking one piece ahead when previewTable is given.
+    # Returns None when every placement tops out.
+    def bestPlacement(self, board, table, previewTable=None):
+        rows = board.rows
+        width, height = board.width, board.height
+        surfaces, holes = computeFeatures(rows, width, height)
+        lookAhead = self.usePreview and previewTable is not None
+        lineWeight = self.weights.lines
+
+        best = None
+        for shape in PLACEMENTSHAPES[table.index]:
+            for x in range(-shape.minDx, width - shape.maxDx):
+                result = self._place(rows, surfaces, holes, width, height, shape, x)
+                if result is None:
+                    continue
+                y, lines, value, childRows, childSurfaces, childHoles = result
+                if lookAhead:
+                    if childRows is None:
+                        childRows = placeRows(rows, shape, x, y, width)
+                    value = lineWeight*lines + self._bestValue(childRows, childSurfaces, childHoles, width, height, previewTable)
+                if best is None or value > best.value:
+                    best = Placement(shape.rotation, x, y, value)
+        return best
+
+    # Value of the best placement of table on the board (memoized)
+    def _bestValue(self, rows, surfaces, holes, width, height, table):
+        key = None
+        if self.cache is not None:
+            key = (tuple(rows), table.index)
+            value = self.cache.get(key)
+            if value is not None:
+                return value
+
+        # Topping out with both pieces is worse than any real board
+        bestValue = float('-inf')
+        for shape in PLACEMENTSHAPES[table.index]:
+            for x in range(-shape.minDx, width - shape.maxDx):
+                result = self._place(rows, surfaces, holes, width, height, shape, x)
+                if result is not None and result[2] > bestValue:
+                    bestValue = result[2]
+
+        if key is not None:
+            self.cache.put(key, bestValue)
+        return bestValue
+
+    # Drop shape at column x; returns (y, lines, value, rows, surfaces, holes) of the result, or None when
+    # the piece would stick out of the top. rows is None unless lines were cleared.
+    def _place(self, rows, surfaces, holes, width, height, shape, x):
+        self.placements += 1
+        left = x + shape.minDx
+        bottoms = shape.bottoms
+        y = min(surfaces[left + i] - 1 - bottom for i, bottom in enumerate(bottoms))
+        if y + min(shape.tops) < 0:
+            return None
+
+        fullRowMask = (1 << width) - 1
+        lines = 0
+        for dy, mask in shape.rowMasks:
+            if rows[y + dy] | (mask << x if x >= 0 else mask >> -x) == fullRowMask:
+                lines += 1
+
+        if lines:
+            # Rows move, so start over from the masks
+            newRows = placeRows(rows, shape, x, y, width)
+            newSurfaces, newHoles = computeFeatures(newRows, width, height)
+        else:
+            newRows = None
+            newSurfaces = surfaces[:]
+            newHoles = holes
+            for i, (bottom, top) in enumerate(zip(bottoms, shape.tops)):
+                column = left + i
+                # Empty cells between the piece and the previous surface become holes
+                newHoles += surfaces[column] - (y + bottom + 1)
+                newSurfaces[column] = y + top
+
+        weights = self.weights
+        aggregateHeight = height*width - sum(newSurfaces)
+        bumpiness = 0
+        for i in range(width - 1):
+            bumpiness += abs(newSurfaces[i] - newSurfaces[i + 1])
+        value = weights.height*aggregateHeight + weights.lines*lines + weights.holes*newHoles + \
+                weights.bumpiness*bumpiness
+        return y, lines, value, newRows, newSurfaces, newHoles
+
+# Row masks after settling shape with its origin at (x, y) and removing full rows
+def placeRows(rows, shape, x, y, width):
+    newRows = list(rows)
+    for dy, mask in shape.rowMasks:
+        newRows[y + dy] |= mask << x if x >= 0 else mask >> -x
+    fullRowMask = (1 << width) - 1
+    if fullRowMask in newRows:
+        keptRows = [mask for mask in newRows if mask != fullRowMask]
+        newRows = [0] * (len(newRows) - len(keptRows)) + keptRows
+    return newRows
@@ -0,0 +1,52 @@
+'''
+Asset manager for a fast start: only the display and font modules are initialised up front
+(no pygame.init(), so no joystick, camera or audio device probing before the first frame),
+asset files are found relative to this package instead of the working directory, and the slow
+parts run on background threads:
+
+- system fonts are scanned (SysFont can run fc-list or walk the font registry) while the game
+  already draws with pygame's bundled default font, switching over once the scan is done,
+- the mixer is opened, sound effects decoded and the music started after the first frame is up
+  (by the audio engine, see audio.py).
+'''
+import os, threading
+
+import pygame
+
+from surface_cache import getFont, getSysFont
+
+ASSETDIR = os.path.dirname(os.path.abspath(__file__))
+
+class AssetManager:
+    def __init__(self, assetDir=ASSETDIR):
+        self.assetDir = assetDir
+        self.sysFontsReady = threading.Event()
+
+    def path(self, name):
+        return os.path.join(self.assetDir, name)
+
+    # Bring up only what drawing the game needs
+    def initDisplay(self):
+        pygame.display.init()
+        pygame.font.init()
+
+    def loadSysFontsAsync(self):
+        threading.Thread(target=self._scanSysFonts, name='sysfont-scan', daemon=True).start()
+
+    def _scanSysFonts(self):
+        # Fills pygame's system font table; SysFont calls after this are dictionary lookups
+        pygame.font.get_fonts()
+        self.sysFontsReady.set()
+
+    # System font once the scan finished, pygame's default font of the same size until then
+    def getSysFont(self, name, size):
+        if self.sysFontsReady.is_set():
+            return getSysFont(name, size)
+        return getFont(None, size)
+
+    # Font file shipped with the game, or one bundled with pygame (e.g. freesansbold.ttf)
+    def getFont(self, name, size):
+        path = self.path(name)
+        return getFont(path if os.path.exists(path) else name, size)
+
+ASSETS = AssetManager()
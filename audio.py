@@ -0,0 +1,238 @@
+'''
+Audio engine: sound effects for game events and the streamed music theme.
+
+Short effects are decoded into pygame.mixer.Sound buffers once, on a background thread right
+after the mixer opened: from the file in SOUNDS if it is next to the game, otherwise synthesized.
+Playing one never touches the disk. They play over a fixed pool of CHANNELS mixer channels: a
+free one if there is one, otherwise the channel playing the least important, oldest sound is
+stolen. A sound never steals from a more important one, it is dropped instead. The theme is
+streamed from its file by pygame.mixer.music, which doesn't use the pool's channels.
+
+Without a working audio device the engine runs on a dummy backend: the same channel pool with
+channels that only keep time, so games play and get measured the same (e.g. headless CI). Until
+the mixer is open, or when audio is disabled, playEvents returns right away.
+
+Every play is timed from the logic tick whose event triggered it to the call of Channel.play,
+over the last LATENCYWINDOW plays, see latencyPercentiles().
+'''
+import array, math, os, sys, threading, time
+from collections import deque
+
+import pygame
+
+from assets import ASSETDIR
+from game import EVENT_ROTATE, EVENT_HARDDROP, EVENT_LOCK, EVENT_CLEAR, EVENT_LEVELUP, EVENT_GAMEOVER
+from profiler import percentile
+
+FREQUENCY = 44100
+SAMPLESIZE = -16        # Signed 16 bit samples, as the synthesized sounds are made
+OUTPUTCHANNELS = 2
+BUFFERSIZE = 512        # Samples per device buffer; adds BUFFERSIZE / FREQUENCY (12 ms) to every sound
+CHANNELS = 8            # Sound effects playing at the same time
+LATENCYWINDOW = 600     # Plays kept for latency percentiles
+SOUNDVOLUME = 0.3       # Amplitude of the synthesized sounds
+
+# name -> (file, priority, synthesized sound: ((frequency Hz, seconds), ...) played one after another)
+SOUNDS = {
+    'rotate': ('rotate.wav', 0, ((880, 0.03),)),
+    'lock': ('lock.wav', 1, ((180, 0.05),)),
+    'harddrop': ('harddrop.wav', 1, ((120, 0.07),)),
+    'clear': ('clear.wav', 2, ((660, 0.06), (880, 0.08))),
+    'tetris': ('tetris.wav', 3, ((523, 0.06), (659, 0.06), (784, 0.06), (1047, 0.12))),
+    'levelup': ('levelup.wav', 2, ((784, 0.08), (1047, 0.12))),
+    'gameover': ('gameover.wav', 3, ((392, 0.15), (330, 0.15), (262, 0.3))),
+}
+
+# Sound of every game event that has one; a clear of four rows has its own
+EVENTSOUNDS = {EVENT_ROTATE: 'rotate', EVENT_HARDDROP: 'harddrop', EVENT_LOCK: 'lock', EVENT_CLEAR: 'clear',
+               EVENT_LEVELUP: 'levelup', EVENT_GAMEOVER: 'gameover'}
+TETRISROWS = 4
+
+# 16 bit PCM of the tones, the same sample in every output channel
+def synthesize(tones, frequency=FREQUENCY, outputChannels=OUTPUTCHANNELS, volume=SOUNDVOLUME):
+    samples = array.array('h')
+    amplitude = 32767 * volume
+    for pitch, seconds in tones:
+        count = int(seconds * frequency)
+        # Short fade in and out, a tone starting or stopping mid wave clicks
+        ramp = max(1, min(count // 4, frequency // 200))
+        step = 2 * math.pi * pitch / frequency
+        for index in range(count):
+            envelope = min(1.0, index / ramp, (count - index) / ramp)
+            samples.extend([int(amplitude * envelope * math.sin(step * index))] * outputChannels)
+    return samples.tobytes()
+
+def soundSeconds(tones):
+    return sum(seconds for _, seconds in tones)
+
+class DummySound:
+    '''Stands in for a pygame.mixer.Sound when there is no audio device.'''
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def get_length(self):
+        return self.seconds
+
+class DummyChannel:
+    '''Stands in for a pygame.mixer.Channel: busy for as long as its sound would play.'''
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.busyUntil = 0.0
+
+    def get_busy(self):
+        return self.clock() < self.busyUntil
+
+    def play(self, sound):
+        self.busyUntil = self.clock() + sound.get_length()
+
+class VoicePool:
+    '''Fixed channels that sounds are played on, stealing the least important, oldest one when all are busy.'''
+
+    def __init__(self, channels, clock=time.perf_counter):
+        self.channels = channels
+        self.clock = clock
+        self.priorities = [0] * len(channels)
+        self.startTimes = [0.0] * len(channels)
+        self.played = 0
+        self.stolen = 0
+        self.dropped = 0
+
+    # Play sound on a channel; returns False when every channel plays something more important
+    def play(self, sound, priority, now):
+        victim = None
+        for index, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                victim = index
+                break
+            channelPriority = self.priorities[index]
+            if channelPriority > priority:
+                continue
+            if victim is None or channelPriority < self.priorities[victim] or \
+                    (channelPriority == self.priorities[victim] and self.startTimes[index] < self.startTimes[victim]):
+                victim = index
+        else:
+            if victim is None:
+                self.dropped += 1
+                return False
+            self.stolen += 1
+
+        self.channels[victim].play(sound)
+        self.priorities[victim] = priority
+        self.startTimes[victim] = now
+        self.played += 1
+        return True
+
+class AudioEngine:
+    def __init__(self, channels=CHANNELS, clock=time.perf_counter, assetDir=ASSETDIR):
+        self.channelCount = channels
+        self.clock = clock
+        self.assetDir = assetDir
+        self.ready = threading.Event()
+
+        # Set once the mixer is open (or known to be missing): name -> (sound, priority) and the channel pool
+        self.sounds = {}
+        self.voices = None
+        self.isDummy = None
+
+        # Nanoseconds from the tick of an event to the play() call of its sound
+        self.latencies = deque(maxlen=LATENCYWINDOW)
+
+        self.isMusicPaused = False
+        self.musicAvailable = False
+        self._musicLock = threading.Lock()
+
+    def startAsync(self, musicName=None, musicVolume=1.0):
+        threading.Thread(target=self.start, args=(musicName, musicVolume), name='audio-loader', daemon=True).start()
+
+    # Open the mixer, decode the sounds and start the music; falls back to the dummy backend without a device
+    def start(self, musicName=None, musicVolume=1.0, dummy=False):
+        try:
+            if dummy:
+                raise pygame.error('dummy backend requested')
+            pygame.mixer.init(FREQUENCY, SAMPLESIZE, OUTPUTCHANNELS, BUFFERSIZE, allowedchanges=0)
+        except pygame.error as error:
+            if not dummy:
+                print(f'Audio disabled: {error}', file=sys.stderr)
+            self.sounds = {name: (DummySound(soundSeconds(tones)), priority)
+                           for name, (_, priority, tones) in SOUNDS.items()}
+            self.isDummy = True
+            self.voices = VoicePool([DummyChannel(self.clock) for _ in range(self.channelCount)], self.clock)
+            self.ready.set()
+            return
+
+        self.sounds = {name: (self._loadSound(fileName, tones), priority)
+                       for name, (fileName, priority, tones) in SOUNDS.items()}
+        pygame.mixer.set_num_channels(self.channelCount)
+        self.isDummy = False
+        self.voices = VoicePool([pygame.mixer.Channel(index) for index in range(self.channelCount)], self.clock)
+        if musicName is not None:
+            self._playMusic(os.path.join(self.assetDir, musicName), musicVolume)
+        self.ready.set()
+
+    def _loadSound(self, fileName, tones):
+        path = os.path.join(self.assetDir, fileName)
+        if os.path.exists(path):
+            try:
+                return pygame.mixer.Sound(path)
+            except pygame.error as error:
+                print(f'Could not load {fileName}: {error}', file=sys.stderr)
+        return pygame.mixer.Sound(buffer=synthesize(tones))
+
+    def _playMusic(self, path, volume, loops=-1):
+        try:
+            pygame.mixer.music.load(path)
+        except (pygame.error, FileNotFoundError) as error:
+            print(f'Music disabled: {error}', file=sys.stderr)
+            return
+
+        with self._musicLock:
+            self.musicAvailable = True
+            pygame.mixer.music.set_volume(volume)
+            pygame.mixer.music.play(loops)
+            # The player may have muted the music before it finished loading
+            if self.isMusicPaused:
+                pygame.mixer.music.pause()
+
+    def pauseMusic(self):
+        with self._musicLock:
+            self.isMusicPaused = True
+            if self.musicAvailable:
+                pygame.mixer.music.pause()
+
+    def unpauseMusic(self):
+        with self._musicLock:
+            self.isMusicPaused = False
+            if self.musicAvailable:
+                pygame.mixer.music.unpause()
+
+    # Play the sounds of GameState.events; eventTime is when the tick that produced them was due
+    def playEvents(self, events, eventTime):
+        if self.voices is None:
+            return
+        for event, value in events:
+            name = EVENTSOUNDS.get(event)
+            if name is not None:
+                if event == EVENT_CLEAR and len(value) >= TETRISROWS:
+                    name = 'tetris'
+                self.play(name, eventTime)
+
+    def play(self, name, eventTime=None):
+        voices = self.voices
+        if voices is None:
+            return False
+        sound, priority = self.sounds[name]
+        now = self.clock()
+        if not voices.play(sound, priority, now):
+            return False
+        if eventTime is not None:
+            self.latencies.append(int((now - eventTime) * 1e9))
+        return True
+
+    # (p50, p95, p99) of the latencies of the recent plays, in nanoseconds
+    def latencyPercentiles(self):
+        values = sorted(self.latencies)
+        return tuple(percentile(values, p) for p in (50, 95, 99))
+
+AUDIO = AudioEngine()
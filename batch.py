@@ -0,0 +1,95 @@
+'''
+Batch runner for headless games.
+
+Plays N seeded games over a pool of worker processes, streams one JSON line per game to stdout
+(in seed order, so the output doesn't depend on the number of workers) and prints percentiles
+of the results to stderr when done:
+
+    python batch.py --games 1000 --policy random --workers 8 > results.jsonl
+'''
+import argparse, json, multiprocessing, os, sys, time
+
+from game import GameState, runUntilGameOver, LEVELUPSPEEDSTEP
+from policies import POLICIES
+from profiler import percentile
+from randomizers import RANDOMIZERS
+
+RESULTFIELDS = ('score', 'level', 'lines', 'pieces', 'ticks')
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Play a single game; task is a tuple so it can be sent to worker processes cheaply
+def playGame(task):
+    seed, policyName, maxTicks, levelUpSpeedStep, randomizer = task
+    state = GameState(seed, levelUpSpeedStep=levelUpSpeedStep, randomizer=randomizer)
+    runUntilGameOver(state, POLICIES[policyName](seed), maxTicks)
+    return {'seed': seed, 'policy': policyName, 'randomizer': randomizer, 'score': state.score, 'level': state.level,
+            'lines': state.lines, 'pieces': state.pieces, 'ticks': state.ticks,
+            'gameOver': state.isGameOver}
+
+# Yield results of all tasks in task order, using `workers` processes (in-process when workers == 1)
+def runGames(tasks, workers=1, chunkSize=None):
+    if workers <= 1:
+        for task in tasks:
+            yield playGame(task)
+        return
+
+    if chunkSize is None:
+        # Few chunks per worker keeps scheduling overhead low while still balancing uneven game lengths
+        chunkSize = max(1, len(tasks) // (workers * 8))
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap(playGame, tasks, chunkSize)
+
+def summarize(results):
+    summary = {}
+    for field in RESULTFIELDS:
+        values = sorted(result[field] for result in results)
+        stats = {f'p{p}': percentile(values, p) for p in PERCENTILES}
+        stats['mean'] = sum(values) / len(values) if values else 0
+        stats['min'] = values[0] if values else 0
+        stats['max'] = values[-1] if values else 0
+        summary[field] = stats
+    return summary
+
+def printSummary(summary, gamesCount, elapsed, out=sys.stderr):
+    columns = ['mean', 'min'] + [f'p{p}' for p in PERCENTILES] + ['max']
+    print(f'{gamesCount} games in {elapsed:.2f}s ({gamesCount/elapsed:,.0f} games/s)', file=out)
+    print('field'.ljust(8) + ''.join(column.rjust(10) for column in columns), file=out)
+    for field, stats in summary.items():
+        print(field.ljust(8) + ''.join(f'{stats[column]:10.1f}' for column in columns), file=out)
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description='Play many headless games in parallel and aggregate their results.')
+    parser.add_argument('--games', type=int, default=100, help='number of games to play')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game; game i uses seed + i')
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='random')
+    parser.add_argument('--randomizer', choices=sorted(RANDOMIZERS), default='uniform')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=None, help='games sent to a worker at once')
+    parser.add_argument('--max-ticks', type=int, default=None, help='stop a game after that many ticks')
+    parser.add_argument('--speed-step', type=int, default=LEVELUPSPEEDSTEP,
+                        help='how much the falling speed drops on every level up')
+    parser.add_argument('--summary-json', default=None, help='also write aggregated statistics to this file')
+    parser.add_argument('--quiet', action='store_true', help="don't stream per-game results")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parseArgs(argv)
+    tasks = [(args.seed + i, args.policy, args.max_ticks, args.speed_step, args.randomizer) for i in range(args.games)]
+
+    results = []
+    start = time.perf_counter()
+    for result in runGames(tasks, args.workers, args.chunk_size):
+        results.append(result)
+        if not args.quiet:
+            print(json.dumps(result))
+    elapsed = time.perf_counter() - start
+    sys.stdout.flush()
+
+    summary = summarize(results)
+    printSummary(summary, len(results), elapsed)
+    if args.summary_json:
+        with open(args.summary_json, 'w') as summaryFile:
+            json.dump(summary, summaryFile, indent=2)
+
+if __name__ == '__main__':
+    main()
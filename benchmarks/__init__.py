@@ -0,0 +1,5 @@
+'''
+Benchmarks for the Tetris clone. Run single benchmark from the repository root, e.g.:
+
+    python -m benchmarks.bench_board
+'''
@@ -0,0 +1,110 @@
+'''
+Autoplayer search speed in placements per second, with and without the transposition cache,
+against scoring every candidate by rebuilding its board. Also checks that the incrementally
+updated features match a full recomputation and that pieces land where the search said, and
+plays a few games with the 'ai' policy.
+'''
+import random, time
+
+from ai import Autoplayer, PLACEMENTSHAPES, computeFeatures, placeRows
+from benchmarks.common import makeFilledBoard, printTable
+from game import GameState, runUntilGameOver
+from pieces import PIECETABLES
+from policies import makeAIPolicy
+
+FILLEDROWS = (0, 4, 8, 12)
+DECISIONS = 60
+MAXTICKS = 20000
+
+# Scores a candidate by building its board and computing features from scratch
+class RebuildingAutoplayer(Autoplayer):
+    def _place(self, rows, surfaces, holes, width, height, shape, x):
+        result = super()._place(rows, surfaces, holes, width, height, shape, x)
+        if result is not None:
+            computeFeatures(placeRows(rows, shape, x, result[0], width), width, height)
+        return result
+
+def checkIncrementalFeatures():
+    autoplayer = Autoplayer(cacheSize=0)
+    rng = random.Random(0)
+    for filledRows in range(0, 15):
+        board = makeFilledBoard(filledRows, seed=filledRows)
+        # Knock out a few more cells to get holes and uneven surfaces
+        for _ in range(filledRows * 2):
+            board.rows[rng.randrange(board.height)] &= ~(1 << rng.randrange(board.width))
+        surfaces, holes = computeFeatures(board.rows, board.width, board.height)
+        for shapes in PLACEMENTSHAPES:
+            for shape in shapes:
+                for x in range(-shape.minDx, board.width - shape.maxDx):
+                    result = autoplayer._place(board.rows, surfaces, holes, board.width, board.height, shape, x)
+                    if result is None:
+                        continue
+                    y, lines, value, rows, newSurfaces, newHoles = result
+                    expected = computeFeatures(placeRows(board.rows, shape, x, y, board.width), board.width, board.height)
+                    assert (newSurfaces, newHoles) == expected, (filledRows, shape.rotation, x)
+
+# Remembers the last answer, so the landing check knows where the policy is heading
+class RecordingAutoplayer(Autoplayer):
+    lastPlacement = None
+
+    def bestPlacement(self, board, table, previewTable=None):
+        self.lastPlacement = super().bestPlacement(board, table, previewTable)
+        return self.lastPlacement
+
+# Play with the ai policy and check every piece locks where the search put it
+def checkLanding(seed, maxTicks=5000):
+    autoplayer = RecordingAutoplayer()
+    policy = makeAIPolicy(seed, autoplayer)
+    state = GameState(seed)
+    while not state.isGameOver and state.ticks < maxTicks:
+        pieces = state.pieces
+        rowsBefore = list(state.board.rows)
+        table = state.piece.table
+        inputs = policy(state)
+        placement = autoplayer.lastPlacement
+        state.step(inputs)
+        if state.pieces != pieces:
+            shape = next(shape for shape in PLACEMENTSHAPES[table.index] if shape.rotation == placement.rotation)
+            assert state.board.rows == placeRows(rowsBefore, shape, placement.x, placement.y, state.board.width), \
+                f'seed {seed}: piece {pieces} did not land where planned'
+
+def timeDecisions(autoplayer):
+    rng = random.Random(1)
+    boards = [makeFilledBoard(filledRows, seed=filledRows) for filledRows in FILLEDROWS]
+    decisions = [(rng.choice(boards), rng.choice(PIECETABLES), rng.choice(PIECETABLES)) for _ in range(DECISIONS)]
+    start = time.perf_counter()
+    for board, table, previewTable in decisions:
+        autoplayer.bestPlacement(board, table, previewTable)
+    return time.perf_counter() - start
+
+def main():
+    checkIncrementalFeatures()
+    for seed in range(3):
+        checkLanding(seed)
+
+    rows = []
+    for name, autoplayer in (('rebuild board per candidate', RebuildingAutoplayer(cacheSize=0)),
+                             ('incremental', Autoplayer(cacheSize=0)),
+                             ('incremental + cache', Autoplayer())):
+        seconds = timeDecisions(autoplayer)
+        rows.append((name, f'{autoplayer.placements:,}', f'{DECISIONS / seconds:.1f}',
+                     f'{autoplayer.placements / seconds:,.0f}'))
+    cache = autoplayer.cache.stats()
+    print(f'{DECISIONS} decisions (current + preview piece) on boards with {FILLEDROWS} filled rows')
+    printTable(('scoring', 'placements', 'decisions/s', 'placements/s'), rows)
+    print(f"cache: {cache['hits']} hits, {cache['misses']} misses, hit rate {cache['hitRate']:.0%}")
+
+    print()
+    rows = []
+    for seed in range(3):
+        autoplayer = Autoplayer()
+        state = GameState(seed)
+        start = time.perf_counter()
+        runUntilGameOver(state, makeAIPolicy(seed, autoplayer), MAXTICKS)
+        seconds = time.perf_counter() - start
+        rows.append((seed, state.ticks, state.pieces, state.lines, state.isGameOver,
+                     f'{autoplayer.placements / seconds:,.0f}', f"{autoplayer.cache.stats()['hitRate']:.0%}"))
+    printTable(('seed', 'ticks', 'pieces', 'lines', 'game over', 'placements/s', 'cache hit rate'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+'''
+Audio engine: cost of playing a sound effect from a Sound decoded once at startup against loading
+the file on every play (pygame.mixer.Sound(path), as a game without preloading would), the cost
+per logic tick of turning game events into sounds with audio disabled, on the dummy backend and
+on the real mixer, and the latency from a game event to the play() call of its sound. The mixer
+runs on SDL's dummy audio driver unless SDL_AUDIODRIVER is set.
+
+Checks first that the channel pool never plays more than CHANNELS sounds, steals the least
+important, oldest one and never steals from a more important sound, and that without an audio
+device the engine comes up on the dummy backend instead of failing.
+'''
+import os
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import random, subprocess, sys, tempfile, time, wave
+
+import pygame
+
+from assets import ASSETDIR
+from audio import (AudioEngine, VoicePool, DummyChannel, DummySound, SOUNDS, EVENTSOUNDS, CHANNELS, FREQUENCY,
+                   OUTPUTCHANNELS, synthesize)
+from benchmarks.bench_input import percentile
+from benchmarks.common import printTable
+from game import GameState
+from policies import makeAIPolicy, makeRandomPolicy
+
+PLAYS = 2000
+GAMES = 4
+AITICKS = 3000
+
+NODEVICE = '''
+from audio import AudioEngine
+engine = AudioEngine()
+engine.start()
+assert engine.isDummy and engine.play('tetris', 0.0)
+print('ok')
+'''
+
+# DummyChannel that remembers which channel played last
+class TracedChannel(DummyChannel):
+    def __init__(self, clock, index, played):
+        super().__init__(clock)
+        self.index = index
+        self.played = played
+
+    def play(self, sound):
+        super().play(sound)
+        self.played.append(self.index)
+
+def checkVoicePool(plays=20000):
+    now = 0.0
+    clock = lambda: now
+    played = []
+    voices = VoicePool([TracedChannel(clock, index, played) for index in range(CHANNELS)], clock)
+    rng = random.Random(0)
+    for _ in range(plays):
+        now += rng.choice((0.0, 0.0, 0.005, 0.02))
+        priority = rng.randrange(4)
+        busy = [(voices.priorities[index], voices.startTimes[index], index)
+                for index, channel in enumerate(voices.channels) if channel.get_busy()]
+        played.clear()
+        result = voices.play(DummySound(rng.choice((0.03, 0.1, 0.3))), priority, now)
+        assert len(played) == (1 if result else 0)
+        if len(busy) < CHANNELS:
+            assert result and played[0] not in [index for _, _, index in busy], \
+                'a busy channel was used with a free one left'
+            continue
+        candidates = sorted(voice for voice in busy if voice[0] <= priority)
+        if not candidates:
+            assert not result, 'a sound stole from a more important one'
+            continue
+        assert result and played[0] == candidates[0][2], 'the stolen sound was not the least important, oldest one'
+    assert voices.stolen and voices.dropped
+    return voices
+
+def checkNoDevice():
+    env = dict(os.environ, SDL_AUDIODRIVER='nonexistent', PYGAME_HIDE_SUPPORT_PROMPT='1')
+    result = subprocess.run([sys.executable, '-c', NODEVICE], cwd=ASSETDIR, env=env, capture_output=True, text=True)
+    assert result.returncode == 0 and result.stdout.strip() == 'ok', f'no audio device: {result.stderr}'
+
+def writeWav(path, tones):
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(OUTPUTCHANNELS)
+        wav.setsampwidth(2)
+        wav.setframerate(FREQUENCY)
+        wav.writeframes(synthesize(tones))
+
+# ns per play and the slowest one, playing every sound in turn
+def timePlays(play, names):
+    times = []
+    for index in range(PLAYS):
+        name = names[index % len(names)]
+        start = time.perf_counter_ns()
+        play(name)
+        times.append(time.perf_counter_ns() - start)
+    return times
+
+# Events of every tick of a few games, first steered by the autoplayer (line clears), then random (game over)
+def recordEvents():
+    ticks = []
+    for seed in range(GAMES):
+        state = GameState(seed)
+        aiPolicy, randomPolicy = makeAIPolicy(seed), makeRandomPolicy(seed)
+        while not state.isGameOver:
+            state.step(aiPolicy(state) if state.ticks < AITICKS else randomPolicy(state))
+            ticks.append(list(state.events))
+    return ticks
+
+# ns per tick of AudioEngine.playEvents over the recorded ticks
+def timeTicks(engine, ticks, rounds=5):
+    best = None
+    for _ in range(rounds):
+        eventTime = time.perf_counter()
+        start = time.perf_counter_ns()
+        for events in ticks:
+            engine.playEvents(events, eventTime)
+        elapsed = (time.perf_counter_ns() - start) / len(ticks)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+# Latencies (ns) of sounds of real games: the event time is taken when the tick starts, after its inputs were read
+def gameLatencies(engine):
+    engine.latencies.clear()
+    latencies = []
+    for seed in range(GAMES):
+        state = GameState(seed)
+        aiPolicy, randomPolicy = makeAIPolicy(seed), makeRandomPolicy(seed)
+        while not state.isGameOver:
+            inputs = aiPolicy(state) if state.ticks < AITICKS else randomPolicy(state)
+            tickTime = time.perf_counter()
+            state.step(inputs)
+            engine.playEvents(state.events, tickTime)
+            latencies.extend(engine.latencies)
+            engine.latencies.clear()
+    return latencies
+
+def main():
+    voices = checkVoicePool()
+    checkNoDevice()
+
+    mixer = AudioEngine()
+    mixer.start()
+    assert not mixer.isDummy, 'the mixer should open on the SDL dummy audio driver'
+    dummy = AudioEngine()
+    dummy.start(dummy=True)
+    assert dummy.isDummy
+    disabled = AudioEngine()
+
+    names = list(SOUNDS)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {}
+        for name, (fileName, _, tones) in SOUNDS.items():
+            paths[name] = os.path.join(directory, fileName)
+            writeWav(paths[name], tones)
+        channel = pygame.mixer.Channel(0)
+        onDemand = timePlays(lambda name: channel.play(pygame.mixer.Sound(paths[name])), names)
+    preloaded = timePlays(mixer.play, names)
+    assert percentile(preloaded, 0.5) < percentile(onDemand, 0.5), 'playing a preloaded sound should beat loading it'
+
+    print(f'{PLAYS} plays of the {len(names)} sound effects, SDL audio driver {os.environ["SDL_AUDIODRIVER"]}')
+    printTable(('play', 'p50 us', 'p99 us', 'max us'),
+               [(name, f'{percentile(times, 0.5) / 1e3:.1f}', f'{percentile(times, 0.99) / 1e3:.1f}', f'{max(times) / 1e3:.1f}')
+                for name, times in (('Sound(file) per play', onDemand), ('preloaded Sound', preloaded))])
+
+    ticks = recordEvents()
+    sounds = sum(1 for events in ticks for event, _ in events if event in EVENTSOUNDS)
+    rows = []
+    for name, engine in (('audio disabled', disabled), ('dummy backend', dummy), ('mixer', mixer)):
+        tickNs = timeTicks(engine, ticks)
+        if engine is disabled:
+            latencies = []
+            assert not engine.latencies
+        else:
+            latencies = gameLatencies(engine)
+            assert latencies
+        rows.append((name, f'{tickNs:.0f}', f'{percentile(latencies, 0.5) / 1e3:.1f}' if latencies else '-',
+                     f'{percentile(latencies, 0.99) / 1e3:.1f}' if latencies else '-'))
+
+    print(f'\n{len(ticks)} logic ticks of {GAMES} games with {sounds} sounds, the events of a tick played after its step')
+    printTable(('backend', 'ns/tick', 'event to play() p50 us', 'p99 us'), rows)
+    print(f'\nchannel pool check: {voices.played} plays, {voices.stolen} stolen, {voices.dropped} dropped; '
+          f'no audio device: dummy backend')
+
+if __name__ == '__main__':
+    main()
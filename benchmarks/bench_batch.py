@@ -0,0 +1,30 @@
+'''
+Scaling of the batch runner with the number of worker processes. Also checks that results
+are identical for every worker count.
+'''
+import os, time
+
+from batch import runGames
+from benchmarks.common import printTable
+
+def main(games=400, policy='random'):
+    tasks = [(seed, policy, None, 2, 'uniform') for seed in range(games)]
+    cpuCount = os.cpu_count() or 1
+    workerCounts = sorted({1, 2, cpuCount // 2, cpuCount} - {0})
+
+    reference = None
+    baseline = None
+    rows = []
+    for workers in workerCounts:
+        start = time.perf_counter()
+        results = list(runGames(tasks, workers))
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference, baseline = results, elapsed
+        assert results == reference, f'results with {workers} workers differ from single process run'
+        rows.append((workers, f'{games/elapsed:,.0f}', f'{baseline/elapsed:.2f}x'))
+    print(f'{games} games, policy {policy}, {cpuCount} CPUs')
+    printTable(('workers', 'games/s', 'speedup'), rows)
+
+if __name__ == '__main__':
+    main()
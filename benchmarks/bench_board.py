@@ -0,0 +1,63 @@
+'''
+Per-frame cost of collision checks as the board fills up: bitboard engine vs. the old
+list of {'rects', 'color'} dicts walked by checkCollisionsWithBottom/checkCollisionsBetweenBlocks.
+'''
+import pygame
+
+from benchmarks.common import timePerCall, makeFilledBoard, printTable
+
+BLOCKSIZE = 25
+GAMEWINDOWHEIGHT = 500
+
+# Falling T piece hanging just above the stack
+PIECECELLS = [(4, 0), (3, 1), (4, 1), (5, 1)]
+
+def boardToRectFigures(board):
+    figures = []
+    for x, y, color in board.iterCells():
+        figures.append({'rects': [pygame.Rect(x*BLOCKSIZE, y*BLOCKSIZE, BLOCKSIZE, BLOCKSIZE)], 'color': color})
+    return figures
+
+# Old implementation, kept here only as a reference point
+def legacyCollisionsWithBottom(currentRects, rectsOnTheGround):
+    for block in currentRects:
+        if block.y + BLOCKSIZE >= GAMEWINDOWHEIGHT:
+            return True
+    for rect in currentRects:
+        for figure in rectsOnTheGround:
+            for groundRect in figure['rects']:
+                if rect.bottom == groundRect.top and rect.x == groundRect.x:
+                    return True
+    return False
+
+def legacyCollisionsBetweenBlocks(currentRects, rectsOnTheGround):
+    for rect in currentRects:
+        for figure in rectsOnTheGround:
+            for groundRect in figure['rects']:
+                if (rect.right == groundRect.left or rect.left == groundRect.right) and (rect.y == groundRect.y):
+                    return True
+    return False
+
+def main():
+    pieceRects = [pygame.Rect(x*BLOCKSIZE, y*BLOCKSIZE, BLOCKSIZE, BLOCKSIZE) for x, y in PIECECELLS]
+    rows = []
+    for filledRows in (0, 4, 8, 12, 16, 18):
+        board = makeFilledBoard(filledRows)
+        figures = boardToRectFigures(board)
+
+        def bitboardFrame():
+            board.touchesGround(PIECECELLS)
+            board.touchesBlocks(PIECECELLS)
+            for y in range(board.height):
+                board.isRowFull(y)
+
+        def legacyFrame():
+            legacyCollisionsWithBottom(pieceRects, figures)
+            legacyCollisionsBetweenBlocks(pieceRects, figures)
+
+        rows.append((filledRows, len(figures), f'{timePerCall(bitboardFrame, 2000):.0f}', f'{timePerCall(legacyFrame, 200):.0f}'))
+    print('Per-frame collision cost (ns)')
+    printTable(('filled rows', 'blocks', 'bitboard', 'rect lists'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+'''
+Spectator fan-out: one game broadcast (broadcast.py) to many viewers on localhost, all on one
+event loop in this process. The game is stepped as fast as the fan-out allows rather than at 60
+ticks per second, to find the ceiling. One viewer in ten is slow: it stops reading until its
+buffers filled up and the broadcaster skips it, then reads for a while and stops again, catching
+up with keyframes. The run lasts SECONDS, or longer until every slow viewer was skipped at least
+once (the more viewers, the fewer frames per second and the longer that takes).
+
+Reports frames and delivered messages per second, keyframes (new games and catching up) and
+skipped writes, and the Python heap per subscriber (both ends of the connection, measured with
+tracemalloc while connecting). Checks that viewers mirroring the game end up with exactly its
+state, that viewers were skipped at every subscriber count, and separately that a viewer who
+stops reading is skipped and caught up by a keyframe.
+'''
+import asyncio, socket, time, tracemalloc
+
+from benchmarks.common import printTable, mirrorEquals
+from broadcast import Broadcaster, GameBroadcast
+from client import VersusClient
+from game import GameState
+from policies import makeRandomPolicy
+from protocol import FRAMEHEADER, MSG_KEYFRAME
+
+SUBSCRIBERCOUNTS = (100, 1000, 3000)
+SECONDS = 5
+SLOWEVERY = 10          # Every n-th viewer is slow
+SLOWPERIOD = 0.5        # Seconds a slow viewer reads after it was skipped
+STALLTIMEOUT = 120      # Seconds the run may take for every slow viewer to be skipped
+VIEWERBUFFER = 4*1024   # Receive buffer of slow viewers, so they fall behind quickly
+
+class CountingViewer(asyncio.Protocol):
+    def __init__(self, isSlow=False):
+        self.isSlow = isSlow
+        self.transport = None
+        self.buffer = bytearray()
+        self.messages = 0
+        self.keyframes = 0
+        self.bytes = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if self.isSlow:
+            transport.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, VIEWERBUFFER)
+
+    # Count the protocol messages in the stream
+    def data_received(self, data):
+        self.bytes += len(data)
+        buffer = self.buffer
+        buffer += data
+        position = 0
+        while len(buffer) - position >= FRAMEHEADER.size:
+            messageType, length = FRAMEHEADER.unpack_from(buffer, position)
+            if len(buffer) - position - FRAMEHEADER.size < length:
+                break
+            position += FRAMEHEADER.size + length
+            self.messages += 1
+            if messageType == MSG_KEYFRAME:
+                self.keyframes += 1
+        del buffer[:position]
+
+async def waitFor(condition, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline, 'timed out'
+        await asyncio.sleep(0.01)
+
+# Slow viewers stop reading until the broadcaster skips them, then read for SLOWPERIOD and stop again.
+# slowViewers - [(viewer's transport, its Subscriber)]; skipped collects the transports skipped so far
+async def stallSlowViewers(slowViewers, skipped):
+    readingUntil = {}
+    for transport, _ in slowViewers:
+        transport.pause_reading()
+    while True:
+        await asyncio.sleep(0.01)
+        now = time.perf_counter()
+        for transport, subscriber in slowViewers:
+            if transport.is_closing():
+                continue
+            until = readingUntil.get(transport)
+            if until is None:
+                if subscriber.isPaused:
+                    skipped.add(transport)
+                    transport.resume_reading()
+                    readingUntil[transport] = now + SLOWPERIOD
+            elif now >= until:
+                transport.pause_reading()
+                del readingUntil[transport]
+
+# Step the game and publish a frame; returns the (possibly new) state
+def stepFrame(broadcast, state, policy):
+    for _ in range(broadcast.ticksPerFlush):
+        if state.isGameOver:
+            state = GameState(state.seed + 1, randomizer='bag')
+            broadcast.setStates([state])
+        state.step(policy(state))
+        broadcast.publish()
+    return state
+
+async def checkSlowViewer():
+    broadcaster = Broadcaster(port=0)
+    await broadcaster.start()
+    broadcast = GameBroadcast(broadcaster)
+    state = GameState(0, randomizer='bag')
+    policy = makeRandomPolicy(0)
+    broadcast.setStates([state])
+    fast, slow = VersusClient(), VersusClient()
+    for client in (fast, slow):
+        await client.connect(broadcaster.host, broadcaster.port)
+    receiving = [asyncio.create_task(client.receive()) for client in (fast, slow)]
+
+    slow.writer.transport.pause_reading()
+    while broadcaster.skipped < 100:
+        state = stepFrame(broadcast, state, policy)
+        await asyncio.sleep(0)
+    slow.writer.transport.resume_reading()
+    keyframesBefore = broadcaster.keyframesSent
+    def caughtUp():
+        broadcast.flush()
+        return all(mirrorEquals(client.ownState, state) for client in (fast, slow))
+    await waitFor(caughtUp)
+    assert broadcaster.keyframesSent > keyframesBefore, 'the slow viewer should catch up with a keyframe'
+
+    for client in (fast, slow):
+        client.close()
+    await asyncio.gather(*receiving)
+    await broadcaster.close()
+
+async def fanOut(subscriberCount):
+    loop = asyncio.get_running_loop()
+    broadcaster = Broadcaster(port=0)
+    await broadcaster.start()
+    broadcast = GameBroadcast(broadcaster)
+    state = GameState(0, randomizer='bag')
+    policy = makeRandomPolicy(0)
+    broadcast.setStates([state])
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    viewers = []
+    for index in range(subscriberCount):
+        _, viewer = await loop.create_connection(lambda: CountingViewer(index % SLOWEVERY == SLOWEVERY - 1),
+                                                 broadcaster.host, broadcaster.port)
+        viewers.append(viewer)
+    await waitFor(lambda: len(broadcaster.subscribers) == subscriberCount)
+    bytesPerSubscriber = (tracemalloc.get_traced_memory()[0] - before) / subscriberCount
+    tracemalloc.stop()
+
+    # Mirroring viewers to check the result, one of them slow
+    mirrors = [VersusClient(), VersusClient()]
+    for client in mirrors:
+        await client.connect(broadcaster.host, broadcaster.port)
+    mirrors[1].writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, VIEWERBUFFER)
+    receiving = [asyncio.create_task(client.receive()) for client in mirrors]
+    await waitFor(lambda: len(broadcaster.subscribers) == subscriberCount + len(mirrors))
+    # A viewer's local address is the peer address of its subscriber
+    subscribersByPeer = {subscriber.transport.get_extra_info('peername'): subscriber
+                         for subscriber in broadcaster.subscribers}
+    slowTransports = [viewer.transport for viewer in viewers if viewer.isSlow] + [mirrors[1].writer.transport]
+    slowViewers = [(transport, subscribersByPeer[transport.get_extra_info('sockname')]) for transport in slowTransports]
+    skippedViewers = set()
+    stalling = asyncio.create_task(stallSlowViewers(slowViewers, skippedViewers))
+
+    start = time.perf_counter()
+    framesBefore, messagesBefore = broadcaster.framesSent, sum(viewer.messages for viewer in viewers)
+    while time.perf_counter() - start < SECONDS or len(skippedViewers) < len(slowViewers):
+        assert time.perf_counter() - start < STALLTIMEOUT, \
+            f'{len(slowViewers) - len(skippedViewers)} slow viewers were never skipped'
+        state = stepFrame(broadcast, state, policy)
+        # Let the transports write and the viewers read
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    frames = broadcaster.framesSent - framesBefore
+    messages = sum(viewer.messages for viewer in viewers) - messagesBefore
+    assert broadcaster.skipped > 0, f'no viewer was skipped with {subscriberCount} subscribers'
+
+    # Everyone catches up with the final state, slow viewers by keyframe
+    stalling.cancel()
+    for transport in slowTransports:
+        transport.resume_reading()
+    def caughtUp():
+        broadcast.flush()
+        return all(client.states is not None and mirrorEquals(client.ownState, state) for client in mirrors)
+    await waitFor(caughtUp)
+
+    keyframes = sum(viewer.keyframes for viewer in viewers)
+    for client in mirrors:
+        client.close()
+    await asyncio.gather(*receiving)
+    await broadcaster.close()
+    for viewer in viewers:
+        viewer.transport.close()
+    return (subscriberCount, f'{elapsed:.1f}', f'{frames / elapsed:,.0f}', f'{messages / elapsed:,.0f}',
+            f'{sum(viewer.bytes for viewer in viewers) / elapsed / 1e6:.1f}', keyframes, broadcaster.skipped,
+            f'{bytesPerSubscriber / 1024:.1f}')
+
+def main():
+    asyncio.run(checkSlowViewer())
+    rows = [asyncio.run(fanOut(count)) for count in SUBSCRIBERCOUNTS]
+    print(f'one game stepped as fast as the fan-out allows for at least {SECONDS} s, viewers in the same process, '
+          f'1 in {SLOWEVERY} stalling until skipped')
+    printTable(('subscribers', 'seconds', 'frames/s', 'messages/s', 'MB/s', 'keyframes', 'skipped', 'KB/subscriber'), rows)
+
+if __name__ == '__main__':
+    main()
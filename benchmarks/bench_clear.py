@@ -0,0 +1,56 @@
+'''
+Line clears per second on dense boards with Board.clearFullRows, plus a sanity check
+that non-adjacent full rows are cleared without shifting the rows between them too far.
+'''
+import random
+
+from benchmarks.common import timePerCall, printTable
+from board import Board
+
+COLOR = (204,0,0)
+
+# Board filled up to `stackHeight` rows, with `fullRows` of them complete and the rest missing one block
+def makeDenseBoard(stackHeight, fullRows, seed=0):
+    rng = random.Random(seed)
+    board = Board()
+    rowsToFill = rng.sample(range(board.height - stackHeight, board.height), fullRows)
+    for y in range(board.height - stackHeight, board.height):
+        hole = None if y in rowsToFill else rng.randrange(board.width)
+        board.place([(x, y) for x in range(board.width) if x != hole], COLOR)
+    return board
+
+def checkNonAdjacentClear():
+    board = Board()
+    full = list(range(board.width))
+    # Rows 19 and 17 full, row 18 and 16 with a single marker block
+    board.place([(x, 19) for x in full], COLOR)
+    board.place([(0, 18)], COLOR)
+    board.place([(x, 17) for x in full], COLOR)
+    board.place([(5, 16)], COLOR)
+    assert board.clearFullRows() == [17, 19]
+    assert board.rows[19] == 1 << 0, 'row between cleared rows should drop by one'
+    assert board.rows[18] == 1 << 5, 'row above both cleared rows should drop by two'
+    assert not any(board.rows[:18])
+    assert board.colorAt(0, 19) == COLOR and board.colorAt(1, 19) is None
+
+def main():
+    checkNonAdjacentClear()
+
+    rows = []
+    for stackHeight, fullRows in ((4, 1), (8, 2), (16, 4), (20, 4), (20, 8)):
+        board = makeDenseBoard(stackHeight, fullRows)
+        saved = board.snapshot()
+
+        def restore():
+            board.restore(saved)
+
+        def restoreAndClear():
+            restore()
+            board.clearFullRows()
+
+        ns = timePerCall(restoreAndClear, 5000) - timePerCall(restore, 5000)
+        rows.append((stackHeight, fullRows, f'{ns:.0f}', f'{1e9/ns:,.0f}'))
+    printTable(('stack height', 'full rows', 'ns/clear', 'clears/s'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+'''
+Landing row lookup for hard drop and the ghost piece: Board.dropY from the column height index
+vs. moving the shape down one row at a time with masksTouchGround (what reaching the ground
+by gravity or soft drop amounts to). Also checks that both give the same row and that the
+column index stays equal to a rebuild from the rows during real games.
+'''
+from benchmarks.common import timePerCall, makeFilledBoard, printTable
+from board import Board
+from game import GameState, SPAWNY
+from pieces import PIECETABLES
+from policies import makeRandomPolicy, makeAIPolicy
+
+FILLEDROWS = (0, 5, 10, 15)
+
+def stepDown(board, shape, x, y):
+    while not board.masksTouchGround(shape.rowMasks, x, y):
+        y += 1
+    return y
+
+# Every shape at every column of the board, dropped from the spawn row
+def allDrops(board):
+    return [(rotation, x) for table in PIECETABLES for rotation in table.rotations
+            for x in range(-rotation.minDx, board.width - rotation.maxDx)]
+
+def checkColumnTops(makePolicy, seeds=range(5), maxTicks=20000):
+    for seed in seeds:
+        state = GameState(seed)
+        policy = makePolicy(seed)
+        expected = Board(state.board.width, state.board.height)
+        while not state.isGameOver and state.ticks < maxTicks:
+            state.step(policy(state))
+            expected.rows = list(state.board.rows)
+            expected.updateColumnTops()
+            assert state.board.columnTops == expected.columnTops, f'seed {seed} tick {state.ticks}'
+            piece = state.piece
+            assert state.landingY() == stepDown(state.board, piece.shape, piece.x, piece.y)
+
+def main():
+    checkColumnTops(makeRandomPolicy)
+    checkColumnTops(makeAIPolicy, range(2), 5000)
+
+    rows = []
+    for filledRows in FILLEDROWS:
+        board = makeFilledBoard(filledRows)
+        drops = allDrops(board)
+        for rotation, x in drops:
+            assert board.dropY(rotation, x, SPAWNY) == stepDown(board, rotation, x, SPAWNY)
+
+        def runStepDown():
+            for rotation, x in drops:
+                stepDown(board, rotation, x, SPAWNY)
+
+        def runDropY():
+            for rotation, x in drops:
+                board.dropY(rotation, x, SPAWNY)
+
+        stepNs = timePerCall(runStepDown, 200) / len(drops)
+        dropNs = timePerCall(runDropY, 200) / len(drops)
+        rows.append((filledRows, f'{stepNs:.0f}', f'{dropNs:.0f}', f'{stepNs / dropNs:.1f}x'))
+
+    print('ns per landing row lookup from the spawn row, averaged over all shapes and columns')
+    printTable(('filled rows', 'row by row', 'column index', 'speedup'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+'''
+Line clear, lock and game over effects: frame cost of BoardRenderer with the effects of
+effects.EffectPool playing vs. the same frames without effects, on games of the autoplayer that
+end with random inputs, drawn one frame per tick on a fake clock under the SDL dummy video
+driver. The old game over waited 500 ms in pygame.time.wait(); now the board fades out over
+FADETIME while frames (and input handling) go on.
+
+Checks first that a collapse starts from the board as it was before the clear, with the cleared
+rows empty, and ends on the board after the clear, that nothing of an effect is left on screen
+once it ended, and that the pool hands out only its own Effect objects and doesn't grow memory
+however many effects are started.
+'''
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import time, tracemalloc
+from collections import namedtuple
+from types import SimpleNamespace
+
+import pygame
+
+from benchmarks.bench_input import percentile
+from benchmarks.common import printTable
+from board import Board
+from effects import EffectPool, EFFECT_FADE, ROWFLASHTIME, COLLAPSETIME, FADETIME
+from game import GameState, EVENT_LOCK, EVENT_CLEAR, EVENT_GAMEOVER
+from pieces import Piece, PIECETABLES
+from policies import makeAIPolicy, makeRandomPolicy
+from renderer import BoardRenderer
+from scheduler import TICKRATE
+
+WINDOWSIZE = (550, 600)
+ORIGIN = (82, 60)
+BLOCKSIZE = 25
+BLOCKGAPSIZE = 2
+BGCOLOR = (0, 0, 0)
+AITICKS = 3000      # Ticks the autoplayer plays (clearing lines) before random inputs end the game
+GAMES = 4
+FPS = 60
+LEGACYGAMEOVERWAIT = 0.5
+
+# What BoardRenderer needs of a GameState, for boards without a falling shape on them
+View = namedtuple('View', 'board piece')
+
+def makeRenderer(surf):
+    return BoardRenderer(surf, ORIGIN, 10, 20, BLOCKSIZE, BLOCKGAPSIZE, BGCOLOR, showGhost=False)
+
+def boardPixels(surf, renderer):
+    return pygame.image.tobytes(surf.subsurface(renderer.boardRect), 'RGB')
+
+# Shape above the top of the board, where it isn't drawn
+def hiddenPiece():
+    piece = Piece()
+    piece.spawn(PIECETABLES[0], 0, -10)
+    return piece
+
+# Board as it was right before the clear: the snapshot taken before the step plus the shape that locked,
+# with the cleared rows emptied (in the palette of board)
+def boardBeforeClear(board, snapshot, lockPose, clearedRows):
+    before = Board(board.width, board.height)
+    before.restore(snapshot)
+    before.palette = board.palette
+    rows = {y: (before.rows[y], bytearray(before.colors[y])) for y in range(board.height)}
+    piece = Piece()
+    table, rotation, x, y = lockPose
+    piece.spawn(table, x, y)
+    piece.setRotation(rotation)
+    for cellX, cellY in piece.cells():
+        if cellY < 0:
+            continue
+        mask, rowColors = rows[cellY]
+        rowColors[cellX] = board.colorIndex(table.color)
+        rows[cellY] = (mask | 1 << cellX, rowColors)
+    for y in clearedRows:
+        rows[y] = (0, before.emptyColors)
+    before.setRows((y, mask, bytes(rowColors)) for y, (mask, rowColors) in rows.items())
+    return before
+
+def checkCollapse(clears=30):
+    surf = pygame.Surface(WINDOWSIZE).convert()
+    referenceSurf = pygame.Surface(WINDOWSIZE).convert()
+    piece = hiddenPiece()
+    checked = 0
+    seed = 0
+    while checked < clears:
+        state = GameState(seed)
+        policy = makeAIPolicy(seed)
+        seed += 1
+        renderer = makeRenderer(surf)
+        effects = EffectPool()
+        while not state.isGameOver and state.ticks < AITICKS and checked < clears:
+            snapshot = state.board.snapshot()
+            state.step(policy(state))
+            now = state.ticks / TICKRATE
+            effects.startFromEvents(state, now)
+            events = dict(state.events)
+            clearedRows = events.get(EVENT_CLEAR)
+            if clearedRows is None:
+                continue
+            checked += 1
+            view = View(state.board, piece)
+
+            # Flash just over: the old rows, where they were
+            effects.update(now + ROWFLASHTIME)
+            renderer.render(view, effects=effects, now=now + ROWFLASHTIME)
+            reference = makeRenderer(referenceSurf)
+            reference.render(View(boardBeforeClear(state.board, snapshot, events[EVENT_LOCK], clearedRows), piece))
+            assert boardPixels(surf, renderer) == boardPixels(referenceSurf, reference), \
+                f'seed {seed - 1} tick {state.ticks}: collapse of rows {clearedRows} starts from another board'
+
+            # Collapse just about done, then over: the board as it is
+            end = now + ROWFLASHTIME + COLLAPSETIME
+            reference = makeRenderer(referenceSurf)
+            reference.render(view)
+            for frameTime in (end - 1e-9, end):
+                effects.update(frameTime)
+                renderer.render(view, effects=effects, now=frameTime)
+                assert boardPixels(surf, renderer) == boardPixels(referenceSurf, reference), \
+                    f'seed {seed - 1} tick {state.ticks}: collapse of rows {clearedRows} left something behind'
+            assert not effects.active
+            effects.update(end)
+
+# Per tick events of a few games, for feeding the pool without running them
+def recordSteps(games=GAMES):
+    steps = []
+    for seed in range(games):
+        state = GameState(seed)
+        policy = makeAIPolicy(seed)
+        while not state.isGameOver and state.ticks < AITICKS:
+            state.step(policy(state))
+            if state.events:
+                steps.append(SimpleNamespace(events=list(state.events), board=SimpleNamespace(version=state.board.version)))
+    return steps
+
+def checkPool():
+    steps = recordSteps()
+    effects = EffectPool()
+    pooled = {id(effect) for effect in effects.effects}
+    original = effects.start
+    def start(*args, **kwargs):
+        effect = original(*args, **kwargs)
+        assert id(effect) in pooled, 'the pool made a new Effect'
+        return effect
+    effects.start = start
+
+    def play(rounds):
+        now = 0.0
+        for _ in range(rounds):
+            for step in steps:
+                now += 1 / TICKRATE
+                effects.startFromEvents(step, now)
+                effects.update(now)
+
+    play(1)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    play(10)
+    grown = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    assert effects.started > 100
+    assert grown < 1024, f'playing effects grew memory by {grown} bytes'
+    return effects.started, grown
+
+# Frame times (render + display update) of games drawn one frame per tick; returns (frame ns list, effect frames,
+# frames from game over until the game loop would return)
+def playFrames(displaySurf, withEffects):
+    frames = []
+    effectFrames = 0
+    gameOverFrames = 0
+    for seed in range(GAMES):
+        state = GameState(seed)
+        aiPolicy, randomPolicy = makeAIPolicy(seed), makeRandomPolicy(seed)
+        renderer = makeRenderer(displaySurf)
+        effects = EffectPool() if withEffects else None
+        displaySurf.fill(BGCOLOR)
+        endTime = None
+        tick = 0
+        while True:
+            now = tick / TICKRATE
+            if not state.isGameOver:
+                previousPose = state.piece.pose()
+                state.step(aiPolicy(state) if state.ticks < AITICKS else randomPolicy(state))
+                if effects is not None:
+                    effects.startFromEvents(state, now)
+            elif endTime is None:
+                endTime = now + (FADETIME if withEffects else 0.0)
+            start = time.perf_counter_ns()
+            if effects is not None:
+                effects.update(now)
+                effectFrames += bool(effects.active)
+            pygame.display.update(renderer.render(state, 1.0, previousPose, effects, now))
+            frames.append(time.perf_counter_ns() - start)
+            if endTime is not None:
+                gameOverFrames += 1
+                if now >= endTime:
+                    break
+            tick += 1
+        if withEffects:
+            assert any(event == EVENT_GAMEOVER for event, _ in state.events) or effects.isPlaying(EFFECT_FADE)
+    return frames, effectFrames, gameOverFrames
+
+def main():
+    pygame.display.init()
+    displaySurf = pygame.display.set_mode(WINDOWSIZE)
+    checkCollapse()
+    started, grown = checkPool()
+
+    rows = []
+    for name, withEffects in (('no effects', False), ('EffectPool', True)):
+        frames, effectFrames, gameOverFrames = playFrames(displaySurf, withEffects)
+        if withEffects:
+            assert percentile(frames, 0.99) < 1e9 / FPS, 'frames with effects should fit in a frame at 60 FPS'
+            assert gameOverFrames >= FADETIME * TICKRATE
+        gameOverStall = '-' if withEffects else f'{LEGACYGAMEOVERWAIT * 1e3:.0f} ms wait'
+        rows.append((name, len(frames), effectFrames, f'{percentile(frames, 0.5) / 1e3:.1f}',
+                     f'{percentile(frames, 0.99) / 1e3:.1f}', f'{max(frames) / 1e3:.1f}',
+                     f'{gameOverFrames / GAMES:.0f}', gameOverStall))
+
+    print(f'{GAMES} games, one frame per tick; the autoplayer clears lines for {AITICKS} ticks, then random inputs end the game')
+    printTable(('frames', 'count', 'with effects', 'p50 us', 'p99 us', 'max us', 'frames at game over', 'game over stall'), rows)
+    print(f'\n{started} effects started from the pool while checking it, memory grown by {grown} bytes')
+
+if __name__ == '__main__':
+    main()
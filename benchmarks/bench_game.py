@@ -0,0 +1,30 @@
+'''
+Headless simulation throughput: whole games played through GameState.step with no display,
+no pygame import and no frame limit.
+'''
+import sys, time
+
+from benchmarks.common import printTable
+from game import GameState, runUntilGameOver
+from policies import POLICIES
+
+# The autoplayer doesn't lose, so it gets a few games capped at MAXTICKS
+GAMES = {'ai': 5}
+MAXTICKS = 10000
+
+def main(games=200):
+    rows = []
+    for name, makePolicy in POLICIES.items():
+        policyGames = GAMES.get(name, games)
+        ticks = 0
+        start = time.perf_counter()
+        for seed in range(policyGames):
+            state = runUntilGameOver(GameState(seed), makePolicy(seed), MAXTICKS)
+            ticks += state.ticks
+        elapsed = time.perf_counter() - start
+        rows.append((name, policyGames, f'{ticks/policyGames:.0f}', f'{policyGames/elapsed:,.1f}', f'{ticks/elapsed:,.0f}'))
+    printTable(('policy', 'games', 'ticks/game', 'games/s', 'ticks/s'), rows)
+    assert 'pygame' not in sys.modules, 'headless simulation should not import pygame'
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+'''
+Board geometry and window size: game logic per tick for several board sizes, each played once per
+window size after main.setLayout() fitted the window to the board, and the frame cost of
+BoardRenderer at the block size that layout picked. Runs under the SDL dummy video driver.
+
+Checks that the same seeds and inputs play exactly the same games whatever the window size (the
+logic only works in grid cells), that logic time per tick doesn't depend on the window size, and
+that frames never create sprites: a layout draws its sprites once, at its own block size.
+'''
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import random, time
+
+import pygame
+
+import main as game_main
+import renderer
+from benchmarks.common import makeFilledBoard, printTable
+from game import GameState
+
+GEOMETRIES = ((10, 20), (20, 20), (10, 40), (20, 40))   # Board width x height in blocks
+WINDOWS = ((550, 600), (1100, 1200), (2200, 2400))
+LOGICTICKS = 50000
+FRAMES = 2000
+INPUTCHOICES = (0, 0, 0, 1, 2, 4, 8, 32, 64, 32 | 8)    # Held keys, shifts and a shift with a rotation
+TOLERANCE = 1.5     # Logic time of the slowest window size against the fastest one, for timing noise
+
+# Play LOGICTICKS ticks of random games on the board size, starting a new game after a game over.
+# Returns (best ns per tick, fingerprint of every game played).
+def timeLogic(width, height, rounds=5):
+    rng = random.Random(0)
+    inputs = [rng.choice(INPUTCHOICES) for _ in range(LOGICTICKS)]
+    best = None
+    for _ in range(rounds):
+        games = []
+        state = GameState(0, width, height)
+        start = time.perf_counter_ns()
+        for tickInputs in inputs:
+            state.step(tickInputs)
+            if state.isGameOver:
+                games.append((state.score, state.pieces, state.board.hash))
+                state = GameState(len(games), width, height)
+        elapsed = (time.perf_counter_ns() - start) / LOGICTICKS
+        games.append((state.score, state.pieces, state.board.hash))
+        best = elapsed if best is None else min(best, elapsed)
+    return best, games
+
+# Frames with the falling shape moving on a half full board, at the block size of the current layout.
+# Returns (ns per frame, sprites created while rendering them).
+def timeFrames(displaySurf, width, height):
+    state = GameState(0, width, height)
+    state.board = makeFilledBoard(height // 2, width=width, height=height)
+    state.piece.y = 0
+    boardRenderer = game_main.makeBoardRenderer(state.board)
+    pygame.display.update(boardRenderer.render(state))
+
+    moves = (1, 1, -1, -1)
+    spritesBefore = len(renderer.SPRITES)
+    start = time.perf_counter_ns()
+    for frame in range(FRAMES):
+        state.piece.x += moves[frame % len(moves)]
+        pygame.display.update(boardRenderer.render(state))
+    elapsed = (time.perf_counter_ns() - start) / FRAMES
+    return elapsed, len(renderer.SPRITES) - spritesBefore
+
+def main():
+    pygame.display.init()
+    timeLogic(*GEOMETRIES[0])   # Warm up
+    rows = []
+    for width, height in GEOMETRIES:
+        logicTimes = []
+        expectedGames = None
+        for windowWidth, windowHeight in WINDOWS:
+            game_main.DISPLAYSURF = displaySurf = pygame.display.set_mode((windowWidth, windowHeight))
+            game_main.setLayout(windowWidth, windowHeight, width, height)
+
+            logicNs, games = timeLogic(width, height)
+            if expectedGames is None:
+                expectedGames = games
+            assert games == expectedGames, f'{width}x{height}: other games in a {windowWidth}x{windowHeight} window'
+            logicTimes.append(logicNs)
+
+            renderNs, spritesCreated = timeFrames(displaySurf, width, height)
+            assert spritesCreated == 0, f'{width}x{height} in {windowWidth}x{windowHeight}: frames created {spritesCreated} sprites'
+
+            rows.append((f'{width}x{height}', width*height, f'{windowWidth}x{windowHeight}', game_main.BLOCKSIZE,
+                         f'{logicNs / 1e3:.2f}', f'{renderNs / 1e3:.1f}'))
+        assert max(logicTimes) < TOLERANCE * min(logicTimes), \
+            f'{width}x{height}: logic time depends on the window size: {[round(ns) for ns in logicTimes]} ns/tick'
+
+    # One sprite (and one ghost) per color and block size, however many frames were drawn
+    blockSizes = {key[1] for key in renderer.SPRITES}
+    colors = {key[0] for key in renderer.SPRITES}
+    assert len(renderer.SPRITES) <= 2 * len(colors) * len(blockSizes)
+
+    print(f'{LOGICTICKS} logic ticks of random inputs and {FRAMES} frames with a moving shape per board and window')
+    printTable(('board', 'cells', 'window', 'block px', 'logic us/tick', 'render us/frame'), rows)
+    print(f'\n{len(renderer.SPRITES)} sprites drawn in total for {len(blockSizes)} block sizes, none of them during a frame')
+
+if __name__ == '__main__':
+    main()
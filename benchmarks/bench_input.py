@@ -0,0 +1,234 @@
+'''
+Input-to-move latency: scripted key presses played through the old frame-polled input handling
+(held keys read with get_pressed() once per frame, rotation and hard drop from the frame's
+KEYDOWN events, MOVEDELAY ticks between moves) and through controls.KeyboardInput, both driving
+a GameState with gravity turned off, on a fake clock at several framerates and with frame drops.
+
+Latency is measured from the moment a key goes down to the frame that runs the tick in which
+the shape moved or rotated. Pygame events carry no timestamps, so both front ends only see a
+key when the next frame takes it from the event queue (so a frame longer than DAS can turn a
+tap into an auto shift, as the key looks held until then). Taps are isolated key presses of 20 to
+120 ms. Bursts are a move and two rotations pressed within 20 ms of each other, which have to
+be applied completely and in that order.
+
+Checks that KeyboardInput loses no presses, keeps every burst in order, applies presses within
+a frame (plus a tick) of the key going down, and that a held key moves the shape the same
+number of columns (DAS, then every ARR) at every framerate.
+'''
+import random
+
+from benchmarks.common import printTable
+from controls import KeyboardInput, ROTATE, HARDDROP, DAS, ARR
+from game import GameState, EVENT_ROTATE, INPUT_LEFT, INPUT_RIGHT, INPUT_ROTATE, INPUT_HARDDROP, PRESSINPUTS, \
+    SHIFTINPUTS, LEFT, RIGHT
+from pieces import PIECETABLES
+from scheduler import FixedTimestep, TICKRATE
+
+SECONDS = 60
+HITCHEVERY = 0.5        # Seconds between dropped frames in the 'frame drops' pacing
+HITCHFRAME = (0.05, 0.15)  # Shorter than DAS: a key up seen only after DAS would rightly auto shift
+TAPGAP = (0.25, 0.35)   # Seconds between taps; longer than a move plus its latency, so effects match their press
+TAPLENGTH = (0.02, 0.12)
+BURSTGAP = 0.3
+BURSTSPACING = 0.01     # Between the presses of a burst
+BURSTPRESS = 0.005      # How long each key of a burst is held
+HOLDSECONDS = 0.375     # Key held for the DAS/ARR check; no repeat is due within a frame after the release
+
+# Frame start times for SECONDS of play
+def framePacing(name, seed=0):
+    rng = random.Random(seed)
+    times = [0.0]
+    nextHitch = HITCHEVERY
+    while times[-1] < SECONDS:
+        if name == 'frame drops':
+            frame = 1 / 60
+            if times[-1] >= nextHitch:
+                frame = rng.uniform(*HITCHFRAME)
+                nextHitch += HITCHEVERY
+        else:
+            frame = 1 / name
+        times.append(times[-1] + frame)
+    return times
+
+# (time, action, isDown) key events sorted by time, and the presses: (time, action) of every key down
+def tapScript(seed=0):
+    rng = random.Random(seed)
+    events = []
+    actions = (LEFT, ROTATE, RIGHT, ROTATE)
+    now = 0.1
+    index = 0
+    while now < SECONDS - 1:
+        action = actions[index % len(actions)]
+        events += [(now, action, True), (now + rng.uniform(*TAPLENGTH), action, False)]
+        now += rng.uniform(*TAPGAP)
+        index += 1
+    return events
+
+def burstScript():
+    events = []
+    now = 0.1
+    index = 0
+    while now < SECONDS - 1:
+        for offset, action in enumerate((LEFT if index % 2 else RIGHT, ROTATE, ROTATE)):
+            pressed = now + offset*BURSTSPACING
+            events += [(pressed, action, True), (pressed + BURSTPRESS, action, False)]
+        now += BURSTGAP
+        index += 1
+    return sorted(events, key=lambda event: event[0])
+
+# Game where only the keys move the shape: gravity off, always a T piece
+def makeState():
+    state = GameState(0)
+    state.fallingSpeed = 10**9
+    state.spawn(next(table for table in PIECETABLES if table.name == 'T'))
+    return state
+
+# Step the game, returning the kinds of what the step did: LEFT, RIGHT and ROTATE
+def stepEffects(state, inputs):
+    x = state.piece.x
+    state.step(inputs)
+    effects = [ROTATE for event, _ in state.events if event == EVENT_ROTATE]
+    if state.piece.x != x:
+        effects.append(LEFT if state.piece.x < x else RIGHT)
+    return effects
+
+# How main.py read the keys before controls.py; returns [(frame time, effect)] in the order applied
+def playLegacy(frameTimes, events):
+    state = makeState()
+    timestep = FixedTimestep(TICKRATE, clock=lambda: now)
+    held = set()
+    applied = []
+    pendingPresses = 0
+    eventIndex = 0
+    for now in frameTimes:
+        inputs = pendingPresses
+        while eventIndex < len(events) and events[eventIndex][0] <= now:
+            _, action, isDown = events[eventIndex]
+            eventIndex += 1
+            if isDown:
+                held.add(action)
+                if action == ROTATE:
+                    inputs |= INPUT_ROTATE
+                elif action == HARDDROP:
+                    inputs |= INPUT_HARDDROP
+            else:
+                held.discard(action)
+        # get_pressed(): what is held at the moment the frame looks
+        if LEFT in held:
+            inputs |= INPUT_LEFT
+        if RIGHT in held:
+            inputs |= INPUT_RIGHT
+        ticks = timestep.advance()
+        for _ in range(ticks):
+            applied += [(now, effect) for effect in stepEffects(state, inputs)]
+            inputs &= ~PRESSINPUTS
+        pendingPresses = inputs & PRESSINPUTS if ticks == 0 else 0
+    return applied
+
+def playKeyboard(frameTimes, events):
+    state = makeState()
+    timestep = FixedTimestep(TICKRATE, clock=lambda: now)
+    keyboard = KeyboardInput(clock=lambda: now)
+    applied = []
+    eventIndex = 0
+    for now in frameTimes:
+        while eventIndex < len(events) and events[eventIndex][0] <= now:
+            _, action, isDown = events[eventIndex]
+            eventIndex += 1
+            keyboard.handleKey(action, isDown)
+        ticks = timestep.advance()
+        for index in range(ticks):
+            applied += [(now, effect) for effect in stepEffects(state, keyboard.takeInputs(timestep.tickTime(index, ticks)))]
+    return applied
+
+# Latency of every tap to its first effect before the next tap; None when the tap was lost
+def tapLatencies(events, applied):
+    presses = [(time, action) for time, action, isDown in events if isDown]
+    latencies = []
+    effectIndex = 0
+    for pressIndex, (time, action) in enumerate(presses):
+        nextPress = presses[pressIndex + 1][0] if pressIndex + 1 < len(presses) else float('inf')
+        while effectIndex < len(applied) and applied[effectIndex][0] < time:
+            effectIndex += 1
+        latency = None
+        index = effectIndex
+        while index < len(applied) and applied[index][0] < nextPress:
+            if applied[index][1] == action:
+                latency = applied[index][0] - time
+                break
+            index += 1
+        latencies.append(latency)
+    return latencies
+
+# Bursts whose effects are exactly the pressed keys in the pressed order
+def burstsInOrder(events, applied):
+    presses = [(time, action) for time, action, isDown in events if isDown]
+    bursts = [presses[index:index + 3] for index in range(0, len(presses), 3)]
+    complete = 0
+    for index, burst in enumerate(bursts):
+        end = bursts[index + 1][0][0] if index + 1 < len(bursts) else float('inf')
+        effects = [effect for time, effect in applied if burst[0][0] <= time < end]
+        complete += effects == [action for _, action in burst]
+    return complete, len(bursts)
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+# Columns a held key moves with KeyboardInput at the given framerate
+def heldKeyShifts(fps):
+    now = 0.0
+    timestep = FixedTimestep(TICKRATE, clock=lambda: now)
+    keyboard = KeyboardInput(clock=lambda: now)
+    keyboard.handleKey(RIGHT, True)
+    released = False
+    shifts = 0
+    for frame in range(fps):
+        now = frame / fps
+        if now >= HOLDSECONDS and not released:
+            keyboard.handleKey(RIGHT, False)
+            released = True
+        ticks = timestep.advance()
+        for index in range(ticks):
+            shifts += bool(keyboard.takeInputs(timestep.tickTime(index, ticks)) & SHIFTINPUTS)
+    return shifts
+
+def checkHeldKey():
+    expected = 2 + int((HOLDSECONDS - DAS) / ARR)
+    for fps in (30, 60, 144):
+        shifts = heldKeyShifts(fps)
+        assert shifts == expected, f'{fps} fps: held key moved {shifts} columns instead of {expected}'
+
+def main():
+    checkHeldKey()
+
+    taps, bursts = tapScript(), burstScript()
+    rows = []
+    for pacing in (144, 60, 30, 'frame drops'):
+        frameTimes = framePacing(pacing)
+        longestFrame = max(b - a for a, b in zip(frameTimes, frameTimes[1:]))
+        name = f'{pacing} fps' if isinstance(pacing, int) else pacing
+        tapsApplied = {}
+        for frontEnd, play in (('get_pressed', playLegacy), ('KeyboardInput', playKeyboard)):
+            latencies = tapLatencies(taps, play(frameTimes, taps))
+            measured = [latency for latency in latencies if latency is not None]
+            lost = len(latencies) - len(measured)
+            inOrder, burstCount = burstsInOrder(bursts, play(frameTimes, bursts))
+            tapsApplied[frontEnd] = latencies
+            rows.append((name, frontEnd, len(latencies), lost, f'{sum(measured) / len(measured) * 1e3:.1f}',
+                         f'{percentile(measured, 0.95) * 1e3:.1f}', f'{max(measured) * 1e3:.1f}', f'{inOrder}/{burstCount}'))
+            if frontEnd == 'KeyboardInput':
+                assert lost == 0, f'{name}: {lost} taps lost'
+                assert inOrder == burstCount, f'{name}: {burstCount - inOrder} bursts lost presses or changed their order'
+                assert max(measured) <= longestFrame + 1 / TICKRATE + 1e-9, f'{name}: a press waited more than a frame'
+        # Compared on the taps both applied; polling loses the ones that would have waited longest
+        both = [(old, new) for old, new in zip(tapsApplied['get_pressed'], tapsApplied['KeyboardInput'])
+                if old is not None and new is not None]
+        assert all(new <= old + 1e-9 for old, new in both), f'{name}: KeyboardInput applied a tap later than polling'
+
+    print(f'{SECONDS} s of scripted key presses per pacing, taps of {TAPLENGTH[0]*1e3:.0f}-{TAPLENGTH[1]*1e3:.0f} ms; '
+          f'bursts are a move and two rotations within {2*BURSTSPACING*1e3:.0f} ms')
+    printTable(('pacing', 'input', 'taps', 'lost', 'mean ms', 'p95 ms', 'max ms', 'bursts in order'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+'''
+Rotations per second: reparsing template string matrices into fresh pygame.Rects (old
+createShapeRects, including the rollback on a blocked rotation) vs. precompiled piece tables.
+'''
+import pygame
+
+from benchmarks.common import timePerCall, makeFilledBoard, printTable
+from blocks_templates import T_SHAPE_TEMPLATE
+from pieces import PIECESBYNAME, Piece
+
+BLOCKSIZE = 25
+
+# Old implementation, kept here only as a reference point
+def legacyCreateShapeRects(shape, rotationCounter, currentRectsCoords, positionX, positionY):
+    if rotationCounter < len(shape):
+        currentShape = shape[rotationCounter]
+    else:
+        currentShape = shape[0]
+        rotationCounter = 0
+    currentShapePositioningRect = None
+    currentRectsCoords = []
+    for rowIndex, row in enumerate(currentShape):
+        for blockIndex, block in enumerate(row):
+            if rowIndex == 1 and blockIndex == 1:
+                currentShapePositioningRect = pygame.Rect(positionX, positionY, BLOCKSIZE, BLOCKSIZE)
+            if block == '1':
+                left = positionX + blockIndex*BLOCKSIZE
+                top = positionY + rowIndex*BLOCKSIZE
+                currentRectsCoords.append(pygame.Rect(left, top, BLOCKSIZE, BLOCKSIZE))
+    return currentRectsCoords, rotationCounter, currentShapePositioningRect
+
+def main():
+    shape = T_SHAPE_TEMPLATE[:-1]
+    state = {'rotationCounter': 0, 'rects': [], 'x': 3*BLOCKSIZE, 'y': 5*BLOCKSIZE}
+
+    def legacyRotate():
+        state['rects'], state['rotationCounter'], _ = legacyCreateShapeRects(
+            shape, state['rotationCounter'] + 1, state['rects'], state['x'], state['y'])
+
+    def legacyRotateWithRollback():
+        legacyRotate()
+        state['rects'], state['rotationCounter'], _ = legacyCreateShapeRects(
+            shape, state['rotationCounter'] - 1, state['rects'], state['x'], state['y'])
+
+    piece = Piece()
+    piece.spawn(PIECESBYNAME['T'], 3, 5)
+    board = makeFilledBoard(10)
+
+    def tableRotate():
+        piece.setRotation(piece.rotationCounter + 1)
+
+    def tableRotateWithCheck():
+        nextShape = piece.nextShape()
+        if not board.masksCollide(nextShape.rowMasks, piece.x, piece.y):
+            piece.setRotation(piece.rotationCounter + 1)
+
+    rows = []
+    for name, func in (('string matrices', legacyRotate),
+                       ('string matrices + rollback', legacyRotateWithRollback),
+                       ('piece tables', tableRotate),
+                       ('piece tables + collision check', tableRotateWithCheck)):
+        ns = timePerCall(func, 20000)
+        rows.append((name, f'{ns:.0f}', f'{1e9/ns:,.0f}'))
+    printTable(('rotation', 'ns/call', 'rotations/s'), rows)
+
+if __name__ == '__main__':
+    main()
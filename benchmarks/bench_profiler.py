@@ -0,0 +1,69 @@
+'''
+Cost of the frame profiler: a headless game loop marked like runGame, with profiling off
+(NullProfiler), on, and on with the full trace kept for export. Also checks the rolling
+percentiles against known samples.
+'''
+import os, tempfile, json
+
+from benchmarks.common import timePerCall, printTable
+from game import GameState
+from policies import makeRandomPolicy
+from profiler import FrameProfiler, NullProfiler, FRAME
+
+FRAMES = 5000
+
+def checkPercentiles():
+    profiler = FrameProfiler(windowSize=100)
+    for ns in range(1, 201):
+        profiler.startFrame()
+        profiler.add('phase', ns)
+    profiler.startFrame()
+    # Only the last 100 frames (101..200) are in the window
+    assert profiler.percentiles('phase') == (150.5, 195.05, 199.01), profiler.percentiles('phase')
+    assert profiler.frames == 200
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'trace.json')
+        profiler.export(path)
+        with open(path) as file:
+            trace = json.load(file)
+    assert len(trace['trace']) == 200 and trace['phases'] == ['phase', FRAME]
+
+def makeLoop(profiler):
+    def run():
+        state = GameState(1)
+        policy = makeRandomPolicy(1)
+        profiler.instrument(state.board, 'masksCollide', 'collision')
+        profiler.instrument(state.board, 'masksTouchGround', 'collision')
+        profiler.instrument(state.board, 'clearFullRows', 'lineclear')
+        for _ in range(FRAMES):
+            profiler.startFrame()
+            inputs = policy(state)
+            profiler.mark('input')
+            state.step(inputs)
+            profiler.mark('logic')
+            profiler.mark('render')
+            profiler.mark('panel')
+            profiler.mark('update')
+            profiler.mark('idle')
+            if state.isGameOver:
+                state = GameState(1)
+    return run
+
+def main():
+    checkPercentiles()
+
+    rows = []
+    baseline = None
+    for name, createProfiler in (('off (NullProfiler)', NullProfiler),
+                                 ('on', lambda: FrameProfiler(keepTrace=False)),
+                                 ('on, keep trace', FrameProfiler)):
+        ns = timePerCall(lambda: makeLoop(createProfiler())(), 1, 3) / FRAMES
+        if baseline is None:
+            baseline = ns
+        rows.append((name, f'{ns/1000:.2f}', f'{(ns - baseline)/1000:+.2f}'))
+    print(f'{FRAMES} frames of a headless game loop')
+    printTable(('profiler', 'us/frame', 'overhead'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+'''
+Cost of drawing the next piece from PieceSource for every randomizer and lookahead depth,
+compared with a 60 FPS frame budget. Also checks that a seed reproduces the same pieces.
+'''
+from benchmarks.common import timePerCall, printTable
+from randomizers import PieceSource, RANDOMIZERS
+
+FRAMEBUDGETNS = 1e9 / 60
+
+# Same seed has to deal the same pieces whatever the lookahead depth
+def checkReproducible(name):
+    sequences = []
+    for lookahead in (1, 3, 7):
+        source = PieceSource(42, name, lookahead)
+        sequences.append([source.next().name for _ in range(50)])
+    assert sequences[0] == sequences[1] == sequences[2], f'{name} randomizer is not reproducible'
+
+def main():
+    rows = []
+    for name in RANDOMIZERS:
+        checkReproducible(name)
+        for lookahead in (1, 6):
+            source = PieceSource(0, name, lookahead)
+            nextNs = timePerCall(source.next, 20000)
+            peekNs = timePerCall(lambda: source.peek(lookahead - 1), 20000)
+            rows.append((name, lookahead, f'{nextNs:.0f}', f'{peekNs:.0f}', f'{100*nextNs/FRAMEBUDGETNS:.4f}%'))
+    printTable(('randomizer', 'lookahead', 'next ns', 'peek ns', 'of 60 FPS frame'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+'''
+Frame cost on a near-full board: full redraw with pygame.draw.rect and whole-window
+display.update (old drawFiguresOnTheGround/drawShape) vs. BoardRenderer with cached sprites
+and dirty rects. Runs under the SDL dummy video driver.
+'''
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from benchmarks.common import timePerCall, makeFilledBoard, printTable
+from game import GameState
+from renderer import BoardRenderer
+
+BLOCKSIZE = 25
+BLOCKGAPSIZE = 2
+ORIGIN = (82, 60)
+BGCOLOR = (0, 0, 0)
+
+def legacyFrame(displaySurf, boardSurf, state):
+    displaySurf.fill(BGCOLOR)
+    boardSurf.fill(BGCOLOR)
+    for x, y, color in state.board.iterCells():
+        pygame.draw.rect(boardSurf, color, (x*BLOCKSIZE+BLOCKGAPSIZE, y*BLOCKSIZE+BLOCKGAPSIZE, BLOCKSIZE-BLOCKGAPSIZE, BLOCKSIZE-BLOCKGAPSIZE))
+    piece = state.piece
+    for dx, dy in piece.shape.cells:
+        left, top = (piece.x + dx)*BLOCKSIZE, (piece.y + dy)*BLOCKSIZE
+        pygame.draw.rect(boardSurf, piece.color, (left+BLOCKGAPSIZE, top+BLOCKGAPSIZE, BLOCKSIZE-BLOCKGAPSIZE, BLOCKSIZE-BLOCKGAPSIZE))
+    displaySurf.blit(boardSurf, ORIGIN)
+    pygame.display.update()
+
+def makeRenderer(surf, state):
+    return BoardRenderer(surf, ORIGIN, state.board.width, state.board.height, BLOCKSIZE, BLOCKGAPSIZE, BGCOLOR)
+
+def main():
+    pygame.display.init()
+    displaySurf = pygame.display.set_mode((550, 600))
+    boardSurf = pygame.Surface((250, 500))
+
+    state = GameState(0)
+    state.board = makeFilledBoard(18)
+    state.piece.y = 0
+    renderer = makeRenderer(displaySurf, state)
+    renderer.render(state)
+
+    # Falling shape moves every frame, so there is always something to redraw
+    moves = [1, 1, -1, -1]
+    frame = [0]
+    def moveShape():
+        state.piece.x += moves[frame[0] % len(moves)]
+        frame[0] += 1
+
+    def rendererFrame():
+        moveShape()
+        pygame.display.update(renderer.render(state))
+
+    def idleRendererFrame():
+        pygame.display.update(renderer.render(state))
+
+    def lockFrame():
+        # Board changes in a single row, like after lock
+        board = state.board
+        board.setRows([(19, board.rows[19], bytes([board.colors[19][0] % (len(board.palette) - 1) + 1]) + board.colors[19][1:])])
+        pygame.display.update(renderer.render(state))
+
+    rows = []
+    for name, func in (('full redraw', lambda: (moveShape(), legacyFrame(displaySurf, boardSurf, state))),
+                       ('renderer, shape moved', rendererFrame),
+                       ('renderer, nothing changed', idleRendererFrame),
+                       ('renderer, board row changed', lockFrame)):
+        rows.append((name, f'{timePerCall(func, 300)/1000:.1f}'))
+    print('Near-full board (18 rows)')
+    printTable(('frame', 'us/frame'), rows)
+
+    # After all those incremental frames the result has to match drawing everything from scratch
+    moveShape()
+    renderer.render(state)
+    referenceSurf = pygame.Surface(displaySurf.get_size())
+    makeRenderer(referenceSurf, state).render(state)
+    boardArea = renderer.boardRect
+    assert pygame.image.tobytes(displaySurf.subsurface(boardArea), 'RGB') == \
+        pygame.image.tobytes(referenceSurf.subsurface(boardArea), 'RGB'), 'incremental rendering differs from full redraw'
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+'''
+Replays: records headless games, checks that playing the file back gives exactly the same
+final board and score, and reports file sizes, recording cost per tick and fast-forward speed.
+
+The random policy changes its inputs almost every tick, which is the worst case for the delta
+encoding; the held policy keeps keys down for a while like a human player does.
+'''
+import os, random, tempfile, time
+
+from benchmarks.common import timePerCall, printTable
+from game import GameState, INPUT_LEFT, INPUT_RIGHT, INPUT_DOWN, INPUT_ROTATE
+from policies import makeRandomPolicy
+from replay import ReplayRecorder, loadReplay, playReplay
+
+GAMES = 5
+
+# Holds a key for 5-40 ticks, then picks another one
+def makeHeldPolicy(seed):
+    rng = random.Random(seed)
+    held = [0, 0]
+    def policy(state):
+        if held[1] == 0:
+            held[0] = rng.choice((0, INPUT_LEFT, INPUT_RIGHT, INPUT_DOWN, INPUT_ROTATE))
+            held[1] = rng.randint(5, 40)
+        held[1] -= 1
+        # Rotation is a single press, not a held key
+        inputs = held[0]
+        if inputs == INPUT_ROTATE:
+            held[0] = 0
+        return inputs
+    return policy
+
+def recordGame(path, seed, makePolicy, randomizer):
+    state = GameState(seed, randomizer=randomizer)
+    policy = makePolicy(seed)
+    recorder = ReplayRecorder(path, state)
+    while not state.isGameOver:
+        inputs = policy(state)
+        recorder.record(inputs)
+        state.step(inputs)
+    recorder.close(state.score)
+    return state
+
+def main():
+    directory = tempfile.mkdtemp()
+    rows = []
+    for policyName, makePolicy in (('random', makeRandomPolicy), ('held', makeHeldPolicy)):
+        sizes = []
+        ticks = 0
+        playbackSeconds = 0.0
+        for seed in range(GAMES):
+            path = os.path.join(directory, f'{policyName}-{seed}.rpl')
+            recorded = recordGame(path, seed, makePolicy, ('uniform', 'bag', 'history')[seed % 3])
+            sizes.append(os.path.getsize(path))
+
+            replay = loadReplay(path)
+            start = time.perf_counter()
+            played = playReplay(replay)
+            playbackSeconds += time.perf_counter() - start
+            ticks += replay.ticks
+
+            assert played.board.rows == recorded.board.rows, f'{path}: board differs'
+            assert (played.score, played.pieces, played.ticks, played.isGameOver) == \
+                   (recorded.score, recorded.pieces, recorded.ticks, recorded.isGameOver), f'{path}: result differs'
+            assert replay.score == recorded.score
+        rows.append((policyName, ticks // GAMES, f'{sum(sizes) / GAMES / 1024:.2f}', f'{ticks / playbackSeconds:,.0f}'))
+
+    print(f'{GAMES} games per policy, all replays reproduce the recorded games')
+    printTable(('policy', 'ticks/game', 'KB/game', 'playback ticks/s'), rows)
+
+    # Cost of record() in the game loop; the file itself is written by the background thread
+    recorder = ReplayRecorder(os.path.join(directory, 'cost.rpl'), GameState(0))
+    inputsCycle = [0, 0, 0, INPUT_LEFT, INPUT_LEFT, INPUT_DOWN]
+    index = [0]
+    def record():
+        index[0] += 1
+        recorder.record(inputsCycle[index[0] % 6])
+    print(f'record(): {timePerCall(record, 100000) :.0f} ns/tick')
+    recorder.close(0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+'''
+Score store: what submitting a finished game costs the game loop, write throughput of the
+batched writer thread vs. committing every game on its own, and leaderboard lookups from memory
+and through the score index (with and without it) on a database of many games.
+
+Also checks GameStats against the GameState counters of real games and that a reopened store
+shows the same leaderboard as the one that wrote it.
+'''
+import os, random, sqlite3, tempfile, time
+
+from benchmarks.common import timePerCall, printTable
+from game import GameState
+from pieces import PIECETABLES
+from policies import makeAIPolicy, makeRandomPolicy
+from scores import ScoreStore, GameStats, GameRecord, SCHEMA, INSERTGAME, INSERTPIECES, TOPSCORESQUERY
+
+GAMES = 5000
+LEADERBOARDSIZE = 10
+
+def playGame(seed, makePolicy, maxTicks):
+    state = GameState(seed)
+    policy = makePolicy(seed)
+    stats = GameStats()
+    while not state.isGameOver and state.ticks < maxTicks:
+        state.step(policy(state))
+        stats.update(state.events)
+    record = stats.record(state)
+    assert sum(size*count for size, count in enumerate(record.clears, 1)) == state.lines
+    assert sum(record.piecesByShape.values()) == state.pieces
+    assert record.maxLevel == state.level
+    return record
+
+def randomRecord(rng):
+    clears = tuple(rng.randrange(20) for _ in range(4))
+    lines = sum(size*count for size, count in enumerate(clears, 1))
+    piecesByShape = {table.name: rng.randrange(50) for table in PIECETABLES}
+    return GameRecord(time.time(), rng.getrandbits(32), 10*lines, min(11, 1 + lines // 10), lines,
+                      sum(piecesByShape.values()), rng.randrange(100000), rng.random()*1000, clears, piecesByShape)
+
+def checkRoundTrip(directory):
+    path = os.path.join(directory, 'roundtrip.sqlite3')
+    store = ScoreStore(path)
+    records = [playGame(seed, makeAIPolicy, 3000) for seed in range(3)]
+    records += [playGame(seed, makeRandomPolicy, 20000) for seed in range(10)]
+    assert any(record.lines for record in records)
+    for record in records:
+        store.submit(record)
+    expected = store.topScores(LEADERBOARDSIZE)
+    assert [record.score for record in expected] == sorted((record.score for record in records), reverse=True)[:LEADERBOARDSIZE]
+    store.close()
+
+    reopened = ScoreStore(path)
+    reopened.isLoaded.wait()
+    assert reopened.topScores(LEADERBOARDSIZE) == expected, 'reopened store shows a different leaderboard'
+    reopened.close()
+
+# Every game in its own transaction, on the calling thread
+def writeOneByOne(path, records):
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SCHEMA)
+    for record in records:
+        with connection:
+            gameId = connection.execute(INSERTGAME, (record.playedAt, record.seed, record.score, record.maxLevel,
+                                                     record.lines, record.pieces, record.ticks, record.seconds,
+                                                     *record.clears)).lastrowid
+            connection.executemany(INSERTPIECES, [(gameId, shape, count) for shape, count in record.piecesByShape.items()])
+    connection.close()
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        checkRoundTrip(directory)
+
+        rng = random.Random(0)
+        records = [randomRecord(rng) for _ in range(GAMES)]
+
+        start = time.perf_counter()
+        writeOneByOne(os.path.join(directory, 'naive.sqlite3'), records)
+        naiveSeconds = time.perf_counter() - start
+
+        store = ScoreStore(os.path.join(directory, 'batched.sqlite3'))
+        store.isLoaded.wait()
+        start = time.perf_counter()
+        for record in records:
+            store.submit(record)
+        submitSeconds = time.perf_counter() - start
+        store.flush()
+        batchedSeconds = time.perf_counter() - start
+        assert store.gamesWritten == GAMES
+
+        print(f'writing {GAMES} games')
+        printTable(('writer', 'games/s', 'caller us/game', 'transactions'), [
+            ('commit every game', f'{GAMES / naiveSeconds:,.0f}', f'{naiveSeconds / GAMES * 1e6:.1f}', GAMES),
+            ('ScoreStore', f'{GAMES / batchedSeconds:,.0f}', f'{submitSeconds / GAMES * 1e6:.1f}', store.transactions),
+        ])
+
+        topNs = timePerCall(lambda: store.topScores(LEADERBOARDSIZE), 10000)
+        store.close()
+
+        connection = sqlite3.connect(os.path.join(directory, 'batched.sqlite3'))
+        plan = ' '.join(str(row) for row in connection.execute('EXPLAIN QUERY PLAN ' + TOPSCORESQUERY, (LEADERBOARDSIZE,)))
+        assert 'gamesByScore' in plan, plan
+        indexedNs = timePerCall(lambda: connection.execute(TOPSCORESQUERY, (LEADERBOARDSIZE,)).fetchall(), 200)
+        unindexedQuery = TOPSCORESQUERY.replace('FROM games', 'FROM games NOT INDEXED')
+        unindexedNs = timePerCall(lambda: connection.execute(unindexedQuery, (LEADERBOARDSIZE,)).fetchall(), 20)
+        connection.close()
+        assert topNs < 1e6 and indexedNs < 1e6, 'leaderboard lookups should take well under a millisecond'
+
+        print(f'\ntop {LEADERBOARDSIZE} of {GAMES} games')
+        printTable(('lookup', 'us'), [
+            ('ScoreStore.topScores (memory)', f'{topNs / 1e3:.2f}'),
+            ('SQL through gamesByScore', f'{indexedNs / 1e3:.1f}'),
+            ('SQL without the index', f'{unindexedNs / 1e3:.1f}'),
+        ])
+
+if __name__ == '__main__':
+    main()
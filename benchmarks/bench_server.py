@@ -0,0 +1,124 @@
+'''
+Load test of the versus server on localhost: the server and a crowd of bot clients (random
+inputs, sent stamped with their own tick like the pygame client does) run in one process on one
+event loop, for several numbers of concurrent matches. Reports how long the server's pass over
+all matches takes per tick, how many ticks it had to run late, and the traffic of a match per
+second of play against server.BANDWIDTHBUDGET.
+
+Before that, checks without sockets that a mirror fed with the encoded deltas matches the
+server's games every tick, that a VersusMatch is deterministic and actually exchanges garbage,
+and that every bot's mirror ends up equal to the server's final boards.
+'''
+import asyncio, random
+
+from benchmarks.common import printTable, mirrorEquals
+from client import VersusClient, MirrorState
+from game import INPUT_LEFT, INPUT_RIGHT, INPUT_DOWN, INPUT_ROTATE, INPUT_HARDDROP
+from policies import makeAIPolicy, makeRandomPolicy
+from protocol import StateEncoder, encodeDelta, decodeDelta, FRAMEHEADER
+from scheduler import FixedTimestep, TICKRATE
+from server import VersusServer, BANDWIDTHBUDGET
+from versus import VersusMatch, runUntilMatchOver
+
+MATCHCOUNTS = (10, 50, 100)
+MATCHSECONDS = 10
+BOTINPUTS = (0, 0, 0, INPUT_LEFT, INPUT_RIGHT, INPUT_DOWN, INPUT_ROTATE, INPUT_HARDDROP)
+BOTHOLDTICKS = 6    # Bots keep a choice for this many ticks, a fast human rather than noise every tick
+
+def checkMirrors(seeds=range(3)):
+    for seed in seeds:
+        match = VersusMatch(seed)
+        encoders = [StateEncoder(state, player) for player, state in enumerate(match.states)]
+        board = match.states[0].board
+        mirrors = [MirrorState(board.width, board.height) for _ in match.states]
+        policies = [makeAIPolicy(seed), makeRandomPolicy(seed)]
+        while not match.isOver:
+            match.step([policy(state) for policy, state in zip(policies, match.states)])
+            message = encodeDelta(match.ticks, encoders)
+            if message is not None:
+                tick, deltas = decodeDelta(message[FRAMEHEADER.size:], board.width, board.height)
+                assert tick == match.ticks
+                for delta in deltas:
+                    mirrors[delta.player].apply(delta)
+            for mirror, state in zip(mirrors, match.states):
+                assert mirrorEquals(mirror, state), f'seed {seed} tick {match.ticks}'
+
+def checkVersusRules():
+    def play(seed):
+        return runUntilMatchOver(VersusMatch(seed), [makeAIPolicy(seed), makeAIPolicy(seed + 1)], maxTicks=20000)
+    for seed in range(2):
+        first, second = play(seed), play(seed)
+        assert [state.board.rows for state in first.states] == [state.board.rows for state in second.states]
+        assert (first.winner, first.garbageSent) == (second.winner, second.garbageSent)
+        assert sum(first.garbageSent) > 0, 'autoplayers clear lines, so garbage must change hands'
+
+    # Garbage against a player who never clears tops them out
+    match = runUntilMatchOver(VersusMatch(7), [makeAIPolicy(7), makeRandomPolicy(7)], maxTicks=50000)
+    assert match.winner == 0 and match.garbageSent[0] > 0
+
+class Bot:
+    def __init__(self, seed):
+        self.client = VersusClient()
+        self.rng = random.Random(seed)
+        self.inputs = 0
+        self.tick = 0
+
+    def step(self):
+        if self.tick % BOTHOLDTICKS == 0:
+            self.inputs = self.rng.choice(BOTINPUTS)
+        self.client.sendInputs(self.tick, self.inputs)
+        self.tick += 1
+
+# All bots tick together from one task, like one client process per bot would on its own
+async def runBots(bots, tickRate):
+    loop = asyncio.get_running_loop()
+    timestep = FixedTimestep(tickRate, clock=loop.time)
+    while True:
+        live = [bot for bot in bots if not bot.client.isOver]
+        if not live:
+            return
+        for _ in range(timestep.advance()):
+            for bot in live:
+                bot.step()
+        await asyncio.sleep(max(timestep.tickDuration - timestep.accumulator, 0))
+
+async def loadTest(matchCount):
+    server = VersusServer(port=0, seed=matchCount, maxTicks=MATCHSECONDS*TICKRATE)
+    await server.start()
+    bots = [Bot(seed) for seed in range(2*matchCount)]
+    # Connect pairwise: the server starts a match as soon as the second player of a pair says hello
+    connecting = [asyncio.create_task(bot.client.connect(server.host, server.port)) for bot in bots]
+    await asyncio.gather(*connecting)
+    matches = dict(server.matches)
+    receiving = [asyncio.create_task(bot.client.receive()) for bot in bots]
+    await asyncio.gather(runBots(bots, server.tickRate), *receiving)
+    await server.close()
+
+    for bot in bots:
+        client = bot.client
+        match = matches[client.matchId]
+        assert client.winner == match.winner
+        for mirror, state in zip(client.states, match.versus.states):
+            assert mirrorEquals(mirror, state), f'bot mirror of match {client.matchId} differs from the server'
+    return server
+
+def main():
+    checkMirrors()
+    checkVersusRules()
+
+    rows = []
+    for matchCount in MATCHCOUNTS:
+        server = asyncio.run(loadTest(matchCount))
+        assert server.matchesFinished == matchCount
+        p50, p95, p99 = server.tickPercentiles()
+        bandwidth = server.bytesPerMatchSecond()
+        assert bandwidth <= BANDWIDTHBUDGET, f'{bandwidth:.0f} B/s per match is over the budget'
+        rows.append((matchCount, 2*matchCount, f'{p50*1e3:.2f}', f'{p95*1e3:.2f}', f'{p99*1e3:.2f}',
+                     server.lateTicks, f'{bandwidth:.0f}'))
+
+    print(f'{MATCHSECONDS} s matches of random-input bots at {TICKRATE} ticks/s, server and bots in one process; '
+          f'budget {BANDWIDTHBUDGET} B/s per match')
+    printTable(('matches', 'clients', 'tick p50 ms', 'p95 ms', 'p99 ms', 'late ticks', 'B/s per match'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+'''
+Board snapshots: cost of taking and restoring one, and memory kept per snapshot, on a full board
+(18 of 20 rows filled), against copying the board for every snapshot: the old list of
+{'rects', 'color'} dicts with pygame.Rects (copy.deepcopy) and a plain copy of the bitboard rows
+and color rows. Between two snapshots one row of the board changes, as when a piece locks.
+
+Before that, checks on random games that every snapshot restores exactly the board it was taken
+from (rows, colors, height index) however the board changed since, and that the incremental
+Zobrist hash always equals the hash computed from scratch and is equal for equal boards.
+'''
+import copy, random, tracemalloc
+
+from benchmarks.bench_board import boardToRectFigures
+from benchmarks.common import timePerCall, makeFilledBoard, printTable
+from board import Board, hashRows
+from game import GameState, EVENT_LOCK
+from policies import makeRandomPolicy
+
+SNAPSHOTS = 2000
+FILLEDROWS = 18
+
+def boardState(board):
+    return (list(board.rows), [bytes(rowColors) for rowColors in board.colors], list(board.columnTops), board.hash)
+
+def checkSnapshots(games=20):
+    for seed in range(games):
+        state = GameState(seed)
+        policy = makeRandomPolicy(seed)
+        board = state.board
+        taken = []
+        while not state.isGameOver:
+            state.step(policy(state))
+            assert board.hash == hashRows(board.rows, board.rowKeys), f'seed {seed} tick {state.ticks}: stale hash'
+            if any(event == EVENT_LOCK for event, _ in state.events):
+                taken.append((board.snapshot(), boardState(board)))
+        assert taken
+
+        # Restore in random order, changing the board in between
+        rng = random.Random(seed)
+        for snapshot, expected in rng.sample(taken, len(taken)):
+            board.restore(snapshot)
+            assert boardState(board) == expected, f'seed {seed}: snapshot restored a different board'
+            board.place([(rng.randrange(board.width), rng.randrange(board.height))], (1, 2, 3))
+            board.clearFullRows()
+        for snapshot, expected in taken:
+            board.restore(snapshot)
+            assert boardState(board) == expected
+
+        # Equal boards hash equal, whatever way they were reached
+        rebuilt = Board(board.width, board.height)
+        rebuilt.setRows((y, mask, rowColors) for y, (mask, rowColors) in enumerate(zip(board.rows, board.colors)))
+        assert rebuilt.hash == board.hash
+
+# Board with one row changed after every snapshot; returns what the snapshots keep alive
+def takeSnapshots(board, count, snapshot, rng):
+    kept = []
+    for _ in range(count):
+        kept.append(snapshot(board))
+        y = rng.randrange(board.height - FILLEDROWS, board.height)
+        rowColors = bytearray(board.colors[y])
+        x = rng.randrange(board.width)
+        rowColors[x] = 1 if rowColors[x] == 0 else 0
+        board.setRows([(y, board.rows[y] ^ (1 << x), rowColors)])
+    return kept
+
+def copyBoard(board):
+    return (list(board.rows), [bytearray(rowColors) for rowColors in board.colors], list(board.columnTops))
+
+# Bytes kept alive per snapshot, and the snapshots
+def memoryPerSnapshot(snapshot):
+    board = makeFilledBoard(FILLEDROWS)
+    rng = random.Random(0)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = takeSnapshots(board, SNAPSHOTS, snapshot, rng)
+    size = (tracemalloc.get_traced_memory()[0] - before) / SNAPSHOTS
+    tracemalloc.stop()
+    return size, kept
+
+def main():
+    checkSnapshots()
+
+    board = makeFilledBoard(FILLEDROWS)
+    figures = boardToRectFigures(board)
+    snapshot = board.snapshot()
+    cell = [(0, 0)]
+
+    # A snapshot costs the first change after it a copy of the row lists
+    def snapshotAndPlace():
+        board.snapshot()
+        board.place(cell, (1, 2, 3))
+
+    cells = sum(1 for _ in board.iterCells())
+    rows = [
+        # A fresh rect list of the board is what a deepcopy of it keeps alive
+        ('deepcopy of rect lists', timePerCall(lambda: copy.deepcopy(figures), 200), None,
+         memoryPerSnapshot(boardToRectFigures)[0]),
+        ('copy of bitboard rows', timePerCall(lambda: copyBoard(board), 20000), None, memoryPerSnapshot(copyBoard)[0]),
+        ('Board.snapshot', timePerCall(board.snapshot, 20000), timePerCall(lambda: board.restore(snapshot), 20000),
+         memoryPerSnapshot(Board.snapshot)[0]),
+    ]
+    placeNs = timePerCall(lambda: board.place(cell, (1, 2, 3)), 20000)
+    cowNs = timePerCall(snapshotAndPlace, 20000) - rows[2][1] - placeNs
+    hashNs = timePerCall(lambda: hashRows(board.rows, board.rowKeys), 20000)
+
+    print(f'{board.width}x{board.height} board with {FILLEDROWS} rows filled ({cells} cells), one row changed between snapshots')
+    printTable(('snapshot', 'ns/snapshot', 'ns/restore', 'bytes/snapshot'),
+               [(name, f'{ns:,.0f}', '-' if restoreNs is None else f'{restoreNs:,.0f}', f'{size:,.0f}')
+                for name, ns, restoreNs, size in rows])
+    print(f'\nplace(): {placeNs:,.0f} ns, first one after a snapshot copies the row lists: +{cowNs:,.0f} ns; '
+          f'Zobrist hash from scratch: {hashNs:,.0f} ns (kept up to date on every change)')
+    assert rows[2][1] < rows[1][1], 'a snapshot should cost less than copying the board'
+    assert rows[2][3] < rows[1][3], 'a snapshot should keep less memory alive than a copy of the board'
+
+if __name__ == '__main__':
+    main()
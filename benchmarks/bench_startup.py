@@ -0,0 +1,74 @@
+'''
+Startup time from the first import to the first frame reaching display.update, for the game as
+it starts now (display and fonts only, system fonts and music on background threads) and for
+the old startup sequence (pygame.init(), SysFont lookups and loading the music before the first
+frame). Every run is a fresh process, split into importing modules and getting from there to
+the first frame. Also starts both with a broken audio driver, which used to be fatal.
+'''
+import os, subprocess, sys
+
+from assets import ASSETDIR
+from benchmarks.common import printTable
+
+RUNS = 7
+
+# Every snippet prints seconds spent importing and seconds from then to the first frame
+CURRENT = '''
+import time
+start = time.perf_counter()
+import os, pygame
+import main
+imported = time.perf_counter()
+def firstFrame(*rects):
+    # The first update with dirty rects is the first game frame
+    if rects:
+        print(imported - start, time.perf_counter() - imported, flush=True)
+        os._exit(0)
+pygame.display.update = firstFrame
+main.main([])
+'''
+
+LEGACY = '''
+import time
+start = time.perf_counter()
+import os, pygame
+imported = time.perf_counter()
+pygame.init()
+font = pygame.font.SysFont('comicsans', 28)
+pygame.font.SysFont('couriernew', 12)
+surf = pygame.display.set_mode((550, 600))
+pygame.mixer.music.load(os.path.join(%r, 'tetris_theme.mp3'))
+pygame.mixer.music.set_volume(0.7)
+pygame.mixer.music.play(-1)
+surf.blit(font.render('Score: 0', True, (255, 255, 255)), (0, 0))
+pygame.display.update([surf.get_rect()])
+print(imported - start, time.perf_counter() - imported, flush=True)
+os._exit(0)
+''' % ASSETDIR
+
+# (import seconds, seconds to first frame), or None when the snippet failed
+def timeStartup(code, audioDriver):
+    env = dict(os.environ, SDL_VIDEODRIVER='dummy', SDL_AUDIODRIVER=audioDriver, PYGAME_HIDE_SUPPORT_PROMPT='1')
+    result = subprocess.run([sys.executable, '-c', code], cwd=ASSETDIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    importSeconds, frameSeconds = map(float, result.stdout.split())
+    return importSeconds, frameSeconds
+
+def main():
+    rows = []
+    for name, code, audioDriver in (('old startup', LEGACY, 'dummy'),
+                                    ('asset manager', CURRENT, 'dummy'),
+                                    ('old startup, no audio device', LEGACY, 'nonexistent'),
+                                    ('asset manager, no audio device', CURRENT, 'nonexistent')):
+        times = [timeStartup(code, audioDriver) for _ in range(RUNS)]
+        if None in times:
+            rows.append((name, 'failed', ''))
+            continue
+        rows.append((name, f'{min(t[0] for t in times)*1000:.0f}', f'{min(t[1] for t in times)*1000:.1f}'))
+    assert rows[1][1] != 'failed' and rows[3][1] != 'failed', 'the game should start without audio'
+    print(f'best of {RUNS} runs, dummy video driver')
+    printTable(('startup', 'import ms', 'import to first frame ms'), rows)
+
+if __name__ == '__main__':
+    main()
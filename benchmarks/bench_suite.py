@@ -0,0 +1,291 @@
+'''
+Regression suite for the hot functions of the game: collision checks, spawning and rotating a
+piece, the landing row, gravity, line clears, the draw functions and a whole frame (logic, board
+renderer and display.update under the SDL dummy video driver), each timed on every board fixture
+of benchmarks.common (empty, half-full, near-top, checkerboard, many-holes). Board fixtures and piece positions are
+built from fixed seeds, so every run times the same work.
+
+Results go to a JSON file; compared to the results of an earlier run, every case whose throughput
+dropped by more than the threshold is a regression and the suite exits with status 1:
+
+    python -m benchmarks.bench_suite --out base.json               # before the change
+    python -m benchmarks.bench_suite --baseline base.json          # after it
+    python -m benchmarks.bench_suite --baseline base.json --threshold 0.1 --fixture near-top
+
+The old removeRow, moveShapeInYDir and createShapeRects are timed as what replaced them:
+Board.clearFullRows, GameState.tick moving the shape one row and the precompiled piece tables
+(Piece.spawn and setRotation, then the cells of the shape at its position).
+'''
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import argparse, json, sys, time
+
+import pygame
+
+import main as game_main
+from assets import ASSETS
+from benchmarks.common import timePerCall, makeFixtureBoard, printTable, BOARDFIXTURES
+from effects import EffectPool
+from game import (GameState, SPAWNY, INPUT_SHIFTLEFT, INPUT_SHIFTRIGHT, checkCollisionsWithBottom,
+                  checkCollisionsBetweenBlocks, checkCollisionsAtDestination)
+from pieces import Piece, PIECETABLES
+
+THRESHOLD = 0.2         # Share of a case's throughput it may lose against the baseline
+MINROUNDTIME = 0.02     # Seconds one timing round takes at least
+ROUNDS = 5
+WINDOWSIZE = (550, 600)
+CLEAREDROWS = 4
+NOGRAVITY = 10**9       # Falling speed that never moves the shape
+
+# Every rotation of every piece at every column it fits in, resting on the stack and two rows above it:
+# [(table, rotation, x, y)]
+def makePoses(board):
+    poses = []
+    for table in PIECETABLES:
+        for rotation, shape in enumerate(table.rotations):
+            for x in range(-shape.minDx, board.width - shape.maxDx):
+                landingY = board.dropY(shape, x, SPAWNY)
+                poses.extend((table, rotation, x, y) for y in (landingY, landingY - 2))
+    return poses
+
+def makePiece(table, rotation, x, y):
+    piece = Piece()
+    piece.spawn(table, x, y)
+    piece.setRotation(rotation)
+    return piece
+
+# GameState on a copy of the fixture with the shape hovering at the top: gravity is off, so frames never lock it
+def makeHoveringState(fixture):
+    state = GameState(0)
+    state.board = makeFixtureBoard(fixture)
+    state.spawn(state.piece.table)
+    state.fallingSpeed = NOGRAVITY
+    return state
+
+# Case builders: (fixture name) -> (run, operations per run); run() is what one timing call does
+
+def bottomCollisionCase(fixture):
+    board = makeFixtureBoard(fixture)
+    pieces = [makePiece(*pose) for pose in makePoses(board)]
+    def run():
+        for piece in pieces:
+            checkCollisionsWithBottom(piece, board)
+    return run, len(pieces)
+
+def blockCollisionCase(fixture):
+    board = makeFixtureBoard(fixture)
+    placements = [(table.rotations[rotation], x, y) for table, rotation, x, y in makePoses(board)]
+    def run():
+        for shape, x, y in placements:
+            checkCollisionsBetweenBlocks(shape, x, y, board)
+    return run, len(placements)
+
+def destinationCollisionCase(fixture):
+    board = makeFixtureBoard(fixture)
+    placements = [(table.rotations[rotation], x, y) for table, rotation, x, y in makePoses(board)]
+    def run():
+        for shape, x, y in placements:
+            checkCollisionsAtDestination(shape, x, y, board)
+    return run, len(placements)
+
+# A piece put at every pose from the piece tables and its cells read, as createShapeRects built them
+def spawnRotateCase(fixture):
+    board = makeFixtureBoard(fixture)
+    poses = makePoses(board)
+    piece = Piece()
+    def run():
+        for table, rotation, x, y in poses:
+            piece.spawn(table, x, y)
+            piece.setRotation(rotation)
+            piece.cells()
+    return run, len(poses)
+
+# Landing row of a shape from the spawn row: hard drop and ghost piece
+def dropYCase(fixture):
+    board = makeFixtureBoard(fixture)
+    # Poses come in pairs, resting on the stack first
+    placements = [(table.rotations[rotation], x) for table, rotation, x, _ in makePoses(board)[::2]]
+    def run():
+        for shape, x in placements:
+            board.dropY(shape, x, SPAWNY)
+    return run, len(placements)
+
+# Gravity moving the shape one row down, every piece from two rows above the stack
+def gravityCase(fixture):
+    state = GameState(0)
+    state.board = makeFixtureBoard(fixture)
+    x = state.piece.x
+    starts = [(table, state.board.dropY(table.rotations[0], x, SPAWNY) - 2) for table in PIECETABLES]
+    def run():
+        for table, y in starts:
+            state.spawn(table, y)
+            state.fallingTimer = state.currentFallingSpeed
+            state.tick()
+    return run, len(starts)
+
+# Four rows completed on top of the fixture's stack and cleared; the board is restored before every clear
+def clearCase(fixture):
+    board = makeFixtureBoard(fixture)
+    fullRows = range(board.height - CLEAREDROWS, board.height)
+    board.place([(x, y) for y in fullRows for x in range(board.width) if not board.isOccupied(x, y)], PIECETABLES[0].color)
+    snapshot = board.snapshot()
+    def run():
+        board.restore(snapshot)
+        assert len(board.clearFullRows()) == CLEAREDROWS
+    return run, 1
+
+# The whole board drawn from scratch, as after a resize
+def fullRedrawCase(fixture):
+    state = makeHoveringState(fixture)
+    renderer = game_main.makeBoardRenderer(state.board)
+    def run():
+        renderer.invalidate()
+        renderer.render(state)
+    return run, 1
+
+# The shape (and its ghost) moved by one column, as on most frames
+def shapeMovedCase(fixture):
+    state = makeHoveringState(fixture)
+    renderer = game_main.makeBoardRenderer(state.board)
+    renderer.render(state)
+    moves = (1, -1)
+    frames = [0]
+    def run():
+        state.piece.x += moves[frames[0] % 2]
+        frames[0] += 1
+        renderer.render(state)
+    return run, 1
+
+# Score, level and the upcoming pieces, redrawn whenever one of them changes
+def sidePanelCase(fixture):
+    state = makeHoveringState(fixture)
+    upcoming = state.pieceSource.upcoming()
+    scores = [0, 10, 20, 30]
+    frames = [0]
+    def run():
+        score = scores[frames[0] % len(scores)]
+        frames[0] += 1
+        game_main.SIDEPANELSURF.fill(game_main.BGCOLOR)
+        game_main.createSidePanel(score, 1, upcoming)
+        game_main.DISPLAYSURF.blit(game_main.SIDEPANELSURF, game_main.SIDEPANELRECT)
+    return run, 1
+
+# One frame of runGame without event handling and frame pacing: a logic tick shifting the shape, the board
+# renderer with effects and display.update of the dirty rects
+def frameCase(fixture):
+    state = makeHoveringState(fixture)
+    renderer = game_main.makeBoardRenderer(state.board)
+    effects = EffectPool()
+    pygame.display.update(renderer.render(state))
+    inputs = (INPUT_SHIFTLEFT, 0, INPUT_SHIFTRIGHT, 0)
+    frames = [0]
+    def run():
+        previousPose = state.piece.pose()
+        state.step(inputs[frames[0] % len(inputs)])
+        frames[0] += 1
+        now = time.perf_counter()
+        effects.startFromEvents(state, now)
+        effects.update(now)
+        pygame.display.update(renderer.render(state, 1.0, previousPose, effects, now))
+        assert state.pieces == 0, 'the hovering shape locked'
+    return run, 1
+
+CASES = {
+    'checkCollisionsWithBottom': bottomCollisionCase,
+    'checkCollisionsBetweenBlocks': blockCollisionCase,
+    'checkCollisionsAtDestination': destinationCollisionCase,
+    'spawn + setRotation': spawnRotateCase,
+    'dropY': dropYCase,
+    'tick (gravity)': gravityCase,
+    'clearFullRows': clearCase,
+    'render (full redraw)': fullRedrawCase,
+    'render (shape moved)': shapeMovedCase,
+    'createSidePanel': sidePanelCase,
+    'frame': frameCase,
+}
+
+# ns per operation of run, with as many calls per round as fill MINROUNDTIME
+def timeCase(run, operations):
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        if time.perf_counter() - start >= MINROUNDTIME:
+            break
+        number *= 2
+    return timePerCall(run, number, ROUNDS) / operations
+
+# (fixture, case) -> ns per operation of the results of an earlier run
+def baselineIndex(baseline):
+    return {(result['fixture'], result['case']): result['ns'] for result in baseline['results']}
+
+# Cases whose throughput dropped below (1 - threshold) of the baseline's, as (fixture, case, baseline ns, ns);
+# expected is a baselineIndex
+def findRegressions(results, expected, threshold):
+    regressions = []
+    for result in results:
+        baselineNs = expected.get((result['fixture'], result['case']))
+        if baselineNs is not None and 1e9 / result['ns'] < (1 - threshold) * 1e9 / baselineNs:
+            regressions.append((result['fixture'], result['case'], baselineNs, result['ns']))
+    return regressions
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description='Time the hot functions of the game on every board fixture.')
+    parser.add_argument('--out', metavar='PATH', default=None, help='write the results to this JSON file')
+    parser.add_argument('--baseline', metavar='PATH', default=None,
+                        help='results of an earlier run (--out); exit status 1 when a case regressed')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help=f'share of throughput a case may lose against the baseline (default {THRESHOLD})')
+    parser.add_argument('--fixture', action='append', choices=list(BOARDFIXTURES), default=None,
+                        help='time only this fixture (can be repeated)')
+    parser.add_argument('--case', action='append', choices=list(CASES), default=None,
+                        help='time only this case (can be repeated)')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parseArgs(argv)
+    ASSETS.initDisplay()
+    game_main.DISPLAYSURF = pygame.display.set_mode(WINDOWSIZE)
+    game_main.fitLayout(game_main.GRIDWIDTH, game_main.GRIDHEIGHT)
+    game_main.FONT = ASSETS.getSysFont(game_main.FONTNAME, game_main.scaledFontSize(game_main.FONTSIZE))
+
+    expected = None
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            expected = baselineIndex(json.load(file))
+
+    results = []
+    rows = []
+    for fixture in args.fixture or BOARDFIXTURES:
+        for case in args.case or CASES:
+            ns = timeCase(*CASES[case](fixture))
+            results.append({'fixture': fixture, 'case': case, 'ns': ns, 'opsPerSecond': 1e9 / ns})
+            row = [fixture, case, f'{ns:,.0f}', f'{1e9 / ns:,.0f}']
+            if expected is not None:
+                baselineNs = expected.get((fixture, case))
+                row.append('-' if baselineNs is None else f'{(baselineNs / ns - 1) * 100:+.1f}%')
+            rows.append(row)
+
+    header = ['fixture', 'case', 'ns/op', 'ops/s']
+    if expected is not None:
+        header.append('throughput vs baseline')
+    printTable(header, rows)
+
+    if args.out is not None:
+        with open(args.out, 'w') as file:
+            json.dump({'unit': 'ns', 'rounds': ROUNDS, 'python': sys.version.split()[0], 'pygame': pygame.version.ver,
+                       'results': results}, file, indent=1)
+
+    if expected is not None:
+        regressions = findRegressions(results, expected, args.threshold)
+        for fixture, case, baselineNs, ns in regressions:
+            print(f'REGRESSION {fixture} / {case}: {ns:,.0f} ns/op (baseline {baselineNs:,.0f}), '
+                  f'{(1 - baselineNs / ns) * 100:.0f}% less throughput')
+        if regressions:
+            sys.exit(1)
+        print(f'\nNo case lost more than {args.threshold:.0%} throughput against {args.baseline}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+'''
+Side panel cost per frame: rendering score, level and preview every frame (old createSidePanel)
+vs. redrawing only on change with rendered text and preview surfaces taken from the LRU cache.
+Prints the cache hit/miss counters for a simulated game.
+'''
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from benchmarks.common import timePerCall, printTable
+from game import GameState
+from policies import makeRandomPolicy
+from surface_cache import SurfaceCache, getSysFont, renderText
+
+TEXTCOLOR = (255, 255, 255)
+BGCOLOR = (0, 0, 0)
+
+def main():
+    pygame.display.init()
+    pygame.font.init()
+    pygame.display.set_mode((550, 600))
+    font = getSysFont('comicsans', 28)
+    panel = pygame.Surface((175, 500))
+
+    # Score/level/preview of every frame of a real game
+    state = GameState(1)
+    policy = makeRandomPolicy(1)
+    frames = []
+    while not state.isGameOver and len(frames) < 5000:
+        state.step(policy(state))
+        frames.append((state.score, state.level, state.pieceSource.dealt, state.nextTable.name))
+
+    def legacyPanel(score, level, nextName):
+        panel.fill(BGCOLOR)
+        panel.blit(font.render(f"Score: {score}", True, TEXTCOLOR, BGCOLOR), (12, 25))
+        panel.blit(font.render(f"Level: {level}", True, TEXTCOLOR, BGCOLOR), (12, 75))
+        preview = pygame.Surface((131, 125))
+        panel.blit(preview, (43, 175))
+        panel.blit(font.render("Next:", True, TEXTCOLOR, BGCOLOR), (70, 150))
+
+    cache = SurfaceCache()
+    def cachedPanel(score, level, nextName):
+        panel.fill(BGCOLOR)
+        panel.blit(renderText(font, f"Score: {score}", TEXTCOLOR, BGCOLOR, cache), (12, 25))
+        panel.blit(renderText(font, f"Level: {level}", TEXTCOLOR, BGCOLOR, cache), (12, 75))
+        panel.blit(cache.get(('preview', nextName), lambda: pygame.Surface((131, 125))), (43, 175))
+        panel.blit(renderText(font, "Next:", TEXTCOLOR, BGCOLOR, cache), (70, 150))
+
+    def runLegacy():
+        for score, level, dealt, nextName in frames:
+            legacyPanel(score, level, nextName)
+
+    def runCached():
+        key = None
+        for score, level, dealt, nextName in frames:
+            if key != (score, level, dealt):
+                key = (score, level, dealt)
+                cachedPanel(score, level, nextName)
+
+    legacyNs = timePerCall(runLegacy, 1, 3) / len(frames)
+    cache.resetStats()
+    cachedNs = timePerCall(runCached, 1, 1) / len(frames)
+    stats = cache.stats()
+
+    print(f'{len(frames)} frames of a simulated game')
+    printTable(('side panel', 'us/frame'), [('render every frame', f'{legacyNs/1000:.2f}'),
+                                            ('redraw on change + cache', f'{cachedNs/1000:.2f}')])
+    print(f"cache: {stats['hits']} hits, {stats['misses']} misses, hit rate {stats['hitRate']:.0%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+'''
+Fixed timestep: checks that a game advances the same number of logic ticks and the shape falls
+the same number of rows per second of real time at 30, 60 and 144 FPS (driven by a fake clock),
+then measures CPU time spent on the pause and game over screens, which now sleep in
+pygame.event.wait() instead of spinning on pygame.event.get().
+'''
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import time
+
+import pygame
+from pygame.locals import KEYDOWN, K_p, K_SPACE
+
+import main as game_main
+from benchmarks.common import printTable
+from game import GameState
+from scheduler import FixedTimestep, TICKRATE
+from surface_cache import getSysFont
+
+SECONDS = 30
+WAITMS = 1000
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+# Play SECONDS of simulated time at given framerate; returns (ticks, rows fallen, pieces)
+def simulate(fps, seed=3):
+    clock = FakeClock()
+    timestep = FixedTimestep(TICKRATE, clock=clock)
+    state = GameState(seed)
+    ticks = rowsFallen = 0
+    for frame in range(SECONDS * fps + 1):
+        clock.now = frame / fps
+        for _ in range(timestep.advance()):
+            y, pieces = state.piece.y, state.pieces
+            state.step(0)
+            ticks += 1
+            if state.pieces == pieces:
+                rowsFallen += state.piece.y - y
+    return ticks, rowsFallen, state.pieces
+
+def checkFramerateIndependence():
+    rows = []
+    results = set()
+    for fps in (30, 60, 144):
+        result = simulate(fps)
+        results.add(result)
+        rows.append((fps,) + result)
+    printTable(('fps', 'ticks', 'rows fallen', 'pieces'), rows)
+    assert len(results) == 1, 'game speed depends on framerate'
+    assert rows[0][1] == SECONDS * TICKRATE
+
+def postKeyLater(key):
+    pygame.time.set_timer(pygame.event.Event(KEYDOWN, key=key), WAITMS, 1)
+
+# CPU seconds used by func while it waits WAITMS for a key press
+def cpuTimeWaiting(func, key):
+    pygame.event.clear()
+    postKeyLater(key)
+    wallStart, cpuStart = time.perf_counter(), time.process_time()
+    func()
+    return time.process_time() - cpuStart, time.perf_counter() - wallStart
+
+# How the pause loop looked before: polls the event queue as fast as it can
+def legacyPause():
+    while True:
+        for event in pygame.event.get():
+            if event.type == KEYDOWN and event.key == K_p:
+                return
+
+def main():
+    checkFramerateIndependence()
+
+    pygame.display.init()
+    pygame.font.init()
+    game_main.DISPLAYSURF = pygame.display.set_mode((game_main.DISPLAYWINDOWWIDTH, game_main.DISPLAYWINDOWHEIGHT))
+    game_main.FONT = getSysFont('comicsans', 28)
+
+    rows = []
+    for name, func, key in (('busy loop (old pause)', legacyPause, K_p),
+                            ('gamePaused', lambda: game_main.gamePaused(True, False), K_p),
+                            ('create_gameover_screen', game_main.create_gameover_screen, K_SPACE)):
+        cpu, wall = cpuTimeWaiting(func, key)
+        rows.append((name, f'{wall:.2f}', f'{cpu:.3f}', f'{cpu/wall:.0%}'))
+    print()
+    printTable(('waiting in', 'wall s', 'cpu s', 'cpu use'), rows)
+
+if __name__ == '__main__':
+    main()
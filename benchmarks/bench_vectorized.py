@@ -0,0 +1,90 @@
+'''
+Batched NumPy engine vs. the scalar GameState in a loop, in game ticks per second for several
+batch sizes. First checks that both engines end in exactly the same state when fed the same
+seeds and inputs, using autoplayer inputs so line clears and level ups are covered too, and random inputs on boards
+of several sizes.
+Needs numpy.
+'''
+import time
+
+import numpy as np
+
+from benchmarks.common import printTable
+from board import BOARDHEIGHT
+from game import GameState
+from policies import makeAIPolicy
+from vectorized import BatchedGameState
+
+BATCHSIZES = (100, 1000, 5000)
+TICKS = 1000
+GEOMETRIES = ((10, 20), (20, 20), (10, 40), (5, 8))    # Boards of the equivalence check, width x height
+INPUTCHOICES = np.array([0, 0, 1, 2, 3, 4, 8, 32, 64, 32 | 8])    # Held keys, shifts and a shift with a rotation
+
+def assertSameGames(states, batch):
+    for game, state in enumerate(states):
+        expected = (state.score, state.level, state.lines, state.pieces, state.ticks, state.isGameOver, state.board.rows)
+        actual = (batch.score[game], batch.level[game], batch.lines[game], batch.pieces[game], batch.ticks[game],
+                  batch.isGameOver[game], batch.boardRows(game))
+        assert expected == actual, f'game {game} differs: {expected} != {actual}'
+
+def checkSameAsScalar(games=12, ticks=6000):
+    # Autoplayer inputs recorded from the scalar games
+    states = [GameState(seed) for seed in range(games)]
+    inputs = np.zeros((ticks, games), np.int32)
+    for game, state in enumerate(states):
+        policy = makeAIPolicy(game)
+        for tick in range(ticks):
+            inputs[tick, game] = policy(state)
+            state.step(int(inputs[tick, game]))
+    batch = BatchedGameState(range(games))
+    for tick in range(ticks):
+        batch.step(inputs[tick])
+    assertSameGames(states, batch)
+    assert batch.lines.sum() > 0 and (batch.level > 1).any()
+
+    # Random inputs, which end most games, also on wide, tall and small boards
+    rng = np.random.default_rng(0)
+    inputs = INPUTCHOICES[rng.integers(0, len(INPUTCHOICES), (ticks, games))]
+    for width, height in GEOMETRIES:
+        states = [GameState(seed, width, height) for seed in range(games)]
+        batch = BatchedGameState(range(games), width, height)
+        for tick in range(ticks):
+            batch.step(inputs[tick])
+            for game, state in enumerate(states):
+                state.step(int(inputs[tick, game]))
+        assertSameGames(states, batch)
+        # Pieces fall for a long time on tall boards, not every geometry gets to a game over
+        assert batch.pieces.sum() > games
+        assert batch.isGameOver.any() or height > BOARDHEIGHT
+
+def main():
+    checkSameAsScalar()
+
+    rng = np.random.default_rng(1)
+    inputs = INPUTCHOICES[rng.integers(0, len(INPUTCHOICES), (TICKS, max(BATCHSIZES)))]
+
+    rows = []
+    scalarGames = 200
+    states = [GameState(seed) for seed in range(scalarGames)]
+    columns = inputs[:, :scalarGames].T.tolist()
+    start = time.perf_counter()
+    for state, gameInputs in zip(states, columns):
+        step = state.step
+        for tickInputs in gameInputs:
+            step(tickInputs)
+    scalarRate = sum(int(state.ticks) for state in states) / (time.perf_counter() - start)
+    rows.append(('scalar GameState loop', scalarGames, f'{scalarRate:,.0f}', '1.0x'))
+
+    for size in BATCHSIZES:
+        batch = BatchedGameState(range(size))
+        start = time.perf_counter()
+        for tick in range(TICKS):
+            batch.step(inputs[tick, :size])
+        rate = int(batch.ticks.sum()) / (time.perf_counter() - start)
+        rows.append(('BatchedGameState', size, f'{rate:,.0f}', f'{rate / scalarRate:.1f}x'))
+
+    print(f'{TICKS} ticks of random inputs; both engines verified to end in the same state')
+    printTable(('engine', 'games', 'game ticks/s', 'speedup'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import random, time
+
+from board import Board
+from pieces import PIECETABLES
+
+# Run func repeatedly and return mean time of one call in nanoseconds (best of several rounds)
+def timePerCall(func, number=10000, rounds=5):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            func()
+        elapsed = (time.perf_counter_ns() - start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+# Board with the bottom `filledRows` rows filled, leaving one random hole per row so nothing gets cleared
+def makeFilledBoard(filledRows, seed=0, width=10, height=20, color=(204,0,0)):
+    rng = random.Random(seed)
+    board = Board(width, height)
+    for y in range(height - filledRows, height):
+        hole = rng.randrange(width)
+        board.place([(x, y) for x in range(width) if x != hole], color)
+    return board
+
+# Reproducible boards of every fill pattern the game runs into; every builder takes (width, height) and
+# colors the blocks with the piece colors, picked by a fixed seed
+def makeFixtureBoard(name, width=10, height=20):
+    rng = random.Random(name)
+    colors = [table.color for table in PIECETABLES]
+    board = Board(width, height)
+    for y, xs in enumerate(BOARDFIXTURES[name](width, height, rng)):
+        for x in xs:
+            board.place([(x, y)], rng.choice(colors))
+    return board
+
+# Builders yield the filled columns of every row, top to bottom; no row is full
+def emptyRows(width, height, rng):
+    return [()] * height
+
+# Bottom half filled, one hole per row
+def halfFullRows(width, height, rng):
+    return filledRows(width, height, height // 2, rng)
+
+# Only the four top rows free, the shape spawns right above the stack
+def nearTopRows(width, height, rng):
+    return filledRows(width, height, height - 4, rng)
+
+def filledRows(width, height, count, rng):
+    rows = [()] * (height - count)
+    for _ in range(count):
+        hole = rng.randrange(width)
+        rows.append([x for x in range(width) if x != hole])
+    return rows
+
+# Bottom half in a checkerboard: every other cell, nothing to clear, a surface as bumpy as it gets
+def checkerboardRows(width, height, rng):
+    return [()] * (height - height // 2) + [[x for x in range(width) if (x + y) % 2 == 0]
+                                            for y in range(height - height // 2, height)]
+
+# Bottom 60 % randomly filled with overhangs and covered holes
+def manyHolesRows(width, height, rng):
+    count = height * 3 // 5
+    rows = [()] * (height - count)
+    for _ in range(count):
+        xs = [x for x in range(width) if rng.random() < 0.6]
+        if len(xs) == width:
+            xs.remove(rng.choice(xs))
+        rows.append(xs)
+    return rows
+
+BOARDFIXTURES = {
+    'empty': emptyRows,
+    'half-full': halfFullRows,
+    'near-top': nearTopRows,
+    'checkerboard': checkerboardRows,
+    'many-holes': manyHolesRows,
+}
+
+# True when a client's MirrorState shows exactly what the server's GameState holds
+def mirrorEquals(mirror, state):
+    board, expected = mirror.board, state.board
+    piece = state.piece
+    return (board.rows == expected.rows and
+            [[board.palette[index] for index in row] for row in board.colors] ==
+            [[expected.palette[index] for index in row] for row in expected.colors] and
+            mirror.piece.pose() == piece.pose() and
+            (mirror.score, mirror.lines, mirror.level, mirror.nextTable, mirror.isGameOver) ==
+            (state.score, state.lines, state.level, state.nextTable, state.isGameOver))
+
+def printTable(header, rows):
+    widths = [max(len(str(value)) for value in column) for column in zip(header, *rows)]
+    for row in [header] + rows:
+        print('  '.join(str(value).rjust(width) for value, width in zip(row, widths)))
@@ -0,0 +1,339 @@
+'''
+Bitboard playfield for the Tetris clone.
+
+Every row of the field is kept as a single integer mask (bit x set means column x is occupied)
+and a parallel color plane stores one byte per cell (index into the board palette, 0 = empty).
+Collision, placement and row clearing work on whole rows at once instead of walking rect lists.
+A per-column height index (row of the highest block in every column) is kept up to date on
+place and clear, so the landing row of a dropped shape is a few integer comparisons.
+
+Row masks are ints and color rows are immutable bytes, so a change replaces rows rather than
+editing them. snapshot() is O(1): it hands out the board's row lists as they are and marks them
+shared, and the next change copies the lists (height pointers) before touching them. Snapshots
+share every row that hasn't changed since with the board and with each other, and restore() is
+O(1) too. The board also keeps a Zobrist hash of its occupied cells, updated per placed cell and
+recomputed a row at a time after rows moved, so searches can key positions on one int.
+'''
+import random
+from collections import namedtuple
+
+BOARDWIDTH = 10
+BOARDHEIGHT = 20
+
+EMPTY = 0
+
+ZOBRISTSEED = 0x5EED    # Fixed, so hashes are the same in every process
+
+# State of a board at one moment; rows and colors are shared, never modify them
+BoardSnapshot = namedtuple('BoardSnapshot', 'rows colors columnTops hash')
+
+class Board:
+    def __init__(self, width=BOARDWIDTH, height=BOARDHEIGHT):
+        self.width = width
+        self.height = height
+        self.fullRowMask = (1 << width) - 1
+
+        # One int per row; bit x set = cell (x, y) occupied
+        self.rows = [0] * height
+
+        # Color plane; one bytes object per row holding palette index of every cell (EMPTY for free cells)
+        self.emptyColors = bytes(width)
+        self.colors = [self.emptyColors] * height
+
+        # Row of the highest settled block in every column, height for an empty column
+        self.columnTops = [height] * width
+
+        # Palette shared by color plane; index 0 reserved for empty cells
+        self.palette = [None]
+        self._paletteIndex = {}
+
+        # Incremented on every change, so views of the board (e.g. renderer) know when to refresh
+        self.version = 0
+
+        # Zobrist hash of the occupied cells: cellKeys[y][x] for single cells, rowKeys[y][chunk][byte] for whole rows
+        self.cellKeys, self.rowKeys = zobristKeys(width, height)
+        self.hash = 0
+
+        # Set while rows, colors and columnTops are shared with a snapshot; they are copied before the next change
+        self._isShared = False
+
+    # O(1) snapshot of the board as it is now
+    def snapshot(self):
+        self._isShared = True
+        return BoardSnapshot(self.rows, self.colors, self.columnTops, self.hash)
+
+    # Go back to a snapshot of this board (or of one with the same size and palette)
+    def restore(self, snapshot):
+        self.rows, self.colors, self.columnTops, self.hash = snapshot
+        self._isShared = True
+        self.version += 1
+
+    # Take own copies of the row lists before changing them
+    def _unshare(self):
+        if self._isShared:
+            self.rows = list(self.rows)
+            self.colors = list(self.colors)
+            self.columnTops = list(self.columnTops)
+            self._isShared = False
+
+    def colorIndex(self, color):
+        index = self._paletteIndex.get(color)
+        if index is None:
+            index = len(self.palette)
+            self.palette.append(color)
+            self._paletteIndex[color] = index
+        return index
+
+    def colorAt(self, x, y):
+        return self.palette[self.colors[y][x]]
+
+    # Cells above the top of the board (y < 0) are free, everything outside the side walls and below the floor is solid
+    def isOccupied(self, x, y):
+        if x < 0 or x >= self.width or y >= self.height:
+            return True
+        if y < 0:
+            return False
+        return (self.rows[y] >> x) & 1 == 1
+
+    # Check if any of the cells rests on the floor or on top of a settled block
+    def touchesGround(self, cells):
+        rows = self.rows
+        lastRow = self.height - 1
+        for x, y in cells:
+            if y >= lastRow:
+                return True
+            if y >= -1 and rows[y + 1] & (1 << x):
+                return True
+        return False
+
+    # Check if any of the cells has a settled block directly to its left or right
+    def touchesBlocks(self, cells):
+        rows = self.rows
+        for x, y in cells:
+            if 0 <= y < self.height and rows[y] & ((1 << (x + 1)) | (1 << x >> 1)):
+                return True
+        return False
+
+    # Mask based variants of the checks above; rowMasks is ((dy, mask), ...) as stored in precompiled piece
+    # tables, placed with its origin at (x, y). Every check costs one bit operation per occupied piece row.
+    def masksCollide(self, rowMasks, x, y):
+        rows = self.rows
+        for dy, mask in rowMasks:
+            if x < 0:
+                if mask & ((1 << -x) - 1):
+                    return True
+                mask >>= -x
+            else:
+                mask <<= x
+            if mask & ~self.fullRowMask:
+                return True
+            row = y + dy
+            if row >= self.height:
+                return True
+            if row >= 0 and rows[row] & mask:
+                return True
+        return False
+
+    def masksTouchGround(self, rowMasks, x, y):
+        rows = self.rows
+        lastRow = self.height - 1
+        for dy, mask in rowMasks:
+            row = y + dy
+            if row >= lastRow:
+                return True
+            if row >= -1 and rows[row + 1] & shiftMask(mask, x):
+                return True
+        return False
+
+    def masksTouchBlocks(self, rowMasks, x, y):
+        rows = self.rows
+        for dy, mask in rowMasks:
+            row = y + dy
+            if 0 <= row < self.height:
+                mask = shiftMask(mask, x)
+                if rows[row] & ((mask << 1) | (mask >> 1)):
+                    return True
+        return False
+
+    # Row where shape (a rotation from the piece tables) falling from (x, y) comes to rest
+    def dropY(self, shape, x, y):
+        columnTops = self.columnTops
+        landingY = min(columnTops[x + dx] - 1 - bottom for dx, bottom in shape.columnBottoms)
+        if landingY >= y:
+            return landingY
+        # The shape is already below the top of one of its columns (under an overhang), so walk down from it
+        rowMasks = shape.rowMasks
+        while not self.masksTouchGround(rowMasks, x, y):
+            y += 1
+        return y
+
+    # Settle cells on the board; cells above the top edge are dropped
+    def place(self, cells, color):
+        index = self.colorIndex(color)
+        self._unshare()
+        rows = self.rows
+        cellKeys = self.cellKeys
+        columnTops = self.columnTops
+        # Color rows the cells go to, copied once per row
+        changedColors = {}
+        for x, y in cells:
+            if 0 <= y < self.height:
+                if not rows[y] >> x & 1:
+                    rows[y] |= 1 << x
+                    self.hash ^= cellKeys[y][x]
+                rowColors = changedColors.get(y)
+                if rowColors is None:
+                    rowColors = changedColors[y] = bytearray(self.colors[y])
+                rowColors[x] = index
+                if y < columnTops[x]:
+                    columnTops[x] = y
+        for y, rowColors in changedColors.items():
+            self.colors[y] = bytes(rowColors)
+        self.version += 1
+
+    def isRowFull(self, y):
+        return self.rows[y] == self.fullRowMask
+
+    # Remove all full rows in one bottom-up pass, compacting the remaining rows in place.
+    # Returns indices (top to bottom) the cleared rows had before compaction.
+    def clearFullRows(self):
+        rows = self.rows
+        fullRowMask = self.fullRowMask
+        if fullRowMask not in rows:
+            return ()
+
+        self._unshare()
+        rows = self.rows
+        colors = self.colors
+        clearedRows = []
+        writeY = self.height - 1
+        for readY in range(self.height - 1, -1, -1):
+            mask = rows[readY]
+            if mask == fullRowMask:
+                clearedRows.append(readY)
+                continue
+            if writeY != readY:
+                rows[writeY] = mask
+                colors[writeY] = colors[readY]
+            writeY -= 1
+
+        emptyColors = self.emptyColors
+        for y in range(writeY + 1):
+            rows[y] = 0
+            colors[y] = emptyColors
+
+        self._rowsMoved()
+        clearedRows.reverse()
+        return clearedRows
+
+    # Push the stack up by count rows and fill the bottom with rows that are full except for column holeX.
+    # Returns True when settled blocks were pushed out over the top.
+    def addGarbageRows(self, count, holeX, color):
+        count = min(count, self.height)
+        self._unshare()
+        rows = self.rows
+        colors = self.colors
+        toppedOut = any(rows[:count])
+
+        index = self.colorIndex(color)
+        garbageColors = bytearray([index]) * self.width
+        garbageColors[holeX] = EMPTY
+        del rows[:count]
+        del colors[:count]
+        rows.extend([self.fullRowMask & ~(1 << holeX)] * count)
+        colors.extend([bytes(garbageColors)] * count)
+
+        self._rowsMoved()
+        return toppedOut
+
+    # Replace whole rows: changes is ((y, mask, rowColors), ...) with rowColors one palette index per cell
+    def setRows(self, changes):
+        self._unshare()
+        rows = self.rows
+        colors = self.colors
+        for y, mask, rowColors in changes:
+            rows[y] = mask
+            colors[y] = bytes(rowColors)
+        self._rowsMoved()
+
+    def clear(self):
+        self.rows = [0] * self.height
+        self.colors = [self.emptyColors] * self.height
+        self.columnTops = [self.height] * self.width
+        self.hash = 0
+        self._isShared = False
+        self.version += 1
+
+    # Height index and hash after rows were moved or replaced
+    def _rowsMoved(self):
+        self.updateColumnTops()
+        self.hash = hashRows(self.rows, self.rowKeys)
+        self.version += 1
+
+    # Rebuild the column height index from the rows, scanning from the top until every column is found
+    def updateColumnTops(self):
+        columnTops = [self.height] * self.width
+        found = 0
+        for y, mask in enumerate(self.rows):
+            newTops = mask & ~found
+            while newTops:
+                lowBit = newTops & -newTops
+                columnTops[lowBit.bit_length() - 1] = y
+                newTops ^= lowBit
+            found |= mask
+            if found == self.fullRowMask:
+                break
+        self.columnTops = columnTops
+
+    # Yield (x, y, color) for every settled cell
+    def iterCells(self):
+        palette = self.palette
+        for y, mask in enumerate(self.rows):
+            if mask == 0:
+                continue
+            rowColors = self.colors[y]
+            x = 0
+            while mask:
+                if mask & 1:
+                    yield x, y, palette[rowColors[x]]
+                mask >>= 1
+                x += 1
+
+# Zobrist keys of every board size in use: one random 64 bit key per cell, and for hashing a row at
+# a time, the XOR of the keys of every combination of 8 cells of a row
+_zobristKeys = {}
+
+def zobristKeys(width, height):
+    keys = _zobristKeys.get((width, height))
+    if keys is None:
+        rng = random.Random(ZOBRISTSEED)
+        cellKeys = [[rng.getrandbits(64) for x in range(width)] for y in range(height)]
+        rowKeys = []
+        for rowCellKeys in cellKeys:
+            chunks = []
+            for chunkX in range(0, width, 8):
+                chunk = [0] * 256
+                for byte in range(1, 256):
+                    lowBit = byte & -byte
+                    x = chunkX + lowBit.bit_length() - 1
+                    chunk[byte] = chunk[byte ^ lowBit] ^ (rowCellKeys[x] if x < width else 0)
+                chunks.append(chunk)
+            rowKeys.append(chunks)
+        keys = _zobristKeys[(width, height)] = (cellKeys, rowKeys)
+    return keys
+
+# Zobrist hash of row masks from scratch, one lookup per 8 cells of every non-empty row
+def hashRows(rows, rowKeys):
+    value = 0
+    for y, mask in enumerate(rows):
+        if mask:
+            for chunk in rowKeys[y]:
+                value ^= chunk[mask & 0xFF]
+                mask >>= 8
+    return value
+
+# Move row mask so that its bit 0 lands in column x; bits pushed past the left wall are dropped
+def shiftMask(mask, x):
+    if x >= 0:
+        return mask << x
+    return mask >> -x
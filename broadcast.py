@@ -0,0 +1,185 @@
+'''
+Live broadcast of games to spectators.
+
+GameBroadcast encodes the games being played after every tick with the delta protocol from
+protocol.py (changed rows, piece pose, stats) and hands a frame of TICKSPERFLUSH ticks to a
+Broadcaster, which writes the same bytes to every subscriber. Encoding is done once per frame,
+not once per viewer.
+
+Backpressure comes from the transports: a subscriber whose unsent data grows over HIGHWATER is
+paused and skipped, so a slow viewer costs at most HIGHWATER bytes of buffer (plus a kernel
+send buffer capped at SENDBUFFER). When its buffer
+drained below LOWWATER it gets a keyframe with the complete state instead of the deltas it
+missed, and deltas again from there. New viewers start with a keyframe too. Keyframes are only
+encoded for frames in which someone needs one.
+
+    python main.py --broadcast            # play and let others watch
+    python main.py --watch localhost      # watch
+'''
+import asyncio, socket, threading
+
+from protocol import SPECTATOR, BROADCASTPORT, encodeStart, encodeDelta, encodeKeyframe, StateEncoder
+from scheduler import TICKRATE
+
+HOST = '127.0.0.1'
+TICKSPERFLUSH = 3           # Ticks of deltas sent together, 20 frames per second at 60 ticks
+HIGHWATER = 4*1024          # Unsent bytes to a subscriber before it is skipped (several seconds of a live game)
+LOWWATER = 1024             # Unsent bytes below which a skipped subscriber gets a keyframe and deltas again
+SENDBUFFER = 8*1024         # Kernel send buffer per subscriber, so a stalled viewer reaches HIGHWATER soon
+
+class Subscriber(asyncio.Protocol):
+    def __init__(self, broadcaster):
+        self.broadcaster = broadcaster
+        self.transport = None
+        self.isPaused = False
+        self.needsKeyframe = True
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.set_write_buffer_limits(HIGHWATER, LOWWATER)
+        sock = transport.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SENDBUFFER)
+        self.broadcaster.subscribe(self)
+
+    def connection_lost(self, exc):
+        self.broadcaster.unsubscribe(self)
+
+    # Viewers only listen; anything they send (like a client's hello) is ignored
+    def data_received(self, data):
+        pass
+
+    def pause_writing(self):
+        self.isPaused = True
+        self.needsKeyframe = True
+
+    def resume_writing(self):
+        self.isPaused = False
+        self.broadcaster.wantsKeyframe = True
+
+class Broadcaster:
+    '''Fans frames out to all subscribers; everything but submit() runs on the event loop.'''
+
+    def __init__(self, host=HOST, port=BROADCASTPORT):
+        self.host = host
+        self.port = port
+        self.server = None
+        self.subscribers = set()
+
+        # MSG_START for new subscribers, replaced for every new game
+        self.header = None
+
+        # Read by GameBroadcast to decide whether the next frame needs a keyframe
+        self.wantsKeyframe = False
+
+        self.framesSent = 0
+        self.messagesSent = 0
+        self.keyframesSent = 0
+        self.bytesSent = 0
+        self.skipped = 0
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.server = await loop.create_server(lambda: Subscriber(self), self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.server.close()
+        for subscriber in list(self.subscribers):
+            subscriber.transport.close()
+        await self.server.wait_closed()
+
+    # Run func(*args) on the event loop; called from the thread that plays the game
+    def submit(self, func, *args):
+        func(*args)
+
+    def subscribe(self, subscriber):
+        self.subscribers.add(subscriber)
+        self.wantsKeyframe = True
+        if self.header is not None:
+            subscriber.transport.write(self.header)
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    # A new game started: everyone gets its header and then a keyframe
+    def restart(self, header):
+        self.header = header
+        for subscriber in self.subscribers:
+            subscriber.needsKeyframe = True
+            if not subscriber.isPaused:
+                subscriber.transport.write(header)
+        self.wantsKeyframe = bool(self.subscribers)
+
+    # deltas - delta messages of the ticks since the last frame; keyframe - state after them, or None
+    def sendFrame(self, deltas, keyframe):
+        self.framesSent += 1
+        wantsKeyframe = False
+        for subscriber in self.subscribers:
+            if subscriber.isPaused:
+                self.skipped += 1
+                continue
+            if subscriber.needsKeyframe:
+                if keyframe is None:
+                    # Wanted since the frame was encoded; the next one will have it
+                    wantsKeyframe = True
+                    continue
+                subscriber.transport.write(keyframe)
+                subscriber.needsKeyframe = False
+                self.keyframesSent += 1
+                self.bytesSent += len(keyframe)
+            elif deltas:
+                subscriber.transport.write(deltas)
+                self.bytesSent += len(deltas)
+            else:
+                continue
+            self.messagesSent += 1
+        self.wantsKeyframe = wantsKeyframe
+
+class ThreadedBroadcaster(Broadcaster):
+    '''Broadcaster on its own event loop thread, for the pygame game loop.'''
+
+    def __init__(self, host=HOST, port=BROADCASTPORT):
+        super().__init__(host, port)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='broadcast', daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.start(), self.loop).result()
+
+    def submit(self, func, *args):
+        self.loop.call_soon_threadsafe(func, *args)
+
+class GameBroadcast:
+    '''Encodes the games of one session for a Broadcaster; call publish() after every tick.'''
+
+    def __init__(self, broadcaster, tickRate=TICKRATE, ticksPerFlush=TICKSPERFLUSH):
+        self.broadcaster = broadcaster
+        self.tickRate = tickRate
+        self.ticksPerFlush = ticksPerFlush
+        self.states = []
+        self.encoders = []
+        self.tick = 0
+        self.pending = bytearray()
+
+    # Start broadcasting new games (one GameState, or both of a versus match)
+    def setStates(self, states):
+        self.states = list(states)
+        self.encoders = [StateEncoder(state, player) for player, state in enumerate(self.states)]
+        self.tick = 0
+        self.pending = bytearray()
+        board = self.states[0].board
+        header = encodeStart(0, SPECTATOR, self.states[0].seed or 0, board.width, board.height, self.tickRate)
+        self.broadcaster.submit(self.broadcaster.restart, header)
+
+    def publish(self):
+        self.tick += 1
+        delta = encodeDelta(self.tick, self.encoders)
+        if delta is not None:
+            self.pending += delta
+        if self.tick % self.ticksPerFlush == 0:
+            self.flush()
+
+    def flush(self):
+        keyframe = encodeKeyframe(self.tick, self.states) if self.broadcaster.wantsKeyframe else None
+        self.broadcaster.submit(self.broadcaster.sendFrame, bytes(self.pending), keyframe)
+        self.pending.clear()
@@ -0,0 +1,212 @@
+'''
+Client side of versus matches (see server.py and protocol.py).
+
+A client runs no game rules. It sends its inputs stamped with its own tick count and mirrors
+both players' games from the server's deltas into MirrorStates, which look enough like a
+GameState (board, piece, landingY, score, level) for BoardRenderer and the side panel to draw
+them. The same client watches broadcast games (broadcast.py) as a spectator.
+VersusClient lives on an asyncio loop (the load test runs hundreds of them on one);
+ThreadedVersusClient runs one on a background thread for the pygame front end, which applies
+the received deltas between frames so a board never changes in the middle of drawing it.
+'''
+import asyncio, concurrent.futures, queue, threading
+
+from board import Board
+from game import PRESSINPUTS
+from pieces import Piece, PIECETABLES
+from protocol import (MSG_START, MSG_DELTA, MSG_END, MSG_KEYFRAME, SPECTATOR, CODECOLORS, readMessage, encodeHello, encodeInput, decodeStart,
+                      decodeDelta, decodeEnd)
+from versus import PLAYERS
+
+CONNECTTIMEOUT = 5.0    # Seconds to wait for the server to accept the connection
+
+class MirrorState:
+    '''One player's game as last reported by the server.'''
+
+    def __init__(self, width, height):
+        self.board = Board(width, height)
+        self.piece = Piece()
+        self.reset()
+
+    # Forget everything before applying a keyframe
+    def reset(self):
+        self.board.clear()
+        self.piece.table = None
+        self.score = 0
+        self.lines = 0
+        self.level = 1
+        self.nextTable = None
+        self.isGameOver = False
+
+    # Nothing to draw before the first delta placed a piece
+    @property
+    def isReady(self):
+        return self.piece.table is not None
+
+    def landingY(self):
+        piece = self.piece
+        return self.board.dropY(piece.shape, piece.x, piece.y)
+
+    def upcoming(self):
+        return [self.nextTable]
+
+    def apply(self, delta):
+        if delta.rows:
+            board = self.board
+            changes = []
+            for y, codes in delta.rows:
+                rowColors = bytearray(board.width)
+                mask = 0
+                for x, code in enumerate(codes):
+                    if code:
+                        mask |= 1 << x
+                        rowColors[x] = board.colorIndex(CODECOLORS[code])
+                changes.append((y, mask, rowColors))
+            board.setRows(changes)
+
+        if delta.pose is not None:
+            tableIndex, rotation, x, y = delta.pose
+            piece = self.piece
+            if piece.table is not PIECETABLES[tableIndex]:
+                piece.spawn(PIECETABLES[tableIndex], x, y)
+            piece.setRotation(rotation)
+            piece.x = x
+            piece.y = y
+
+        if delta.stats is not None:
+            self.score, self.lines, self.level = delta.stats
+        if delta.nextIndex is not None:
+            self.nextTable = PIECETABLES[delta.nextIndex]
+        if delta.isGameOver:
+            self.isGameOver = True
+
+class VersusClient:
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.matchId = None
+        self.player = None
+        self.seed = None
+        self.width = None
+        self.height = None
+        self.tickRate = None
+        self.states = None
+
+        # Tick of the last delta applied, and the winner once the match ended (-1 for a draw)
+        self.serverTick = 0
+        self.winner = None
+        self.isOver = False
+
+        self.lastInputs = 0
+        self.bytesSent = 0
+        self.bytesReceived = 0
+
+    @property
+    def isSpectator(self):
+        return self.player == SPECTATOR
+
+    # Spectators see the first player's game as their own
+    @property
+    def ownState(self):
+        return self.states[0 if self.isSpectator else self.player]
+
+    @property
+    def opponentState(self):
+        return self.states[1 if self.isSpectator else 1 - self.player]
+
+    # Connect and wait until the server paired us with an opponent
+    async def connect(self, host, port):
+        self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(host, port), CONNECTTIMEOUT)
+        self._write(encodeHello())
+        messageType, payload = await readMessage(self.reader)
+        if messageType != MSG_START:
+            raise ConnectionError(f'expected the match to start, got message type {messageType}')
+        self.bytesReceived += 3 + len(payload)
+        self.matchId, self.player, self.seed, self.width, self.height, self.tickRate = decodeStart(payload)
+        self.states = [MirrorState(self.width, self.height) for _ in range(PLAYERS)]
+
+    def _write(self, data):
+        self.writer.write(data)
+        self.bytesSent += len(data)
+
+    # Inputs for our tick number `tick`; only changes and key presses go on the wire
+    def sendInputs(self, tick, inputs):
+        if self.isOver or self.isSpectator or (inputs == self.lastInputs and not inputs & PRESSINPUTS):
+            return
+        self.lastInputs = inputs
+        self._write(encodeInput(tick, inputs))
+
+    # Read messages until the match ends or the server goes away
+    async def receive(self):
+        try:
+            while True:
+                messageType, payload = await readMessage(self.reader)
+                self.bytesReceived += 3 + len(payload)
+                self.handleMessage(messageType, payload)
+                if messageType == MSG_END:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.handleMessage(MSG_END, None)
+        finally:
+            self.writer.close()
+
+    def handleMessage(self, messageType, payload):
+        if messageType in (MSG_DELTA, MSG_KEYFRAME):
+            if messageType == MSG_KEYFRAME:
+                for state in self.states:
+                    state.reset()
+            self.serverTick, deltas = decodeDelta(payload, self.width, self.height)
+            for delta in deltas:
+                self.states[delta.player].apply(delta)
+        elif messageType == MSG_END:
+            # A lost connection ends the match without a winner
+            if payload is not None:
+                self.winner = decodeEnd(payload)
+            self.isOver = True
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+class ThreadedVersusClient(VersusClient):
+    '''VersusClient on its own event loop thread; poll() applies received messages on the calling thread.'''
+
+    def __init__(self):
+        super().__init__()
+        self.inbox = queue.SimpleQueue()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='versus-client', daemon=True)
+        self.thread.start()
+
+    # Returns a concurrent.futures.Future that is done once the match started (or failed to)
+    def start(self, host, port):
+        self.started = concurrent.futures.Future()
+        asyncio.run_coroutine_threadsafe(self._connectAndReceive(host, port), self.loop)
+        return self.started
+
+    async def _connectAndReceive(self, host, port):
+        try:
+            await self.connect(host, port)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError) as error:
+            self.started.set_exception(ConnectionError(f'could not join a match on {host}:{port}: {error!r}'))
+            return
+        self.started.set_result(None)
+        await self.receive()
+
+    def handleMessage(self, messageType, payload):
+        self.inbox.put((messageType, payload))
+
+    def poll(self):
+        while True:
+            try:
+                messageType, payload = self.inbox.get_nowait()
+            except queue.Empty:
+                return
+            VersusClient.handleMessage(self, messageType, payload)
+
+    def sendInputs(self, tick, inputs):
+        self.loop.call_soon_threadsafe(VersusClient.sendInputs, self, tick, inputs)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(VersusClient.close, self)
+        self.loop.call_soon_threadsafe(self.loop.stop)
@@ -0,0 +1,113 @@
+'''
+Keyboard controls for the pygame front end.
+
+Key events are stamped with the time they were taken from pygame's event queue and wait in
+KeyboardInput until a logic tick takes them with takeInputs(tickTime). Every tick gets the
+events up to its own time, so no key press is lost or merged with another one, and presses are
+applied in the order they were made, however many ticks a frame runs (none, or several after a
+dropped frame).
+
+Horizontal movement is timed in real time instead of frames: a direction key moves the shape
+once when it is pressed, again after it has been held for DAS seconds (delayed auto shift) and
+then every ARR seconds (auto repeat rate). Each move reaches GameState as a one-step shift input
+(INPUT_SHIFTLEFT or INPUT_SHIFTRIGHT), so replays and the versus server get exactly the moves
+the player saw. GameState checks every move at its destination.
+
+GameState.step applies a rotation, then a shift, then a hard drop. A press that would be
+applied out of that order, or a second press of the same kind, waits for the next tick. So at
+most one column is shifted per tick, even with an ARR shorter than a tick.
+'''
+import time
+from collections import deque
+
+from game import INPUT_DOWN, INPUT_ROTATE, INPUT_HARDDROP, INPUT_SHIFTLEFT, INPUT_SHIFTRIGHT, LEFT, RIGHT
+
+DAS = 0.167     # Seconds a direction key is held before the shape starts moving on its own
+ARR = 0.050     # Seconds between moves after that
+
+# Actions the keys are mapped to (besides LEFT and RIGHT)
+SOFTDROP = 'softdrop'
+ROTATE = 'rotate'
+HARDDROP = 'harddrop'
+
+# Inputs of the pressed actions and where GameState.step applies them
+PRESSINPUTS = {ROTATE: INPUT_ROTATE, LEFT: INPUT_SHIFTLEFT, RIGHT: INPUT_SHIFTRIGHT, HARDDROP: INPUT_HARDDROP}
+PRESSORDER = {ROTATE: 0, LEFT: 1, RIGHT: 1, HARDDROP: 2}
+
+class KeyboardInput:
+    def __init__(self, das=DAS, arr=ARR, clock=time.perf_counter):
+        self.das = das
+        self.arr = arr
+        self.clock = clock
+
+        # (time, action, isDown) not taken by a tick yet
+        self.events = deque()
+
+        # Direction keys held, in the order they were pressed; the last one moves the shape
+        self.directions = []
+
+        # When the held direction moves the shape next, or None
+        self.repeatTime = None
+        self.isSoftDropping = False
+
+    # A key mapped to action went down or up; stamped with the clock unless now is given
+    def handleKey(self, action, isDown, now=None):
+        self.events.append((self.clock() if now is None else now, action, isDown))
+
+    # Forget queued and held keys (the game was paused or is over)
+    def reset(self):
+        self.events.clear()
+        self.directions.clear()
+        self.repeatTime = None
+        self.isSoftDropping = False
+
+    # Input mask for the tick that takes the keys up to tickTime
+    def takeInputs(self, tickTime):
+        inputs = INPUT_DOWN if self.isSoftDropping else 0
+        lastOrder = -1
+        events = self.events
+        while True:
+            eventTime = events[0][0] if events else None
+
+            # Auto repeat of the held direction, if it is due before the next event
+            repeatTime = self.repeatTime
+            if repeatTime is not None and repeatTime <= tickTime and (eventTime is None or repeatTime <= eventTime):
+                action = self.directions[-1]
+                if PRESSORDER[action] <= lastOrder:
+                    break
+                inputs |= PRESSINPUTS[action]
+                lastOrder = PRESSORDER[action]
+                # A repeat that is late doesn't make the next one come sooner
+                self.repeatTime = max(repeatTime + self.arr, tickTime)
+                continue
+
+            if eventTime is None or eventTime > tickTime:
+                break
+            _, action, isDown = events[0]
+            if isDown and action in PRESSORDER and action not in self.directions:
+                if PRESSORDER[action] <= lastOrder:
+                    break
+                inputs |= PRESSINPUTS[action]
+                lastOrder = PRESSORDER[action]
+            events.popleft()
+            if action == SOFTDROP:
+                self.isSoftDropping = isDown
+                if isDown:
+                    inputs |= INPUT_DOWN
+            elif action in (LEFT, RIGHT):
+                self._updateDirections(eventTime, action, isDown)
+        return inputs
+
+    def _updateDirections(self, eventTime, action, isDown):
+        directions = self.directions
+        if isDown:
+            # Keyboard auto repeat sends more key downs for a held key; those don't restart the delay
+            if action not in directions:
+                directions.append(action)
+                self.repeatTime = eventTime + self.das
+        elif action in directions:
+            wasMoving = directions[-1] == action
+            directions.remove(action)
+            if wasMoving:
+                # The other direction, if still held, takes over after its own delay
+                self.repeatTime = eventTime + self.das if directions else None
@@ -0,0 +1,125 @@
+'''
+Timed visual effects layered over the board: a flash of cleared rows and the rows above them
+collapsing into the gap, a flash of a locked shape and a fade of the board at game over.
+
+Effects are purely visual. The rules still clear rows and lock shapes within one logic tick, so
+replays, versus matches and the autoplayer are unaffected, and the game keeps running while an
+effect plays. EffectPool hands out Effect objects from a fixed set made up front, so starting an
+effect allocates nothing; when all of them are playing, the oldest one is cut short and reused.
+BoardRenderer draws the effects that are playing on every frame (see renderer.py).
+'''
+import time
+
+from game import EVENT_LOCK, EVENT_CLEAR, EVENT_GAMEOVER
+
+# Kinds of effects
+EFFECT_ROWFLASH = 1     # rows - mask of the cleared rows (board rows before the clear)
+EFFECT_COLLAPSE = 2     # rows - mask of the cleared rows, the rows above them fall into the gap
+EFFECT_LOCKFLASH = 3    # table, rotation, x, y - the shape that locked
+EFFECT_FADE = 4         # the whole board darkens; stays until the pool is cleared
+
+# Seconds
+ROWFLASHTIME = 0.15
+COLLAPSETIME = 0.12     # Starts when the flash is over
+LOCKFLASHTIME = 0.12
+FADETIME = 0.5
+
+EFFECTPOOLSIZE = 8
+
+class Effect:
+    __slots__ = ('kind', 'start', 'end', 'duration', 'rows', 'table', 'rotation', 'x', 'y', 'version')
+
+    def __init__(self):
+        self.kind = None
+        self.start = self.end = self.duration = 0.0
+        self.rows = 0
+        self.table = None
+        self.rotation = self.x = self.y = 0
+        self.version = None     # Board.version the effect was started on
+
+    # How far along the effect is at time now, from 0.0 (not started yet) to 1.0
+    def progress(self, now):
+        if now <= self.start:
+            return 0.0
+        return min((now - self.start) / self.duration, 1.0)
+
+class EffectPool:
+    def __init__(self, size=EFFECTPOOLSIZE, clock=time.perf_counter):
+        self.clock = clock
+        self.effects = tuple(Effect() for _ in range(size))
+        self.free = list(self.effects)
+
+        # Playing effects, oldest first
+        self.active = []
+        self.started = 0
+        self.stolen = 0
+
+    # Start an effect after delay seconds; it plays for duration seconds (or until the pool is cleared with hold)
+    def start(self, kind, now, duration, delay=0.0, hold=False):
+        if self.free:
+            effect = self.free.pop()
+        else:
+            effect = self.active.pop(0)
+            self.stolen += 1
+        effect.kind = kind
+        effect.start = now + delay
+        effect.duration = duration
+        effect.end = float('inf') if hold else effect.start + duration
+        self.active.append(effect)
+        self.started += 1
+        return effect
+
+    # Return finished effects to the pool
+    def update(self, now):
+        active = self.active
+        kept = 0
+        for effect in active:
+            if effect.end > now:
+                active[kept] = effect
+                kept += 1
+            else:
+                self.free.append(effect)
+        del active[kept:]
+
+    # Stop effects of the given kinds at once
+    def cancel(self, *kinds):
+        for effect in self.active:
+            if effect.kind in kinds:
+                effect.end = 0.0
+        self.update(0.0)
+
+    def clear(self):
+        self.free.extend(self.active)
+        self.active.clear()
+
+    def isPlaying(self, kind):
+        return any(effect.kind == kind for effect in self.active)
+
+    # Start the effects of what the last GameState.step did; call after every step
+    def startFromEvents(self, state, now):
+        lockPose = None
+        for event, value in state.events:
+            if event == EVENT_LOCK:
+                lockPose = value
+            elif event == EVENT_CLEAR:
+                self.startClear(value, state.board.version, now)
+                # The flash of the cleared rows covers the shape that completed them
+                lockPose = None
+            elif event == EVENT_GAMEOVER:
+                self.start(EFFECT_FADE, now, FADETIME, hold=True)
+        if lockPose is not None:
+            effect = self.start(EFFECT_LOCKFLASH, now, LOCKFLASHTIME)
+            effect.table, effect.rotation, effect.x, effect.y = lockPose
+            effect.version = state.board.version
+
+    # clearedRows - board rows (before the clear) that were removed, boardVersion - version after the clear
+    def startClear(self, clearedRows, boardVersion, now):
+        # A new clear moves the rows the running effects were drawn for
+        self.cancel(EFFECT_ROWFLASH, EFFECT_COLLAPSE, EFFECT_LOCKFLASH)
+        rows = 0
+        for y in clearedRows:
+            rows |= 1 << y
+        flash = self.start(EFFECT_ROWFLASH, now, ROWFLASHTIME)
+        collapse = self.start(EFFECT_COLLAPSE, now, COLLAPSETIME, delay=ROWFLASHTIME)
+        flash.rows = collapse.rows = rows
+        flash.version = collapse.version = boardVersion
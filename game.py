@@ -0,0 +1,277 @@
+'''
+Headless game rules for the Tetris clone.
+
+GameState holds everything runGame used to keep in local variables and advances the game one
+frame ("tick") at a time from a bit mask of inputs, so games can be simulated without pygame,
+without a display and as fast as the CPU allows. The pygame front end in main.py only
+translates keys into inputs and draws the state.
+'''
+from board import Board, BOARDWIDTH, BOARDHEIGHT
+from pieces import Piece
+from randomizers import PieceSource
+
+# Inputs for one step, combined as bit flags
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_DOWN = 4      # Soft drop key held
+INPUT_ROTATE = 8    # Rotation key pressed during this step
+INPUT_HARDDROP = 16 # Hard drop key pressed during this step
+INPUT_SHIFTLEFT = 32    # Move one column left during this step (timed by the caller, see controls.py)
+INPUT_SHIFTRIGHT = 64   # Move one column right during this step
+SHIFTINPUTS = INPUT_SHIFTLEFT | INPUT_SHIFTRIGHT
+# Inputs triggered by a key press rather than a held key
+PRESSINPUTS = INPUT_ROTATE | INPUT_HARDDROP | SHIFTINPUTS
+
+# Events reported in GameState.events by the last step
+EVENT_ROTATE = 'rotate'
+EVENT_HARDDROP = 'harddrop'
+EVENT_LOCK = 'lock'
+EVENT_CLEAR = 'clear'
+EVENT_LEVELUP = 'levelup'
+EVENT_GAMEOVER = 'gameover'
+EVENT_GARBAGE = 'garbage'
+
+# Color of garbage rows sent by the opponent in versus mode
+GARBAGECOLOR = (128,128,128)
+
+# DIRECTIONS
+LEFT = 'left'
+RIGHT = 'right'
+
+# How many ticks the figure waits before falling one row; lowered on level up and while soft dropping
+INITIALFALLINGSPEED = 24
+SOFTDROPFALLINGSPEED = 4
+LEVELUPSPEEDSTEP = 2
+MAXLEVEL = 11
+
+# Limit key reaction rate (ticks between horizontal moves while INPUT_LEFT or INPUT_RIGHT is held)
+MOVEDELAY = 5
+
+# Row of the 4x4 template of a new shape; its column is centered on the board, see spawnX
+FIRSTSPAWNY = 0
+SPAWNY = -2
+
+# Column of the 4x4 template of a new shape (3 on the standard 10 wide board)
+def spawnX(width):
+    return (width - 4) // 2
+
+class GameState:
+    def __init__(self, seed=None, width=BOARDWIDTH, height=BOARDHEIGHT, levelUpSpeedStep=LEVELUPSPEEDSTEP,
+                 randomizer='uniform', lookahead=1):
+        self.seed = seed
+        self.board = Board(width, height)
+
+        # Currently controlled shape and the upcoming ones shown in preview window
+        self.piece = Piece()
+        self.pieceSource = PieceSource(seed, randomizer, lookahead)
+
+        # Make blocks fall with appropriate speed
+        self.fallingTimer = 0
+        self.fallingSpeed = INITIALFALLINGSPEED
+        self.levelUpSpeedStep = levelUpSpeedStep
+        self.isSoftDropping = False
+
+        self.moveTicker = 0
+
+        self.score = 0
+        self.level = 1
+        self.lines = 0
+        self.pieces = 0
+        self.ticks = 0
+        self.isGameOver = False
+
+        # (event, value) pairs produced by the last step
+        self.events = []
+
+        # Cached result of checkCollisionsWithBottom; None when the shape or the board changed since last check
+        self._isTouchingGround = None
+
+        self.spawn(y=FIRSTSPAWNY)
+
+    # Falling speed in effect for the current tick
+    @property
+    def currentFallingSpeed(self):
+        return SOFTDROPFALLINGSPEED if self.isSoftDropping else self.fallingSpeed
+
+    # Shape shown first in preview window
+    @property
+    def nextTable(self):
+        return self.pieceSource.peek()
+
+    # Put a new shape (by default the first one from preview) on top of the board
+    def spawn(self, table=None, y=SPAWNY):
+        if table is None:
+            table = self.pieceSource.next()
+        self.piece.spawn(table, spawnX(self.board.width), y)
+        self._isTouchingGround = None
+
+    def move(self, direction):
+        # Allow for horizontal movement only when the cells the figure moves into are free and inside the board
+        piece = self.piece
+        newX = piece.x + (1 if direction == RIGHT else -1)
+        if checkCollisionsAtDestination(piece.shape, newX, piece.y, self.board):
+            return False
+        moveShapeInXDir(piece, direction)
+        self._isTouchingGround = None
+        return True
+
+    def rotate(self):
+        # Rotate only if the cells of the figure in new orientation are free and inside the board
+        piece = self.piece
+        nextShape = piece.nextShape()
+        if checkCollisionsAtDestination(nextShape, piece.x, piece.y, self.board):
+            return False
+        piece.setRotation(piece.rotationCounter + 1)
+        self._isTouchingGround = None
+        self.events.append((EVENT_ROTATE, piece.rotationCounter))
+        return True
+
+    def softDrop(self, isHeld):
+        self.isSoftDropping = bool(isHeld)
+
+    # Row the shape would land on if dropped now (ghost piece)
+    def landingY(self):
+        piece = self.piece
+        return self.board.dropY(piece.shape, piece.x, piece.y)
+
+    # Move the shape straight to its landing row and lock it there
+    def hardDrop(self):
+        landingY = self.landingY()
+        self.events.append((EVENT_HARDDROP, landingY - self.piece.y))
+        self.piece.y = landingY
+        self.lock()
+
+    # Contact with the ground can only change when the shape moves or the board changes
+    def isTouchingGround(self):
+        if self._isTouchingGround is None:
+            self._isTouchingGround = checkCollisionsWithBottom(self.piece, self.board)
+        return self._isTouchingGround
+
+    # Handle vertical movement (falling); returns True when the shape rests on the ground and should be locked
+    def tick(self):
+        if self.isTouchingGround():
+            return True
+        if self.fallingTimer == self.currentFallingSpeed:
+            self.piece.y += 1
+            self._isTouchingGround = None
+        return False
+
+    def lock(self):
+        piece = self.piece
+        self.board.place(piece.cells(), piece.color)
+        self.pieces += 1
+        self.events.append((EVENT_LOCK, piece.pose()))
+        self.clear()
+        self.spawn()
+
+    # Rows sent by the opponent in versus mode: the stack rises by count rows with a hole at column holeX
+    def addGarbage(self, count, holeX):
+        if count <= 0 or self.isGameOver:
+            return
+        toppedOut = self.board.addGarbageRows(count, holeX, GARBAGECOLOR)
+
+        # Push the falling shape up if the rising stack ran into it
+        piece = self.piece
+        while self.board.masksCollide(piece.shape.rowMasks, piece.x, piece.y):
+            piece.y -= 1
+        self._isTouchingGround = None
+        self.events.append((EVENT_GARBAGE, count))
+
+        if toppedOut:
+            self.isGameOver = True
+            self.events.append((EVENT_GAMEOVER, self.score))
+
+    # Clear full rows after a shape locked and update score and level
+    def clear(self):
+        clearedRows = self.board.clearFullRows()
+        howManyRowsToDelete = len(clearedRows)
+
+        if howManyRowsToDelete:
+            self.lines += howManyRowsToDelete
+            # Increase score
+            self.score += 10*howManyRowsToDelete
+            self.events.append((EVENT_CLEAR, clearedRows))
+
+        while checkIflevelUp(self.score, self.level):
+            self.level += 1
+            self.fallingSpeed = max(self.fallingSpeed - self.levelUpSpeedStep, 0)
+            self.events.append((EVENT_LEVELUP, self.level))
+
+        return howManyRowsToDelete
+
+    # Advance the game by one frame of the original runGame loop
+    def step(self, inputs=0):
+        self.events.clear()
+        if self.isGameOver:
+            return
+
+        self.ticks += 1
+
+        # Generate next figure after the previous one fell on the ground
+        if self.tick():
+            self.lock()
+
+        # Shifts come already timed (delayed auto shift in controls.py); held keys move every MOVEDELAY ticks
+        direction = None
+        isShift = inputs & SHIFTINPUTS
+        if isShift:
+            direction = RIGHT if inputs & INPUT_SHIFTRIGHT else LEFT
+        elif inputs & (INPUT_LEFT | INPUT_RIGHT) and self.moveTicker == 0:
+            direction = RIGHT if inputs & INPUT_RIGHT else LEFT
+
+        self.softDrop(inputs & INPUT_DOWN)
+
+        if inputs & INPUT_ROTATE:
+            self.rotate()
+
+        if direction is not None and self.move(direction) and not isShift:
+            self.moveTicker = MOVEDELAY
+
+        if inputs & INPUT_HARDDROP:
+            self.hardDrop()
+
+        # Control falling speed
+        self.fallingTimer += 1
+        if self.fallingTimer > self.currentFallingSpeed:
+            self.fallingTimer = 0
+
+        if self.moveTicker > 0:
+            self.moveTicker -= 1
+
+        # Check if no more figures fit into game screen
+        if self.piece.y + self.piece.shape.minDy < 0 and self.isTouchingGround():
+            self.isGameOver = True
+            self.events.append((EVENT_GAMEOVER, self.score))
+
+# Play one game to the end; policy(state) returns inputs for the next step
+def runUntilGameOver(state, policy=None, maxTicks=None):
+    while not state.isGameOver:
+        if maxTicks is not None and state.ticks >= maxTicks:
+            break
+        state.step(policy(state) if policy is not None else 0)
+    return state
+
+# Check if figures collide with each other (shape is one rotation from the piece tables, placed at x, y)
+def checkCollisionsBetweenBlocks(shape, x, y, board):
+    return board.masksTouchBlocks(shape.rowMasks, x, y)
+
+# Check if shape touches bottom edge of game screen or with top side of other figures
+def checkCollisionsWithBottom(currentShape, board):
+    return board.masksTouchGround(currentShape.shape.rowMasks, currentShape.x, currentShape.y)
+
+# Check if shape placed at x, y would overlap other figures or stick out of the sides or the bottom
+def checkCollisionsAtDestination(shape, x, y, board):
+    return board.masksCollide(shape.rowMasks, x, y)
+
+def checkIflevelUp(score, level):
+    if score >= 100*level and level < MAXLEVEL:
+        return True
+
+    return False
+
+# Handle horizontal movement of blocks
+def moveShapeInXDir(currentShape, direction):
+    if direction == RIGHT:
+        currentShape.x += 1
+    if direction == LEFT:
+        currentShape.x -= 1
@@ -1,7 +1,17 @@
-import pygame, sys, random
-from collections import Counter
+import argparse, atexit, os, pygame, random, sys, time
 from pygame.locals import *
-from blocks_templates import *
+from assets import ASSETS
+from audio import AUDIO
+from board import BOARDWIDTH, BOARDHEIGHT
+from controls import KeyboardInput, SOFTDROP, ROTATE, HARDDROP
+from effects import EffectPool, EFFECT_FADE, FADETIME
+from game import GameState, LEFT, RIGHT
+from profiler import FrameProfiler, NullProfiler, FRAME
+from protocol import PORT, BROADCASTPORT
+from renderer import BoardRenderer
+from replay import ReplayRecorder, loadReplay, iterInputs, createGameState
+from scheduler import FixedTimestep, TICKRATE
+from surface_cache import SURFACECACHE, renderText
 
 # import logging
 # logging.basicConfig(level=logging.DEBUG, format='%(levelname)s:%(message)s')
@@ -11,221 +21,579 @@ from blocks_templates import *
 Tetris clone by Krzysztof Urbaniec, Poland, February 2022
 '''
 
-pygame.init()
-
 # CONSTANTS
-DISPLAYWINDOWWIDTH = 550    # Main window width
-DISPLAYWINDOWHEIGHT = 600   # Main window height
+BASEWINDOWWIDTH = 550       # Window size the layout and font sizes were designed for
+BASEWINDOWHEIGHT = 600
+DISPLAYWINDOWWIDTH = BASEWINDOWWIDTH    # Main window width (the window can be resized)
+DISPLAYWINDOWHEIGHT = BASEWINDOWHEIGHT  # Main window height
+GRIDWIDTH = BOARDWIDTH      # Number of blocks in a row
+GRIDHEIGHT = BOARDHEIGHT    # Number of block in a column
+MINGRIDSIZE = 4             # Every piece has to fit in the board
+MAXGRIDSIZE = 100
+
+# Pixel sizes below are those of the default window and board; setLayout() fits them to any other
 GAMEWINDOWWIDTH = 250       # Window with blocks width
 GAMEWINDOWHEIGHT = 500      # Window with blocks height
 BLOCKSIZE = 25              
 BLOCKGAPSIZE = 2            # Gap size between blocks            
-GRIDWIDTH = GAMEWINDOWWIDTH//BLOCKSIZE      # Number of blocks in a row
-GRIDHEIGHT = GAMEWINDOWHEIGHT//BLOCKSIZE    # Number of block in a column
+PREVIEWBLOCKSIZE = 25       # Blocks of the next shape in the side panel
 GRIDMARGINX = int(DISPLAYWINDOWWIDTH * 0.15)    # Game window positioning constant
 GRIDMARGINY = int(DISPLAYWINDOWHEIGHT * 0.1)    # Game window positioning constant
 SIDEPANELMARGINX = 0.05*GAMEWINDOWWIDTH         # Side panel (score, level, shape preview) positioning constant
-assert GRIDWIDTH == 10, "Grid width not equal 10"
-assert GRIDHEIGHT == 20, "Grid height not equal 20"
-FONT = pygame.font.SysFont('comicsans', 28)
-FPS = 60
+UISCALE = 1.0               # Font sizes and text positions relative to the base window
+
+# Share of the window the board may take up; blocks get the largest whole pixel size that fits
+PLAYFIELDWIDTHSHARE = 250 / BASEWINDOWWIDTH
+PLAYFIELDHEIGHTSHARE = 500 / BASEWINDOWHEIGHT
+BLOCKGAPSHARE = 2 / 25
+FPS = 60                    # Render framerate cap; game logic always runs at scheduler.TICKRATE
+PREVIEWCOUNT = 3            # How many upcoming shapes are shown in the side panel
+RANDOMIZER = 'uniform'      # Piece randomizer, see randomizers.RANDOMIZERS
+OVERLAYREFRESH = 30         # Frames between updates of the profiler overlay
+FONTNAME = 'comicsans'
+FONTSIZE = 28
+OVERLAYFONTSIZE = 12
+MUSICFILE = 'tetris_theme.mp3'  # Relative to the game directory
+MUSICVOLUME = 0.7
+LEADERBOARDSIZE = 5         # Best games listed on the game over screen
+LEADERBOARDFONTSIZE = 20
+GAMEOVERKEYDELAY = 0.5      # Seconds the game over screen ignores the spacebar
+OPPONENTWIDTHSHARE = 0.7    # Part of the side panel the opponent's board may take up during versus matches
+OPPONENTHEIGHTSHARE = 0.34
 
 # GENERAL COLORS
 WHITE = (255,255,255)
 BLACK = (0,0,0)
 GRAY = (128,128,128)
 BLUE = (0,0,255)
+YELLOW = (255,255,0)
 
 TEXTCOLOR = WHITE
 BGCOLOR = BLACK
-GRIDCOLOR = GRAY
 OUTLINECOLOR = BLUE
-
-# DIRECTIONS
-LEFT = 'left'
-RIGHT = 'right'
-
-def main():
-    global DISPLAYSURF, MAINBOARDSURF, SIDEPANELSURF, FPSClock
-    DISPLAYSURF = pygame.display.set_mode((DISPLAYWINDOWWIDTH, DISPLAYWINDOWHEIGHT))
-    MAINBOARDSURF = pygame.Surface((GAMEWINDOWWIDTH, GAMEWINDOWHEIGHT))
-    SIDEPANELSURF = pygame.Surface((GAMEWINDOWWIDTH*0.7, GAMEWINDOWHEIGHT))
+HIGHLIGHTCOLOR = YELLOW
+
+# Game keys; timing of moves and order of presses is handled by controls.KeyboardInput
+KEYACTIONS = {K_LEFT: LEFT, K_RIGHT: RIGHT, K_DOWN: SOFTDROP, K_UP: ROTATE, K_SPACE: HARDDROP}
+
+# Replaced by FrameProfiler when the game is started with --profile
+PROFILER = NullProfiler()
+
+# High scores and game statistics, opened in main()
+SCORES = None
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description='Tetris clone.')
+    parser.add_argument('--profile', action='store_true', help='time every phase of a frame and show p50/p95/p99 on screen')
+    parser.add_argument('--no-audio', action='store_true', help='no sound effects or music, the mixer is never opened')
+    parser.add_argument('--autoplay', action='store_true', help='let the autoplayer (ai.py) play instead of the keyboard')
+    parser.add_argument('--record', metavar='DIR', default=None, help='save a replay of every game into this directory')
+    parser.add_argument('--replay', metavar='PATH', default=None, help='watch a recorded game in real time instead of playing')
+    parser.add_argument('--connect', metavar='HOST[:PORT]', default=None,
+                        help=f'play versus matches against other players on a server (server.py, default port {PORT})')
+    parser.add_argument('--broadcast', metavar='[HOST:]PORT', nargs='?', const=str(BROADCASTPORT), default=None,
+                        help=f'let spectators watch your games live (default 127.0.0.1:{BROADCASTPORT})')
+    parser.add_argument('--watch', metavar='HOST[:PORT]', default=None,
+                        help=f'watch the games of a player started with --broadcast (default port {BROADCASTPORT})')
+    parser.add_argument('--scores', metavar='PATH', default=None,
+                        help='SQLite database with high scores and game statistics (default scores.sqlite3 next to the game)')
+    parser.add_argument('--profile-out', default=None,
+                        help='on exit write frame timings to this file, as CSV if it ends with .csv, otherwise JSON (implies --profile)')
+    parser.add_argument('--soak', metavar='PIECES', type=int, default=None,
+                        help='let the autoplayer play PIECES pieces (headless unless SDL_VIDEODRIVER is set) '
+                             'and report allocations, memory growth and GC pauses')
+    parser.add_argument('--soak-baseline', metavar='PATH', default=None,
+                        help='compare the --soak report to this JSON baseline (written if missing); exit status 1 on regressions')
+    parser.add_argument('--width', type=int, default=GRIDWIDTH, help=f'board width in blocks (default {GRIDWIDTH})')
+    parser.add_argument('--height', type=int, default=GRIDHEIGHT, help=f'board height in blocks (default {GRIDHEIGHT})')
+    parser.add_argument('--window', metavar='WIDTHxHEIGHT', default=f'{DISPLAYWINDOWWIDTH}x{DISPLAYWINDOWHEIGHT}',
+                        help='initial window size in pixels; the window can also be resized while playing')
+    args = parser.parse_args(argv)
+    for name in ('width', 'height'):
+        if not MINGRIDSIZE <= getattr(args, name) <= MAXGRIDSIZE:
+            parser.error(f'--{name} must be between {MINGRIDSIZE} and {MAXGRIDSIZE}')
+    if args.soak is not None and args.soak <= 0:
+        parser.error('--soak must be a positive number of pieces')
+    try:
+        args.window = tuple(int(size) for size in args.window.lower().split('x'))
+    except ValueError:
+        args.window = ()
+    if len(args.window) != 2 or min(args.window) <= 0:
+        parser.error('--window must look like 800x600')
+    return args
+
+def main(argv=None):
+    global DISPLAYSURF, FPSClock, FONT, OVERLAYFONT, PROFILER, SCORES, GRIDWIDTH, GRIDHEIGHT
+    args = parseArgs(argv)
+    GRIDWIDTH, GRIDHEIGHT = args.width, args.height
+    if args.profile or args.profile_out:
+        PROFILER = FrameProfiler(keepTrace=args.profile_out is not None)
+        if args.profile_out:
+            atexit.register(PROFILER.export, args.profile_out)
+    # Modules of the other modes (soak, scores, versus, spectating, autoplayer) are imported by the branches
+    # that use them, so a plain game doesn't load them (or asyncio) before its first frame
+    if args.soak is not None:
+        from soak import SoakProfiler
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        PROFILER = SoakProfiler(args.soak)
+
+    # Only display and fonts before the first frame; system fonts, sounds and music come in on background threads
+    ASSETS.initDisplay()
+    ASSETS.loadSysFontsAsync()
+    DISPLAYSURF = pygame.display.set_mode(args.window, RESIZABLE)
+    fitLayout(GRIDWIDTH, GRIDHEIGHT)
+    FONT = ASSETS.getSysFont(FONTNAME, scaledFontSize(FONTSIZE))
+    OVERLAYFONT = ASSETS.getSysFont('couriernew', scaledFontSize(OVERLAYFONTSIZE))
     pygame.display.set_caption("Tetris")
     FPSClock = pygame.time.Clock()
 
-    # Load and play main theme 
-    pygame.mixer.music.load('my_projects/tetris/tetris_theme.mp3')
-    pygame.mixer.music.set_volume(0.7)
-    pygame.mixer.music.play(-1)
+    # Decode the sound effects and stream the main theme
+    if not args.no_audio:
+        AUDIO.startAsync(MUSICFILE, MUSICVOLUME)
 
-    while True:
-        runGame()
+    if args.soak is not None:
+        sys.exit(runSoak(args.soak, args.soak_baseline))
+
+    # Opened on a background thread; queued games are committed on exit
+    from scores import ScoreStore, SCORESPATH
+    SCORES = ScoreStore(args.scores or SCORESPATH)
+    atexit.register(SCORES.close)
+
+    if args.replay:
+        runGame(replay=loadReplay(args.replay))
         create_gameover_screen()
+        return
+
+    if args.connect or args.watch:
+        host, port = parseAddress(args.connect or args.watch, PORT if args.connect else BROADCASTPORT)
+        while True:
+            runVersusGame(host, port)
+            create_gameover_screen()
+
+    broadcast = None
+    if args.broadcast:
+        host, port = parseAddress(args.broadcast if ':' in args.broadcast else f'127.0.0.1:{args.broadcast}', BROADCASTPORT)
+        from broadcast import ThreadedBroadcaster, GameBroadcast
+        broadcast = GameBroadcast(ThreadedBroadcaster(host, port))
+
+    if args.record:
+        os.makedirs(args.record, exist_ok=True)
+    if args.autoplay:
+        from policies import makeAIPolicy
+    while True:
+        record = runGame(recordDir=args.record, policy=makeAIPolicy(None) if args.autoplay else None, broadcast=broadcast)
+        create_gameover_screen(record)
+
+# Fit the board, side panel and text to a window of the given size. Only pixel sizes change here:
+# the game logic works in grid cells and never sees them.
+def setLayout(windowWidth, windowHeight, gridWidth, gridHeight):
+    global DISPLAYWINDOWWIDTH, DISPLAYWINDOWHEIGHT, GAMEWINDOWWIDTH, GAMEWINDOWHEIGHT, BLOCKSIZE, BLOCKGAPSIZE, \
+        PREVIEWBLOCKSIZE, GRIDMARGINX, GRIDMARGINY, SIDEPANELMARGINX, UISCALE, SIDEPANELSURF, SIDEPANELRECT
+    DISPLAYWINDOWWIDTH, DISPLAYWINDOWHEIGHT = windowWidth, windowHeight
+    playfieldWidth = windowWidth * PLAYFIELDWIDTHSHARE
+    playfieldHeight = windowHeight * PLAYFIELDHEIGHTSHARE
+    BLOCKSIZE = max(2, int(min(playfieldWidth / gridWidth, playfieldHeight / gridHeight)))
+    BLOCKGAPSIZE = max(1, round(BLOCKSIZE * BLOCKGAPSHARE))
+    GAMEWINDOWWIDTH = gridWidth * BLOCKSIZE
+    GAMEWINDOWHEIGHT = gridHeight * BLOCKSIZE
+
+    # Boards narrower than the playfield are centered in it
+    GRIDMARGINX = int(windowWidth * 0.15 + (playfieldWidth - GAMEWINDOWWIDTH) / 2)
+    GRIDMARGINY = int(windowHeight * 0.1)
+    SIDEPANELMARGINX = 0.05*playfieldWidth
+    UISCALE = min(windowWidth / BASEWINDOWWIDTH, windowHeight / BASEWINDOWHEIGHT)
+
+    SIDEPANELSURF = pygame.Surface((playfieldWidth*0.7, playfieldHeight))
+    SIDEPANELRECT = SIDEPANELSURF.get_rect(topleft=(0.62*windowWidth, GRIDMARGINY))
+
+    # The next shape has to fit in the preview window (3/4 of the panel's width, 1/4 of its height)
+    w, h = SIDEPANELSURF.get_size()
+    PREVIEWBLOCKSIZE = max(2, min(BLOCKSIZE, int(0.8*0.75*w / 4), int(0.8*0.25*h / 4)))
+
+# Lay out the window as it is now for a board of the given size; called at the start of a game and after a resize
+def fitLayout(gridWidth, gridHeight):
+    global DISPLAYSURF
+    DISPLAYSURF = pygame.display.get_surface()
+    setLayout(*DISPLAYSURF.get_size(), gridWidth, gridHeight)
+
+def scaledFontSize(size):
+    return max(8, round(size * UISCALE))
+
+# Fresh window after a resize, with the static parts of a game drawn
+def redrawWindow():
+    DISPLAYSURF.fill(BGCOLOR)
+    drawGridAndOutline()
+    pygame.display.update()
+
+# 'host:port' or 'host' -> (host, port)
+def parseAddress(text, defaultPort):
+    host, _, port = text.partition(':')
+    return host, int(port or defaultPort)
+
+# Play one game from keyboard input (or from policy(state), see policies.py), recording it into recordDir
+# if given and showing it live to spectators through broadcast, or show a recorded one.
+# Returns the GameRecord of a finished game played from the keyboard (the only ones on the leaderboard).
+def runGame(recordDir=None, replay=None, policy=None, broadcast=None):
+    # All game rules live in GameState; this loop only feeds it with keys and draws the result
+    # Every game gets an explicit seed so it can be recorded and replayed
+    from scores import GameStats
+    replayInputs = None
+    if replay is not None:
+        state = createGameState(replay)
+        replayInputs = iterInputs(replay)
+    else:
+        state = GameState(random.getrandbits(32), GRIDWIDTH, GRIDHEIGHT, randomizer=RANDOMIZER, lookahead=PREVIEWCOUNT)
+
+    recorder = None
+    if recordDir is not None:
+        recorder = ReplayRecorder(os.path.join(recordDir, f"{time.strftime('%Y%m%d-%H%M%S')}-{state.seed}.rpl"), state)
+    isReplayOver = False
+    stats = GameStats()
+    if broadcast is not None:
+        broadcast.setStates([state])
 
-def runGame():
-    ### Data structures
-    # List of all possible shapes
-    listOfShapeTemplates = [J_SHAPE_TEMPLATE, O_SHAPE_TEMPLATE, Z_SHAPE_TEMPLATE, S_SHAPE_TEMPLATE, L_SHAPE_TEMPLATE, T_SHAPE_TEMPLATE, I_SHAPE_TEMPLATE]
-    
-    # List of all rects that hit the ground 
-    rectsOnTheGround = []
+    # Replays and versus matches bring their own board size; the window may have been resized since the last game
+    board = state.board
+    fitLayout(board.width, board.height)
+    refreshFonts()
 
-    # List of currently controlled shape's rects
-    currentShapeRects = []
+    # Draws settled blocks and the falling shape, reporting only the parts of the window that changed
+    renderer = makeBoardRenderer(board)
 
-    # Rect for top left element in list representing shape; Used for proper arrangement of shape after rotation
-    currentShapePositioningRect = []
-    
-    # Make blocks fall with appropriate speed
-    fallingTimer = 0
+    # Side panel is redrawn only when its content (score, level, preview) changes
+    sidePanelKey = None
 
-    # Counter for setting different figures forms
-    rotationCounter = 0
+    # Runs game logic at a fixed rate of real time, independent of FPS
+    timestep = FixedTimestep(TICKRATE)
+    previousPose = state.piece.pose()
 
-    # Limit key reaction rate
-    moveTicker = 0
+    # Key events wait here until the logic tick they belong to
+    keyboard = KeyboardInput()
 
-    score = 0
-    level = 1
+    # Line clear, lock and game over effects, drawn over the board while the game goes on
+    effects = EffectPool()
+    endTime = None
 
-    # How fast the figure falls; value is modified by the player (K_DOWN) or when player lvl ups
-    fallingSpeed = 24
+    # Hot paths inside the logic phase, timed on their own (no-op unless profiling)
+    PROFILER.instrument(state.board, 'masksCollide', 'collision')
+    PROFILER.instrument(state.board, 'masksTouchGround', 'collision')
+    PROFILER.instrument(state.board, 'clearFullRows', 'lineclear')
 
     # Boolean variables
-    direction = None
-    generateShapePreview = True
-    decreaseFallingSpeed = False
     isMusicPaused = False
     isGamePaused = False
+    isResized = False
 
-    # Generate first shape 
-    randomShape = random.choice(listOfShapeTemplates)
-    randomShapeColor = randomShape[-1]
-    randomShape = randomShape[:-1]
-    initialPositioningRect = pygame.Rect(3*BLOCKSIZE,0,BLOCKSIZE,BLOCKSIZE)
-    currentShapeRects, rotationCounter, currentShapePositioningRect = \
-        createShapeRects(randomShape, rotationCounter, currentShapeRects, initialPositioningRect.x, initialPositioningRect.y)
+    # Static parts of the window are drawn once per game (and after a resize)
+    redrawWindow()
 
-    while True:
-        DISPLAYSURF.fill(BGCOLOR)
-        MAINBOARDSURF.fill(BGCOLOR)
-        SIDEPANELSURF.fill(BGCOLOR)
-        
-        # Generate new shape to show it in preview window
-        if generateShapePreview:
-            randomShapePreview = random.choice(listOfShapeTemplates)
-            generateShapePreview = False
-
-        # Generate next figure after the previous one fell on the ground
-        if moveShapeInYDir(currentShapeRects, rectsOnTheGround, fallingTimer, fallingSpeed, currentShapePositioningRect):
-            if len(currentShapeRects) != 0:
-                rectsOnTheGround.append({'rects':currentShapeRects, 'color':randomShapeColor})
-
-            # Set current shape to that from preview
-            randomShape = randomShapePreview
-
-            # Extract color 
-            randomShapeColor = randomShape[-1]
-
-            # Extract shape orientations 
-            randomShape = randomShape[:-1]
-            
-            # Set positioning rect (all other rects will be drawn relative to it)
-            initialPositioningRect = pygame.Rect(3*BLOCKSIZE,-2*BLOCKSIZE,BLOCKSIZE,BLOCKSIZE)
-            
-            # Set the counter to 0, so the figure appears with orientation shown on preview screen
-            rotationCounter = 0
-            
-            # Make figure rects
-            currentShapeRects, rotationCounter, currentShapePositioningRect = \
-                createShapeRects(randomShape, rotationCounter, currentShapeRects, initialPositioningRect.x, initialPositioningRect.y)
-
-            generateShapePreview = True
+    try:
+        while True:
+            PROFILER.startFrame()
 
 #---------------------------------------------KEYS-----------------------------------------------------------------------------------------
-        keys = pygame.key.get_pressed()
-        
-        if keys[K_LEFT] and checkCollisionsWithEdges(currentShapeRects) in (None, RIGHT):
-            if moveTicker == 0:
-                moveTicker = 5
-                direction = LEFT
-        
-        if keys[K_RIGHT] and checkCollisionsWithEdges(currentShapeRects) in (None, LEFT):
-            if moveTicker == 0:
-                moveTicker = 5
-                direction = RIGHT
-        
-        # Speed up the figure
-        if keys[K_DOWN] and not decreaseFallingSpeed:
-            previousFallingSpeed = fallingSpeed
-            decreaseFallingSpeed = True
-            fallingSpeed = 4
-        elif not keys[K_DOWN] and decreaseFallingSpeed:
-            fallingSpeed = previousFallingSpeed
-            decreaseFallingSpeed = False
-        
+            for event in pygame.event.get():
+                if event.type == QUIT:
+                    pygame.quit()
+                    sys.exit()
+                if event.type == VIDEORESIZE:
+                    isResized = True
+                if event.type in (KEYDOWN, KEYUP) and event.key in KEYACTIONS:
+                    keyboard.handleKey(KEYACTIONS[event.key], event.type == KEYDOWN)
+                if event.type == KEYDOWN:
+                    if event.key == K_m:
+                        isMusicPaused = pauseMusic(event, isMusicPaused)
+
+                    if event.key == K_p:
+                        isGamePaused = True 
+                        isMusicPaused = gamePaused(isGamePaused, isMusicPaused)
+                        timestep.reset()
+                        keyboard.reset()
+                        # The window may have been resized while paused
+                        isResized = True
+#---------------------------------------------------------------------------------------------------------------------------------------------------
+            # Sprites for the new block size are drawn once here, frames only blit them
+            if isResized:
+                isResized = False
+                if pygame.display.get_surface().get_size() != (DISPLAYWINDOWWIDTH, DISPLAYWINDOWHEIGHT):
+                    fitLayout(board.width, board.height)
+                    refreshFonts()
+                    renderer = makeBoardRenderer(board)
+                    sidePanelKey = None
+                    redrawWindow()
+            PROFILER.mark('input')
+
+            # Once the game is over the board fades out, with the window still responsive
+            ticks = 0 if state.isGameOver or isReplayOver else timestep.advance()
+            for index in range(ticks):
+                tickTime = timestep.tickTime(index, ticks)
+                inputs = keyboard.takeInputs(tickTime)
+                # Keys are ignored while watching a replay or the autoplayer, except for pause, music and quit
+                if replayInputs is not None:
+                    inputs = next(replayInputs, None)
+                    if inputs is None:
+                        isReplayOver = True
+                        break
+                elif policy is not None:
+                    inputs = policy(state)
+                if recorder is not None:
+                    recorder.record(inputs)
+                previousPose = state.piece.pose()
+                state.step(inputs)
+                stats.update(state.events)
+                effects.startFromEvents(state, tickTime)
+                AUDIO.playEvents(state.events, tickTime)
+                if broadcast is not None:
+                    broadcast.publish()
+                if state.isGameOver:
+                    break
+            PROFILER.mark('logic')
+
+            now = time.perf_counter()
+            if endTime is None and (state.isGameOver or isReplayOver):
+                if not effects.isPlaying(EFFECT_FADE):
+                    effects.start(EFFECT_FADE, now, FADETIME, hold=True)
+                endTime = now + FADETIME
+
+            # Draw falling shape and figures on the ground
+            effects.update(now)
+            dirtyRects = renderer.render(state, timestep.alpha, previousPose, effects, now)
+            PROFILER.mark('render')
+
+            if refreshFonts():
+                sidePanelKey = None
+            if sidePanelKey != (state.score, state.level, state.pieceSource.dealt):
+                sidePanelKey = (state.score, state.level, state.pieceSource.dealt)
+                SIDEPANELSURF.fill(BGCOLOR)
+                createSidePanel(state.score, state.level, state.pieceSource.upcoming())
+                DISPLAYSURF.blit(SIDEPANELSURF, SIDEPANELRECT)
+                dirtyRects.append(SIDEPANELRECT)
+            PROFILER.mark('panel')
+
+            if PROFILER.enabled and PROFILER.frames % OVERLAYREFRESH == 0:
+                dirtyRects.append(drawProfilerOverlay())
+                PROFILER.mark('overlay')
+
+            pygame.display.update(dirtyRects)
+            PROFILER.mark('update')
+
+            if endTime is not None and now >= endTime:
+                if not state.isGameOver or replayInputs is not None or policy is not None:
+                    return None
+                record = stats.record(state)
+                SCORES.submit(record)
+                return record
+
+            FPSClock.tick(FPS)   
+            PROFILER.mark('idle')
+    finally:
+        if recorder is not None:
+            recorder.close(state.score)
+
+# Watch autoplayer games until pieces pieces locked, with PROFILER (a SoakProfiler) tracking memory and garbage
+# collection; prints the report and compares it to the baseline. Returns the exit status.
+def runSoak(pieces, baselinePath=None):
+    from soak import planGames, findRegressions, loadBaseline, saveBaseline, printReport
+    segments = planGames(PROFILER.checkpointPieces, GRIDWIDTH, GRIDHEIGHT, RANDOMIZER, PREVIEWCOUNT)
+    PROFILER.start()
+    for replays, locked in segments:
+        for replay in replays:
+            runGame(replay=replay)
+        PROFILER.pieces = locked
+        PROFILER.checkpoint()
+    PROFILER.stop()
+
+    summary = PROFILER.memorySummary()
+    baseline = None
+    if baselinePath is not None and os.path.exists(baselinePath):
+        baseline = loadBaseline(baselinePath)
+    printReport(PROFILER, summary, baseline)
+    if baselinePath is None:
+        return 0
+    if baseline is None:
+        saveBaseline(baselinePath, summary)
+        print(f'Baseline written to {baselinePath}')
+        return 0
+    regressions = findRegressions(summary, baseline)
+    for metric, expected, value in regressions:
+        print(f'REGRESSION {metric}: {value:,.1f} (baseline {expected:,.1f})')
+    if not regressions:
+        print(f'No regressions against {baselinePath}')
+    return 1 if regressions else 0
+
+# Play one versus match on a server: keys go to the server, both boards are drawn from what it sends back.
+# Also shows broadcast games to spectators, who only watch.
+def runVersusGame(host, port):
+    from client import ThreadedVersusClient
+    client = ThreadedVersusClient()
+    started = client.start(host, port)
+    waitForOpponent(started)
+    own, opponent = client.ownState, client.opponentState
+
+    # Both boards have the size the server chose
+    board = own.board
+    fitLayout(board.width, board.height)
+    refreshFonts()
+    renderer = makeBoardRenderer(board)
+    opponentRect, opponentRenderer = makeOpponentRenderer(opponent.board)
+    sidePanelKey = None
+    isResized = False
+
+    # Ticks are counted locally and only stamp the inputs; the server decides what they do
+    timestep = FixedTimestep(client.tickRate)
+    tick = 0
+    keyboard = KeyboardInput()
+    isMusicPaused = False
+
+    # Both boards fade out when the match is over
+    effects = EffectPool()
+    endTime = None
+
+    redrawWindow()
+
+    try:
+        while True:
+            # A match can't be paused, only the music
+            for event in pygame.event.get():
+                if event.type == QUIT:
+                    pygame.quit()
+                    sys.exit()
+                if event.type == VIDEORESIZE:
+                    isResized = True
+                if event.type in (KEYDOWN, KEYUP) and event.key in KEYACTIONS:
+                    keyboard.handleKey(KEYACTIONS[event.key], event.type == KEYDOWN)
+                if event.type == KEYDOWN:
+                    if event.key == K_m:
+                        isMusicPaused = pauseMusic(event, isMusicPaused)
+
+            if isResized:
+                isResized = False
+                if pygame.display.get_surface().get_size() != (DISPLAYWINDOWWIDTH, DISPLAYWINDOWHEIGHT):
+                    fitLayout(board.width, board.height)
+                    refreshFonts()
+                    renderer = makeBoardRenderer(board)
+                    opponentRect, opponentRenderer = makeOpponentRenderer(opponent.board)
+                    sidePanelKey = None
+                    redrawWindow()
+
+            ticks = 0 if client.isOver else timestep.advance()
+            for index in range(ticks):
+                client.sendInputs(tick, keyboard.takeInputs(timestep.tickTime(index, ticks)))
+                tick += 1
+
+            client.poll()
+            now = time.perf_counter()
+            effects.update(now)
+            dirtyRects = renderer.render(own, effects=effects, now=now) if own.isReady else []
+
+            if refreshFonts():
+                sidePanelKey = None
+            if sidePanelKey != (own.score, own.level, own.nextTable):
+                sidePanelKey = (own.score, own.level, own.nextTable)
+                SIDEPANELSURF.fill(BGCOLOR)
+                if own.isReady:
+                    createSidePanel(own.score, own.level, own.upcoming())
+                DISPLAYSURF.blit(SIDEPANELSURF, SIDEPANELRECT)
+                opponentRenderer.invalidate()
+                if not client.isSpectator:
+                    pygame.draw.rect(DISPLAYSURF, OUTLINECOLOR, opponentRect.inflate(4, 4), 1)
+                dirtyRects.append(SIDEPANELRECT)
+            if opponent.isReady:
+                dirtyRects += opponentRenderer.render(opponent, effects=effects, now=now)
+
+            if client.isOver and endTime is None:
+                effects.start(EFFECT_FADE, now, FADETIME, hold=True)
+                endTime = now + FADETIME
+                dirtyRects.append(drawMatchResult(client.winner, client.player))
+
+            pygame.display.update(dirtyRects)
+            if endTime is not None and now >= endTime:
+                return
+            FPSClock.tick(FPS)
+    finally:
+        client.close()
+
+def makeBoardRenderer(board):
+    return BoardRenderer(DISPLAYSURF, (GRIDMARGINX, GRIDMARGINY), board.width, board.height, BLOCKSIZE, BLOCKGAPSIZE, BGCOLOR)
+
+# Opponent's board in the lower part of the side panel; returns its rect and renderer
+def makeOpponentRenderer(board):
+    w, h = SIDEPANELSURF.get_size()
+    blockSize = max(2, int(min(w*OPPONENTWIDTHSHARE / board.width, h*OPPONENTHEIGHTSHARE / board.height)))
+    opponentRect = pygame.Rect(SIDEPANELRECT.left + w*0.25, SIDEPANELRECT.top + h*0.65,
+                               board.width*blockSize, board.height*blockSize)
+    opponentRenderer = BoardRenderer(DISPLAYSURF, opponentRect.topleft, board.width, board.height, blockSize, 1, BGCOLOR,
+                                     showGhost=False)
+    return opponentRect, opponentRenderer
+
+# Keep the window responsive until the server found an opponent (or the broadcast sent its first game)
+def waitForOpponent(started):
+    DISPLAYSURF.fill(BGCOLOR)
+    waitingSurf = renderText(FONT, 'Waiting for a game to start...', TEXTCOLOR)
+    DISPLAYSURF.blit(waitingSurf, waitingSurf.get_rect(center=(DISPLAYWINDOWWIDTH / 2, DISPLAYWINDOWHEIGHT / 2)))
+    pygame.display.update()
+    while not started.done():
         for event in pygame.event.get():
             if event.type == QUIT:
                 pygame.quit()
                 sys.exit()
-            if event.type == KEYDOWN:
-                if event.key == K_UP:
-                    # Change the counter in order to create rects for new shape orientation
-                    rotationCounter += 1
-                    
-                    # Create shape in new orientation
-                    currentShapeRects, rotationCounter, currentShapePositioningRect = \
-                        createShapeRects(randomShape, rotationCounter, currentShapeRects, currentShapePositioningRect.x, currentShapePositioningRect.y)
-
-                    # Prevent rotation if figure would collide with other figures or with edges of game window during rotation
-                    if checkCollisionsBetweenBlocks(currentShapeRects, rectsOnTheGround) or checkCollisionWithBordersDuringRotation(currentShapeRects):
-                        rotationCounter -= 1
-                        currentShapeRects, rotationCounter, currentShapePositioningRect = \
-                            createShapeRects(randomShape, rotationCounter, currentShapeRects, currentShapePositioningRect.x, currentShapePositioningRect.y)
-
-                if event.key == K_m:
-                    isMusicPaused = pauseMusic(event, isMusicPaused)
-
-                if event.key == K_p:
-                    isGamePaused = True 
-                    isMusicPaused = gamePaused(isGamePaused, isMusicPaused)
-#---------------------------------------------------------------------------------------------------------------------------------------------------
-
-        # Allow for horizontal movement only when figure doesn't collide with edges or other figures
-        if not checkCollisionsBetweenBlocks(currentShapeRects, rectsOnTheGround):
-            moveShapeInXDir(currentShapeRects, direction, currentShapePositioningRect)
-        
-        score, level, fallingSpeed = removeRow(rectsOnTheGround, score, level, fallingSpeed)
-
-        direction = None
-        fallingTimer += 1
-
-        # Control falling speed
-        if fallingTimer > fallingSpeed:
-            fallingTimer = 0
-
-        if moveTicker > 0:
-            moveTicker -= 1
-
-        # Draw falling shape and figures on the ground
-        drawShape(currentShapeRects, randomShapeColor)
-        drawFiguresOnTheGround(rectsOnTheGround)
-
-        drawGridAndOutline()
-        createSidePanel(score, level, randomShapePreview)
-
-        if checkGameOverConditions(currentShapeRects, rectsOnTheGround):
-            pygame.time.wait(500)
-            return        
-
-        DISPLAYSURF.blit(MAINBOARDSURF, (GRIDMARGINX, GRIDMARGINY))
-        DISPLAYSURF.blit(SIDEPANELSURF, (0.62*DISPLAYWINDOWWIDTH, GRIDMARGINY))
-        pygame.display.update()
-        FPSClock.tick(FPS)   
+        FPSClock.tick(10)
+    try:
+        started.result()
+    except ConnectionError as error:
+        print(f'Could not join a match: {error}', file=sys.stderr)
+        pygame.quit()
+        sys.exit(1)
+
+# winner - index of the winning player, versus.DRAW, or None if the connection was lost; returns the rect drawn over
+def drawMatchResult(winner, player):
+    from versus import DRAW
+    if winner is None:
+        text = 'Connection lost'
+    elif winner == DRAW:
+        text = 'Draw'
+    else:
+        text = 'You win!' if winner == player else 'You lose'
+    resultSurf = renderText(FONT, text, TEXTCOLOR, BGCOLOR)
+    return DISPLAYSURF.blit(resultSurf, resultSurf.get_rect(midbottom=(GRIDMARGINX + GAMEWINDOWWIDTH / 2, GRIDMARGINY - 8)))
+
+# Rolling p50/p95/p99 of every phase in the margin above the board; returns the rect drawn over
+def drawProfilerOverlay():
+    overlayRect = pygame.Rect(0, 0, DISPLAYWINDOWWIDTH, GRIDMARGINY - 4)
+    DISPLAYSURF.fill(BGCOLOR, overlayRect)
+    lineHeight = OVERLAYFONT.get_linesize()
+    linesPerColumn = max(1, overlayRect.height // lineHeight)
+    columnWidth = DISPLAYWINDOWWIDTH // 3
+
+    # Text is rendered directly, the numbers hardly ever repeat so caching them would only evict other surfaces
+    lines = [(f'ms p50/p95/p99, {PROFILER.frames} frames', TEXTCOLOR)]
+    for phase in PROFILER.phases:
+        p50, p95, p99 = PROFILER.percentiles(phase)
+        lines.append((f'{phase:<9} {p50/1e6:5.2f} {p95/1e6:5.2f} {p99/1e6:5.2f}', TEXTCOLOR if phase == FRAME else GRAY))
+    # From the tick of a game event to the play() call of its sound
+    if AUDIO.latencies:
+        p50, p95, p99 = AUDIO.latencyPercentiles()
+        lines.append((f'{"sound":<9} {p50/1e6:5.2f} {p95/1e6:5.2f} {p99/1e6:5.2f}', GRAY))
+    for index, (text, color) in enumerate(lines[:3*linesPerColumn]):
+        column, line = divmod(index, linesPerColumn)
+        DISPLAYSURF.blit(OVERLAYFONT.render(text, True, color, BGCOLOR), (4 + column*columnWidth, 2 + line*lineHeight))
+    return overlayRect
+
+# Switch to the system fonts once ASSETS finished scanning them; returns True when the fonts changed
+def refreshFonts():
+    global FONT, OVERLAYFONT
+    font = ASSETS.getSysFont(FONTNAME, scaledFontSize(FONTSIZE))
+    if font is FONT:
+        return False
+    FONT = font
+    OVERLAYFONT = ASSETS.getSysFont('couriernew', scaledFontSize(OVERLAYFONTSIZE))
+    return True
 
 def gamePaused(isGamePaused, isMusicPaused):
     while isGamePaused:
-        for event in pygame.event.get():
+        # Sleep until something happens instead of spinning on an empty event queue
+        for event in [pygame.event.wait()] + pygame.event.get():
             if event.type == QUIT:
                 pygame.quit()
                 sys.exit()
@@ -239,292 +607,112 @@ def gamePaused(isGamePaused, isMusicPaused):
 def pauseMusic(event, isMusicPaused):
     if event.key == K_m:
         if not isMusicPaused: 
-            pygame.mixer.music.pause()
+            AUDIO.pauseMusic()
             isMusicPaused = True
         elif isMusicPaused: 
-            pygame.mixer.music.unpause()
+            AUDIO.unpauseMusic()
             isMusicPaused = False
     return isMusicPaused
 
-# Read the shape stored in a list and create rects where the figure should be
-def createShapeRects(shape, rotationCounter, currentRectsCoords, positionX, positionY):
-    currentRectsCoords = []
-    
-    if rotationCounter < len(shape):
-        currentShape = shape[rotationCounter]
-    else:
-        currentShape = shape[0]
-        rotationCounter = 0
-    
-    currentShapePositioningRect = None
-
-    # Create rects for whole figure (every figure is 4x4 matrix, create rects only where '1' appears)
-    currentRectsCoords = []
-    for rowIndex, row in enumerate(currentShape):
-        for blockIndex, block in enumerate(row):
-            if rowIndex == 1 and blockIndex == 1:
-                currentShapePositioningRect = pygame.Rect(positionX, positionY, BLOCKSIZE, BLOCKSIZE)
-            if block == '1':
-                left = positionX + blockIndex*BLOCKSIZE
-                top =  positionY + rowIndex*BLOCKSIZE
-                currentRectsCoords.append(pygame.Rect(left, top, BLOCKSIZE, BLOCKSIZE))
-    return currentRectsCoords, rotationCounter, currentShapePositioningRect
-
-def removeRow(rectsOnTheGround, score, level, fallingSpeed):
-    rectsYValues = []
-    rectsToRemove = []
-    rectsToMoveDown = []
-    rowRemoved = False
-    howManyRowsToDelete = 0
-
-    # Extract all rects' y values 
-    for figure in rectsOnTheGround:
-        for groundRect in figure['rects']:
-            rectsYValues.append(groundRect.y)
-    
-    # Count how many times each y value occurs
-    numberOfRectsOnY = Counter(rectsYValues)
-
-    # If row is full - fill two lists:
-    # rectsToRemove - rects in the row that should be removed
-    # rectsToMoveDown - all rects above specific row, that should be moved down after the row disappears
-    for yValue, occurencies in numberOfRectsOnY.items():
-        if occurencies == 10:
-            rowRemoved = True
-            howManyRowsToDelete += 1
-            for figure in rectsOnTheGround:
-                for groundRect in figure['rects']:
-                        if groundRect.y == yValue:
-                            rectsToRemove.append(groundRect)
-                        if groundRect.y < yValue:
-                            rectsToMoveDown.append(groundRect)
-
-    # Remove row
-    for rectToRemove in rectsToRemove:   
-        for figure in rectsOnTheGround:
-            for groundRect in figure['rects']:    
-                if groundRect == rectToRemove:
-                    figure['rects'].pop(figure['rects'].index(groundRect))
-
-    # Move all rects above removed row down
-    for figure in rectsOnTheGround:    
-        for groundRect in figure['rects']:    
-                if groundRect in rectsToMoveDown:
-                        groundRect.y += howManyRowsToDelete*BLOCKSIZE
-    
-    if rowRemoved:
-        # Increase score 
-        score += 10*howManyRowsToDelete
-
-    if checkIflevelUp(score, level, fallingSpeed):
-        level += 1
-        fallingSpeed -= 2
-
-    return score, level, fallingSpeed
-
-# Check if no more figures fit into game screen
-def checkGameOverConditions(currentShape, rectsOnTheGround):
-    currentShapeRectsYBelowZero = [rect.y for rect in currentShape if rect.y < 0]
-    if checkCollisionsWithBottom(currentShape, rectsOnTheGround) and len(currentShapeRectsYBelowZero) != 0:
-        return True
-    return False
-
-# Check if figures collide with each other
-def checkCollisionsBetweenBlocks(currentRects, rectsOnTheGround):
-    for rect in currentRects:
-        for figure in rectsOnTheGround:
-            for groundRect in figure['rects']:
-                    if (rect.right == groundRect.left or rect.left == groundRect.right) and (rect.y == groundRect.y):
-                        return True
-    return False
-
-# Check if shape touches bottom edge of game screen or with top side of other figures
-def checkCollisionsWithBottom(currentRects, rectsOnTheGround):
-    for block in currentRects:
-        if block.y + BLOCKSIZE >= GAMEWINDOWHEIGHT:
-            return True
-
-    for rect in currentRects:
-        for figure in rectsOnTheGround:    
-            for groundRect in figure['rects']:
-                    if rect.bottom == groundRect.top and rect.x == groundRect.x:
-                        return True
-    return False
-
-# Check if shape touches left or right side edge of game screen
-def checkCollisionsWithEdges(currentShapeRects):
-    collisionSide = None
-    for block in currentShapeRects:
-        if block.x <= 0:
-            collisionSide = LEFT
-        elif block.x + BLOCKSIZE >= GAMEWINDOWWIDTH:
-            collisionSide = RIGHT
-    return collisionSide
-
-# Check if figure crashes into edges of the screen during rotation
-def checkCollisionWithBordersDuringRotation(currentShapeRects):
-    for block in currentShapeRects:
-        if block.x < 0:
-            return True
-        elif block.x + BLOCKSIZE > GAMEWINDOWWIDTH:
-            return True
-    return False
-
-def checkIflevelUp(score, level, fallingSpeed):
-    if score >= 100*level and level <= 10:
-        return True
-    
-    return False
-
-# Handle horizontal movement of blocks
-def moveShapeInXDir(currentShapeRects, direction, currentShapePositioningRect):
-    for block in currentShapeRects:
-        blockGridX = getGridXCoordinate(block.x)
-        if direction == RIGHT:
-            blockGridX += 1
-        if direction == LEFT:
-            blockGridX -= 1
-
-        newBlockX = getLeftOfBlock(blockGridX)
-        block.x = newBlockX
-
-    positioningBlockGridX = getGridXCoordinate(currentShapePositioningRect.x)
-    if direction == RIGHT:
-        positioningBlockGridX += 1
-    if direction == LEFT:
-        positioningBlockGridX -= 1
-
-    newPositioningBlockGridX = getLeftOfBlock(positioningBlockGridX)
-    currentShapePositioningRect.x = newPositioningBlockGridX
-
-# Handle vertical movement (falling) of blocks
-def moveShapeInYDir(currentShapeRects, rectsOnTheGround, fallingTimer, fallingSpeed, currentShapePositioningRect):
-    if fallingTimer == fallingSpeed and not checkCollisionsWithBottom(currentShapeRects, rectsOnTheGround):
-
-        positioningBlockGridY = getGridYCoordinate(currentShapePositioningRect.y)
-        positioningBlockGridY += 1
-        newpositioningBlockY = getTopOfBlock(positioningBlockGridY)
-        currentShapePositioningRect.y = newpositioningBlockY
-
-        for block in currentShapeRects:
-            blockGridY = getGridYCoordinate(block.y)
-            
-            blockGridY += 1
-            
-            newBlockY = getTopOfBlock(blockGridY)
-            
-            block.y = newBlockY
-
-    elif checkCollisionsWithBottom(currentShapeRects, rectsOnTheGround): 
-        return True
-
-    return False
-
 def drawGridAndOutline():
     # Outline
     pygame.draw.rect(DISPLAYSURF, OUTLINECOLOR, (GRIDMARGINX-3, GRIDMARGINY-3, GAMEWINDOWWIDTH+5, GAMEWINDOWHEIGHT+5), 2)
-    
-    # drawGrid()
-
-def drawGrid():
-     # Vertical lines
-    for x in range(GRIDWIDTH):
-        pygame.draw.line(MAINBOARDSURF, GRIDCOLOR, (x*BLOCKSIZE, 0), (x*BLOCKSIZE, GAMEWINDOWHEIGHT))
 
-    # Horizontal lines
-    for y in range(GRIDHEIGHT):
-        pygame.draw.line(MAINBOARDSURF, GRIDCOLOR, (0, y*BLOCKSIZE), (GAMEWINDOWWIDTH, y*BLOCKSIZE))
-
-def drawFiguresOnTheGround(rectsOnTheGround):
-    for figure in rectsOnTheGround:
-        for rect in figure['rects']:
-                pygame.draw.rect(MAINBOARDSURF, figure['color'], (rect.x+BLOCKGAPSIZE , rect.y+BLOCKGAPSIZE , rect.width-BLOCKGAPSIZE, rect.height-BLOCKGAPSIZE))
-                #pygame.draw.rect(MAINBOARDSURF, (255,0,0), (rect.x+BLOCKGAPSIZE+33, rect.y+BLOCKGAPSIZE+3, rect.width-BLOCKGAPSIZE-6, rect.height-BLOCKGAPSIZE-6))
-
-def drawShape(currentShapeRects, shapeColor):
-    for block in currentShapeRects:
-        pygame.draw.rect(MAINBOARDSURF, shapeColor, (block.x+BLOCKGAPSIZE , block.y+BLOCKGAPSIZE , block.width-BLOCKGAPSIZE, block.height-BLOCKGAPSIZE))
-
-def createSidePanel(score, level, randomShape):
+# upcoming - tables of the next pieces, the first one is shown in the preview window
+def createSidePanel(score, level, upcoming):
     createScoreText(score)
     createLevelText(level)
-    createShapePreviewWindow(randomShape)
+    createShapePreviewWindow(upcoming)
 
 def createScoreText(score):
-    scoreText = FONT.render(f"Score: {score}", True, TEXTCOLOR, BGCOLOR)
+    scoreText = renderText(FONT, f"Score: {score}", TEXTCOLOR, BGCOLOR)
     h = SIDEPANELSURF.get_height()
     SIDEPANELSURF.blit(scoreText, (SIDEPANELMARGINX, h*0.05))
 
 def createLevelText(level):
-    levelText = FONT.render(f"Level: {level}", True, TEXTCOLOR, BGCOLOR)
+    levelText = renderText(FONT, f"Level: {level}", TEXTCOLOR, BGCOLOR)
     h = SIDEPANELSURF.get_height()
     SIDEPANELSURF.blit(levelText, (SIDEPANELMARGINX, h*0.15))
 
-def createShapePreviewWindow(randomShape):
-    nextText = FONT.render(f"Next:", True, TEXTCOLOR, BGCOLOR)
+def createShapePreviewWindow(upcoming):
+    nextText = renderText(FONT, "Next:", TEXTCOLOR, BGCOLOR)
     w,h = SIDEPANELSURF.get_size()
     previewSurfaceWidth = int(0.75*w)
     previewSurfaceHeight = int(0.25*h)
-    previewSurface = pygame.Surface((previewSurfaceWidth, previewSurfaceHeight))
-    for rowIndex, row in enumerate(randomShape[0]):
-        for blockIndex, block in enumerate(row):
-            if block == '1':
-                # TODO Add better figure positioning inside preview window
-                left = 0.1*previewSurfaceWidth + blockIndex*BLOCKSIZE
-                top = 0.1*previewSurfaceHeight + rowIndex*BLOCKSIZE
-                pygame.draw.rect(previewSurface, randomShape[-1], (left+BLOCKGAPSIZE, top+BLOCKGAPSIZE, BLOCKSIZE-BLOCKGAPSIZE, BLOCKSIZE-BLOCKGAPSIZE))
-    pygame.draw.rect(previewSurface, TEXTCOLOR, (0, 0, previewSurfaceWidth, previewSurfaceHeight), 2)
+    previewSurface = SURFACECACHE.get(('preview', upcoming[0].name, previewSurfaceWidth, previewSurfaceHeight, PREVIEWBLOCKSIZE),
+                                      lambda: createPreviewSurface(upcoming[0], previewSurfaceWidth, previewSurfaceHeight))
     SIDEPANELSURF.blit(previewSurface, (w*0.25, h*0.35))
     SIDEPANELSURF.blit(nextText, (w*0.4, h*0.3))
 
-def create_gameover_screen():
-    gameOverFont = pygame.font.Font('freesansbold.ttf', 150)
-    gameSurf = gameOverFont.render('Game', True, TEXTCOLOR)
-    overSurf = gameOverFont.render('Over', True, TEXTCOLOR)
+    # Further upcoming shapes in half size below the preview window, as many as fit
+    smallBlockSize = PREVIEWBLOCKSIZE // 2
+    top = h*0.65
+    for table in upcoming[1:]:
+        shape = table.rotations[0]
+        shapeHeight = (shape.maxDy - shape.minDy + 1)*smallBlockSize
+        if top + shapeHeight > h:
+            break
+        drawPreviewShape(SIDEPANELSURF, table, w*0.25 + 0.1*previewSurfaceWidth, top - shape.minDy*smallBlockSize, smallBlockSize)
+        top += shapeHeight + smallBlockSize
+
+def createPreviewSurface(table, previewSurfaceWidth, previewSurfaceHeight):
+    previewSurface = pygame.Surface((previewSurfaceWidth, previewSurfaceHeight))
+    drawPreviewShape(previewSurface, table, 0.1*previewSurfaceWidth, 0.1*previewSurfaceHeight, PREVIEWBLOCKSIZE)
+    pygame.draw.rect(previewSurface, TEXTCOLOR, (0, 0, previewSurfaceWidth, previewSurfaceHeight), 2)
+    return previewSurface
+
+def drawPreviewShape(surface, table, left, top, blockSize):
+    gapSize = max(1, BLOCKGAPSIZE * blockSize // BLOCKSIZE)
+    for blockIndex, rowIndex in table.rotations[0].cells:
+        # TODO Add better figure positioning inside preview window
+        blockLeft = left + blockIndex*blockSize
+        blockTop = top + rowIndex*blockSize
+        pygame.draw.rect(surface, table.color, (blockLeft+gapSize, blockTop+gapSize, blockSize-gapSize, blockSize-gapSize))
+
+# record - the game just played, highlighted if it made it onto the leaderboard
+def create_gameover_screen(record=None):
+    gameOverFont = ASSETS.getFont('freesansbold.ttf', scaledFontSize(150))
+    gameSurf = renderText(gameOverFont, 'Game', TEXTCOLOR)
+    overSurf = renderText(gameOverFont, 'Over', TEXTCOLOR)
     gameRect = gameSurf.get_rect()
     overRect = overSurf.get_rect()
-    gameRect.midtop = (DISPLAYWINDOWWIDTH / 2, 120)
-    overRect.midtop = (DISPLAYWINDOWHEIGHT / 2, gameRect.height + 10 + 80)
+    gameRect.midtop = (DISPLAYWINDOWWIDTH / 2, 120*UISCALE)
+    overRect.midtop = (DISPLAYWINDOWWIDTH / 2, gameRect.height + 90*UISCALE)
 
-    DISPLAYSURF.blit(MAINBOARDSURF, (GRIDMARGINX, GRIDMARGINY))
-    DISPLAYSURF.blit(SIDEPANELSURF, (0.62*DISPLAYWINDOWWIDTH, GRIDMARGINY))
+    # Last frame of the game is already on DISPLAYSURF
     DISPLAYSURF.blit(gameSurf, gameRect)
     DISPLAYSURF.blit(overSurf, overRect)
+    if SCORES is not None:
+        drawLeaderboard(overRect.bottom + 10, record)
     drawPressKeyMsg()
     pygame.display.update()
-    pygame.time.wait(500)
 
+    # A spacebar still held from a hard drop at the end of the game doesn't skip the screen
+    readyTime = time.perf_counter() + GAMEOVERKEYDELAY
     while True:
-         for event in pygame.event.get():
+         for event in [pygame.event.wait()] + pygame.event.get():
             if event.type == QUIT:
                 pygame.quit()
                 sys.exit()
             if event.type == KEYDOWN:
-                if event.key == K_SPACE:
+                if event.key == K_SPACE and time.perf_counter() >= readyTime:
                     return
 
+# Best games from the in-memory leaderboard, one line each; no database access
+def drawLeaderboard(top, record):
+    font = ASSETS.getSysFont(FONTNAME, scaledFontSize(LEADERBOARDFONTSIZE))
+    left = DISPLAYWINDOWWIDTH * 0.2
+    for rank, entry in enumerate(SCORES.topScores(LEADERBOARDSIZE), 1):
+        color = HIGHLIGHTCOLOR if entry is record else TEXTCOLOR
+        text = f"{rank}.  {entry.score}   level {entry.maxLevel}   {entry.lines} lines   {time.strftime('%Y-%m-%d', time.localtime(entry.playedAt))}"
+        DISPLAYSURF.blit(renderText(font, text, color, BGCOLOR), (left, top))
+        top += font.get_linesize()
+
 def drawPressKeyMsg():
-    pressKeySurf = FONT.render('Press spacebar to play.', True, TEXTCOLOR)
+    pressKeySurf = renderText(FONT, 'Press spacebar to play.', TEXTCOLOR)
     pressKeyRect = pressKeySurf.get_rect()
-    pressKeyRect.topleft = (DISPLAYWINDOWWIDTH * 0.5, DISPLAYWINDOWHEIGHT - 30)
+    pressKeyRect.topleft = (DISPLAYWINDOWWIDTH * 0.5, DISPLAYWINDOWHEIGHT - 30*UISCALE)
     DISPLAYSURF.blit(pressKeySurf, pressKeyRect)
 
-# Conversions bewteen grid and window coordinates
-def getLeftOfBlock(gridX):
-    left = gridX*BLOCKSIZE
-    return left
-
-def getTopOfBlock(gridY):
-    top = gridY*BLOCKSIZE 
-    return top
-
-def getGridXCoordinate(x):
-    gridX = x // BLOCKSIZE
-    return gridX
-
-def getGridYCoordinate(y):
-    gridY = y // BLOCKSIZE
-    return gridY
-
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,95 @@
+'''
+Piece/rotation tables compiled once at import time from the *_SHAPE_TEMPLATE matrices.
+
+Every rotation is stored as immutable tuples of cell offsets and row bitmasks relative to the
+top left corner of its 4x4 template (the old currentShapePositioningRect), so spawning and
+rotating a piece is just an index change.
+'''
+from collections import namedtuple
+from blocks_templates import *
+
+# cells    - ((dx, dy), ...) offsets of filled blocks from the piece origin
+# rowMasks - ((dy, mask), ...) one bitmask per occupied row, bit dx set for a filled block
+# minDx, maxDx, minDy, maxDy - bounding box of the filled blocks
+# columnBottoms - ((dx, dy), ...) lowest filled block of every occupied column, for landing with Board.dropY
+PieceRotation = namedtuple('PieceRotation', 'cells rowMasks minDx maxDx minDy maxDy columnBottoms')
+
+# name      - template name, e.g. 'T'
+# index     - position in PIECETABLES
+# rotations - tuple of PieceRotation in the order of the template
+PieceTable = namedtuple('PieceTable', 'name index color rotations')
+
+def compileRotation(matrix):
+    cells = tuple((blockIndex, rowIndex)
+                  for rowIndex, row in enumerate(matrix)
+                  for blockIndex, block in enumerate(row) if block == '1')
+    rowMasks = []
+    for rowIndex, row in enumerate(matrix):
+        mask = 0
+        for blockIndex, block in enumerate(row):
+            if block == '1':
+                mask |= 1 << blockIndex
+        if mask:
+            rowMasks.append((rowIndex, mask))
+    xs = [dx for dx, _ in cells]
+    ys = [dy for _, dy in cells]
+    columnBottoms = tuple((column, max(dy for dx, dy in cells if dx == column)) for column in sorted(set(xs)))
+    return PieceRotation(cells, tuple(rowMasks), min(xs), max(xs), min(ys), max(ys), columnBottoms)
+
+def compileTemplate(name, index, template):
+    # Every template is a list of 4x4 matrices with the color as the last element
+    rotations = tuple(compileRotation(matrix) for matrix in template[:-1])
+    return PieceTable(name, index, template[-1], rotations)
+
+PIECETABLES = tuple(compileTemplate(name, index, template) for index, (name, template) in enumerate((
+    ('J', J_SHAPE_TEMPLATE),
+    ('O', O_SHAPE_TEMPLATE),
+    ('Z', Z_SHAPE_TEMPLATE),
+    ('S', S_SHAPE_TEMPLATE),
+    ('L', L_SHAPE_TEMPLATE),
+    ('T', T_SHAPE_TEMPLATE),
+    ('I', I_SHAPE_TEMPLATE),
+)))
+
+PIECESBYNAME = {table.name: table for table in PIECETABLES}
+
+class Piece:
+    '''Currently controlled piece; one instance is reused for every spawned shape.'''
+    __slots__ = ('table', 'rotationCounter', 'shape', 'x', 'y')
+
+    def __init__(self):
+        self.table = None
+        self.rotationCounter = 0
+        self.shape = None
+        self.x = 0
+        self.y = 0
+
+    def spawn(self, table, x, y):
+        self.table = table
+        self.rotationCounter = 0
+        self.shape = table.rotations[0]
+        self.x = x
+        self.y = y
+
+    def setRotation(self, rotationCounter):
+        rotations = self.table.rotations
+        self.rotationCounter = rotationCounter % len(rotations)
+        self.shape = rotations[self.rotationCounter]
+
+    # Shape the piece would have after one rotation, without changing the piece
+    def nextShape(self):
+        rotations = self.table.rotations
+        return rotations[(self.rotationCounter + 1) % len(rotations)]
+
+    # Immutable snapshot of what the piece looks like and where it is
+    def pose(self):
+        return (self.table, self.rotationCounter, self.x, self.y)
+
+    @property
+    def color(self):
+        return self.table.color
+
+    # Absolute grid coordinates of the piece's blocks
+    def cells(self):
+        x, y = self.x, self.y
+        return [(x + dx, y + dy) for dx, dy in self.shape.cells]
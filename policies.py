@@ -0,0 +1,55 @@
+'''
+Input policies for headless games. A policy factory takes the game seed and returns
+policy(state) -> inputs bit mask for the next GameState.step; every policy draws from its own
+RNG seeded from the game seed, so a game is fully determined by (seed, policy name).
+'''
+import random
+
+from ai import Autoplayer
+from game import INPUT_LEFT, INPUT_RIGHT, INPUT_DOWN, INPUT_ROTATE, INPUT_HARDDROP
+
+def makeIdlePolicy(seed):
+    def policy(state):
+        return 0
+    return policy
+
+# Random key presses
+def makeRandomPolicy(seed):
+    rng = random.Random(seed)
+    choices = (0, 0, INPUT_LEFT, INPUT_RIGHT, INPUT_DOWN, INPUT_ROTATE)
+    def policy(state):
+        return rng.choice(choices)
+    return policy
+
+# Autoplayer: picks a placement for every new piece, rotates and moves there at the top, then hard drops
+def makeAIPolicy(seed, autoplayer=None):
+    if autoplayer is None:
+        autoplayer = Autoplayer()
+    target = None
+    targetPieces = None
+    def policy(state):
+        nonlocal target, targetPieces
+        piece = state.piece
+        if targetPieces != state.pieces:
+            targetPieces = state.pieces
+            target = autoplayer.bestPlacement(state.board, piece.table, state.nextTable)
+        if target is None:
+            return INPUT_DOWN
+
+        inputs = 0
+        if piece.rotationCounter != target.rotation:
+            inputs |= INPUT_ROTATE
+        if piece.x < target.x:
+            inputs |= INPUT_RIGHT
+        elif piece.x > target.x:
+            inputs |= INPUT_LEFT
+        elif not inputs:
+            inputs = INPUT_HARDDROP
+        return inputs
+    return policy
+
+POLICIES = {
+    'idle': makeIdlePolicy,
+    'random': makeRandomPolicy,
+    'ai': makeAIPolicy,
+}
@@ -0,0 +1,134 @@
+'''
+Per-frame profiler for the runGame loop.
+
+Each frame is split into phases timed with perf_counter_ns: the loop calls mark(phase) at the
+end of every phase, and the time since the previous mark is charged to it. Hot methods (line
+clears, collision checks) can be instrumented as well; their time is accounted separately
+and is also contained in the phase that called them. The last WINDOWSIZE frames of every
+phase are kept for rolling p50/p95/p99, and the whole run can be exported as CSV or JSON.
+
+When profiling is off, NullProfiler with empty methods is used, so the loop pays for a few
+no-op calls per frame and nothing is wrapped.
+'''
+import csv, json, time
+from collections import deque
+
+WINDOWSIZE = 600    # Frames kept for rolling percentiles (10 s at 60 FPS)
+FRAME = 'frame'     # Pseudo phase with the total time of a frame
+
+# Linear interpolation between closest ranks; values must be sorted
+def percentile(values, p):
+    if not values:
+        return 0
+    position = (len(values) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+class FrameProfiler:
+    enabled = True
+
+    def __init__(self, windowSize=WINDOWSIZE, keepTrace=True):
+        self.windowSize = windowSize
+        self.keepTrace = keepTrace
+
+        # Phase names in the order they were first seen
+        self.phases = []
+        self.samples = {}
+        self.trace = []
+        self.frames = 0
+
+        self.current = {}
+        self.frameStart = None
+        self.lastMark = None
+
+    def startFrame(self):
+        now = time.perf_counter_ns()
+        if self.frameStart is not None:
+            self._endFrame(now)
+        self.frameStart = self.lastMark = now
+
+    # Charge time since the previous mark to phase
+    def mark(self, phase):
+        now = time.perf_counter_ns()
+        self.add(phase, now - self.lastMark)
+        self.lastMark = now
+
+    def add(self, phase, ns):
+        self.current[phase] = self.current.get(phase, 0) + ns
+
+    # Replace obj.methodName with a wrapper timing every call under phase
+    def instrument(self, obj, methodName, phase):
+        method = getattr(obj, methodName)
+        perfCounter = time.perf_counter_ns
+        current = self.current
+
+        def timed(*args, **kwargs):
+            start = perfCounter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                current[phase] = current.get(phase, 0) + perfCounter() - start
+        setattr(obj, methodName, timed)
+
+    def _endFrame(self, now):
+        current = self.current
+        current[FRAME] = now - self.frameStart
+        for phase in self.phases:
+            if phase not in current:
+                current[phase] = 0
+        for phase, ns in current.items():
+            if phase not in self.samples:
+                self.phases.append(phase)
+                # Frames before the phase first showed up spent no time in it
+                self.samples[phase] = deque([0] * min(self.frames, self.windowSize), self.windowSize)
+                for row in self.trace:
+                    row[phase] = 0
+            self.samples[phase].append(ns)
+        if self.keepTrace:
+            self.trace.append(dict(current))
+        self.frames += 1
+        current.clear()
+
+    # (p50, p95, p99) of the phase over the rolling window, in nanoseconds
+    def percentiles(self, phase):
+        values = sorted(self.samples.get(phase, ()))
+        return tuple(percentile(values, p) for p in (50, 95, 99))
+
+    def summary(self):
+        summary = {}
+        for phase in self.phases:
+            values = self.samples[phase]
+            p50, p95, p99 = self.percentiles(phase)
+            summary[phase] = {'mean': sum(values) / len(values), 'p50': p50, 'p95': p95, 'p99': p99,
+                              'max': max(values)}
+        return summary
+
+    # Write every frame as a CSV row (.csv) or the summary and the frames as JSON (anything else)
+    def export(self, path):
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(['frame'] + [f'{phase}_ns' for phase in self.phases])
+                for index, row in enumerate(self.trace):
+                    writer.writerow([index] + [row[phase] for phase in self.phases])
+        else:
+            with open(path, 'w') as file:
+                json.dump({'unit': 'ns', 'frames': self.frames, 'windowSize': self.windowSize,
+                           'summary': self.summary(), 'phases': self.phases,
+                           'trace': [[row[phase] for phase in self.phases] for row in self.trace]}, file)
+
+class NullProfiler:
+    enabled = False
+
+    def startFrame(self):
+        pass
+
+    def mark(self, phase):
+        pass
+
+    def add(self, phase, ns):
+        pass
+
+    def instrument(self, obj, methodName, phase):
+        pass
@@ -0,0 +1,265 @@
+'''
+Binary protocol between the versus server (server.py) and its clients (client.py).
+
+Every message is a FRAMEHEADER (type byte + u16 payload length) followed by the payload, all
+little endian. Clients only ever send their inputs; the server runs the simulation and sends
+back what changed, so a client can mirror both boards without running any game rules.
+
+    client -> server
+    MSG_HELLO   protocol version (u8)
+    MSG_INPUT   varint tick + input mask (u8); sent when the inputs change and for every key press
+
+    server -> client
+    MSG_START   match id (u32), player index, seed (u32), board width, height, tick rate (u8 each)
+    MSG_DELTA   varint tick + number of blocks (u8) + one block per player whose game changed
+    MSG_END     index of the winner (u8, DRAWMARKER for a draw)
+    MSG_KEYFRAME like MSG_DELTA, but the full state of every game: clients reset their mirrors first
+
+Spectators (broadcast.py) get a MSG_START with SPECTATOR as their player index, then keyframes
+and deltas.
+
+A delta block starts with a flags byte: the player index in bit 0 and which parts follow:
+
+    FLAG_ROWS   varint bit mask of changed rows, then each changed row as 4-bit color codes,
+                two cells per byte (0 = empty, table index + 1, GARBAGECODE); the row mask is
+                implied by the non-zero codes
+    FLAG_PIECE  piece table index, rotation (u8 each), x, y (i8 each)
+    FLAG_STATS  varint score, varint lines, level (u8)
+    FLAG_NEXT   table index of the next piece
+    FLAG_OVER   the player's game is over (no payload)
+
+A tick in which nothing but gravity timers changed costs nothing, a falling piece costs a few
+bytes per row it moves, and board rows are only sent after a lock, a line clear or garbage.
+'''
+import struct
+from collections import namedtuple
+
+from game import GARBAGECOLOR
+from pieces import PIECETABLES
+from replay import encodeVarint, decodeVarint
+
+PROTOCOLVERSION = 3     # 2: shift inputs; 3: rotations checked at their destination
+PORT = 7777             # Versus server (server.py)
+BROADCASTPORT = 7778    # Spectators of a broadcast game (broadcast.py)
+
+FRAMEHEADER = struct.Struct('<BH')
+MAXPAYLOAD = 0xFFFF
+
+MSG_HELLO = 1
+MSG_INPUT = 2
+MSG_START = 10
+MSG_DELTA = 11
+MSG_END = 12
+MSG_KEYFRAME = 13
+
+START = struct.Struct('<IBIBBB')
+PIECE = struct.Struct('<BBbb')
+
+FLAG_PLAYER = 1
+FLAG_ROWS = 2
+FLAG_PIECE = 4
+FLAG_STATS = 8
+FLAG_NEXT = 16
+FLAG_OVER = 32
+
+# Color codes of settled blocks on the wire
+GARBAGECODE = 15
+COLORCODES = {table.color: table.index + 1 for table in PIECETABLES}
+COLORCODES[GARBAGECOLOR] = GARBAGECODE
+CODECOLORS = {code: color for color, code in COLORCODES.items()}
+
+DRAWMARKER = 0xFF
+SPECTATOR = 0xFF    # Player index in MSG_START for viewers who don't play
+
+# Changes to one player's game in a MSG_DELTA; parts that didn't change are None
+# rows   - list of (y, color codes of the row)
+# pose   - (table index, rotation, x, y)
+# stats  - (score, lines, level)
+PlayerDelta = namedtuple('PlayerDelta', 'player rows pose stats nextIndex isGameOver')
+
+def encodeMessage(messageType, payload=b''):
+    if len(payload) > MAXPAYLOAD:
+        raise ValueError(f'payload of {len(payload)} bytes does not fit in a frame')
+    return FRAMEHEADER.pack(messageType, len(payload)) + payload
+
+# Return (message type, payload); raises asyncio.IncompleteReadError when the peer disconnects
+async def readMessage(reader):
+    messageType, length = FRAMEHEADER.unpack(await reader.readexactly(FRAMEHEADER.size))
+    payload = await reader.readexactly(length) if length else b''
+    return messageType, payload
+
+def encodeHello():
+    return encodeMessage(MSG_HELLO, bytes((PROTOCOLVERSION,)))
+
+def encodeInput(tick, inputs):
+    payload = bytearray()
+    encodeVarint(tick, payload)
+    payload.append(inputs)
+    return encodeMessage(MSG_INPUT, payload)
+
+# Return (tick, inputs)
+def decodeInput(payload):
+    tick, position = decodeVarint(payload, 0)
+    return tick, payload[position]
+
+def encodeStart(matchId, player, seed, width, height, tickRate):
+    return encodeMessage(MSG_START, START.pack(matchId, player, seed & 0xFFFFFFFF, width, height, tickRate))
+
+# Return (match id, player index, seed, width, height, tick rate)
+def decodeStart(payload):
+    return START.unpack(payload)
+
+def encodeEnd(winner):
+    return encodeMessage(MSG_END, bytes((DRAWMARKER if winner < 0 else winner,)))
+
+# Index of the winner, or -1 for a draw
+def decodeEnd(payload):
+    return -1 if payload[0] == DRAWMARKER else payload[0]
+
+# 4-bit color codes of one board row, two cells per byte
+def packRow(codes):
+    packed = bytearray((len(codes) + 1) // 2)
+    for x, code in enumerate(codes):
+        packed[x >> 1] |= code << ((x & 1) * 4)
+    return bytes(packed)
+
+def unpackRow(packed, width):
+    return [(packed[x >> 1] >> ((x & 1) * 4)) & 0xF for x in range(width)]
+
+class StateEncoder:
+    '''Remembers what was last sent about one GameState and encodes only what changed since.'''
+
+    def __init__(self, state, player):
+        self.state = state
+        self.player = player
+        board = state.board
+
+        # Everything starts empty on the client, so the first encode() sends only the rows with blocks in them
+        self.sentRows = [packRow([0]*board.width)] * board.height
+        self.sentBoardVersion = None
+        self.sentPose = None
+        self.sentStats = None
+        self.sentNextIndex = None
+        self.sentGameOver = False
+
+        # Wire code of every board palette index, grown as the palette is
+        self._paletteCodes = [0]
+
+    def _rowCodes(self, rowColors):
+        board = self.state.board
+        codes = self._paletteCodes
+        while len(codes) < len(board.palette):
+            codes.append(COLORCODES[board.palette[len(codes)]])
+        return [codes[index] for index in rowColors]
+
+    # Append a delta block to out if anything changed; returns True when it did
+    def encode(self, out):
+        state = self.state
+        board = state.board
+        flags = self.player
+        body = bytearray()
+
+        if board.version != self.sentBoardVersion:
+            self.sentBoardVersion = board.version
+            changedMask = 0
+            changedRows = []
+            for y, rowColors in enumerate(board.colors):
+                packed = packRow(self._rowCodes(rowColors))
+                if packed != self.sentRows[y]:
+                    self.sentRows[y] = packed
+                    changedMask |= 1 << y
+                    changedRows.append(packed)
+            if changedRows:
+                flags |= FLAG_ROWS
+                encodeVarint(changedMask, body)
+                for packed in changedRows:
+                    body += packed
+
+        piece = state.piece
+        pose = (piece.table.index, piece.rotationCounter, piece.x, piece.y)
+        if pose != self.sentPose:
+            self.sentPose = pose
+            flags |= FLAG_PIECE
+            body += PIECE.pack(*pose)
+
+        stats = (state.score, state.lines, state.level)
+        if stats != self.sentStats:
+            self.sentStats = stats
+            flags |= FLAG_STATS
+            encodeVarint(state.score, body)
+            encodeVarint(state.lines, body)
+            body.append(state.level)
+
+        nextIndex = state.nextTable.index
+        if nextIndex != self.sentNextIndex:
+            self.sentNextIndex = nextIndex
+            flags |= FLAG_NEXT
+            body.append(nextIndex)
+
+        if state.isGameOver and not self.sentGameOver:
+            self.sentGameOver = True
+            flags |= FLAG_OVER
+
+        if flags == self.player:
+            return False
+        out.append(flags)
+        out += body
+        return True
+
+# MSG_DELTA with the changes of all encoders' games after the given tick, or None if nothing changed
+def encodeDelta(tick, encoders):
+    payload = bytearray()
+    encodeVarint(tick, payload)
+    countPosition = len(payload)
+    payload.append(0)
+    count = sum(encoder.encode(payload) for encoder in encoders)
+    if count == 0:
+        return None
+    payload[countPosition] = count
+    return encodeMessage(MSG_DELTA, payload)
+
+# MSG_KEYFRAME with the complete state of every game after the given tick
+def encodeKeyframe(tick, states):
+    payload = bytearray()
+    encodeVarint(tick, payload)
+    payload.append(len(states))
+    for player, state in enumerate(states):
+        StateEncoder(state, player).encode(payload)
+    return encodeMessage(MSG_KEYFRAME, payload)
+
+# Return (tick, list of PlayerDelta) from the payload of a MSG_DELTA or MSG_KEYFRAME
+def decodeDelta(payload, width, height):
+    tick, position = decodeVarint(payload, 0)
+    count = payload[position]
+    position += 1
+    rowBytes = (width + 1) // 2
+    deltas = []
+    for _ in range(count):
+        flags = payload[position]
+        position += 1
+        rows = pose = stats = nextIndex = None
+
+        if flags & FLAG_ROWS:
+            changedMask, position = decodeVarint(payload, position)
+            rows = []
+            for y in range(height):
+                if changedMask >> y & 1:
+                    rows.append((y, unpackRow(payload[position:position + rowBytes], width)))
+                    position += rowBytes
+
+        if flags & FLAG_PIECE:
+            pose = PIECE.unpack_from(payload, position)
+            position += PIECE.size
+
+        if flags & FLAG_STATS:
+            score, position = decodeVarint(payload, position)
+            lines, position = decodeVarint(payload, position)
+            stats = (score, lines, payload[position])
+            position += 1
+
+        if flags & FLAG_NEXT:
+            nextIndex = payload[position]
+            position += 1
+
+        deltas.append(PlayerDelta(flags & FLAG_PLAYER, rows, pose, stats, nextIndex, bool(flags & FLAG_OVER)))
+    return tick, deltas
@@ -0,0 +1,92 @@
+'''
+Piece generation: pluggable randomizers fed by a per-game seeded RNG and a PieceSource that
+keeps a fixed-size lookahead of upcoming pieces for the preview window.
+'''
+import random
+
+from pieces import PIECETABLES
+
+# Every piece drawn independently, like the original random.choice calls
+class UniformRandomizer:
+    def __init__(self, rng, tables=PIECETABLES):
+        self.rng = rng
+        self.tables = tables
+
+    def next(self):
+        return self.rng.choice(self.tables)
+
+# All seven pieces in shuffled order, then a new shuffled bag
+class BagRandomizer:
+    def __init__(self, rng, tables=PIECETABLES):
+        self.rng = rng
+        self.bag = list(tables)
+        self.index = len(self.bag)
+
+    def next(self):
+        if self.index == len(self.bag):
+            self.rng.shuffle(self.bag)
+            self.index = 0
+        table = self.bag[self.index]
+        self.index += 1
+        return table
+
+# Reroll a few times when the piece was one of the recently dealt ones
+class HistoryRandomizer:
+    HISTORYSIZE = 4
+    ROLLS = 4
+
+    def __init__(self, rng, tables=PIECETABLES):
+        self.rng = rng
+        self.tables = tables
+        self.history = [None] * self.HISTORYSIZE
+        self.historyIndex = 0
+
+    def next(self):
+        for _ in range(self.ROLLS):
+            table = self.rng.choice(self.tables)
+            if table not in self.history:
+                break
+        self.history[self.historyIndex] = table
+        self.historyIndex = (self.historyIndex + 1) % self.HISTORYSIZE
+        return table
+
+RANDOMIZERS = {
+    'uniform': UniformRandomizer,
+    'bag': BagRandomizer,
+    'history': HistoryRandomizer,
+}
+
+class PieceSource:
+    '''Seeded stream of pieces with a ring buffer of `lookahead` upcoming ones.'''
+
+    def __init__(self, seed=None, randomizer='uniform', lookahead=1):
+        if lookahead < 1:
+            raise ValueError('lookahead must be at least 1')
+        self.seed = seed
+        self.randomizerName = randomizer
+        self.randomizer = RANDOMIZERS[randomizer](random.Random(seed))
+        self.queue = [self.randomizer.next() for _ in range(lookahead)]
+        self.head = 0
+
+        # How many pieces were taken so far; changes exactly when the lookahead does
+        self.dealt = 0
+
+    @property
+    def lookahead(self):
+        return len(self.queue)
+
+    # Take the first upcoming piece and refill its slot at the end of the queue
+    def next(self):
+        queue = self.queue
+        table = queue[self.head]
+        queue[self.head] = self.randomizer.next()
+        self.head = (self.head + 1) % len(queue)
+        self.dealt += 1
+        return table
+
+    # Upcoming piece `index` positions ahead (0 = the next one)
+    def peek(self, index=0):
+        return self.queue[(self.head + index) % len(self.queue)]
+
+    def upcoming(self):
+        return [self.peek(index) for index in range(len(self.queue))]
@@ -0,0 +1,301 @@
+'''
+Dirty-rectangle renderer for the playfield.
+
+Settled blocks are kept on a persistent surface that is only touched when the board changes
+(lock and line clear), and only in the rows that actually changed. Every block is blitted from a
+sprite pre-rendered once per color and block size, shared by all renderers: a renderer for a new
+window size draws its sprites at the new size once, frames never scale anything. Each frame only
+the falling shape is erased and redrawn, and render() returns just the rects that changed, to be
+passed to pygame.display.update.
+The shape can be drawn between its positions at the last two logic ticks (see scheduler.py),
+and its landing position is shown as an outlined ghost piece.
+
+Effects playing in an effects.EffectPool are drawn over the settled blocks on every frame until
+they end, each one erased from the board surface before the next frame like the shape is. Their
+overlays are made once per renderer and only change their alpha from frame to frame.
+'''
+import pygame
+
+from effects import EFFECT_ROWFLASH, EFFECT_COLLAPSE, EFFECT_LOCKFLASH, EFFECT_FADE
+
+FLASHCOLOR = (255,255,255)
+FADECOLOR = (0,0,0)
+LOCKFLASHALPHA = 160    # Of the flash over a shape that just locked, fading out
+FADEALPHA = 192         # Of the game over fade when it is complete
+
+# Order of the effects on screen, bottom first; the falling shape goes between the two layers
+UNDERPIECE = (EFFECT_COLLAPSE, EFFECT_ROWFLASH, EFFECT_LOCKFLASH)
+OVERPIECE = (EFFECT_FADE,)
+
+# (color, block size, gap, background, is ghost) -> sprite; kept for the whole run, a resize only adds a few
+SPRITES = {}
+
+def _makeSprite(color, blockSize, gap, bgColor, isGhost):
+    sprite = pygame.Surface((blockSize, blockSize)).convert()
+    sprite.fill(bgColor)
+    if isGhost:
+        sprite.set_colorkey(bgColor)
+        pygame.draw.rect(sprite, color, (gap, gap, blockSize - gap, blockSize - gap), 2)
+    else:
+        pygame.draw.rect(sprite, color, (gap, gap, blockSize - gap, blockSize - gap))
+    return sprite
+
+class BoardRenderer:
+    def __init__(self, targetSurf, origin, gridWidth, gridHeight, blockSize, blockGapSize, bgColor, showGhost=True):
+        self.targetSurf = targetSurf
+        self.originX, self.originY = origin
+        self.gridWidth = gridWidth
+        self.gridHeight = gridHeight
+        self.blockSize = blockSize
+        self.blockGapSize = blockGapSize
+        self.bgColor = bgColor
+        self.showGhost = showGhost
+        self.boardRect = pygame.Rect(self.originX, self.originY, gridWidth*blockSize, gridHeight*blockSize)
+
+        # Settled blocks drawn in board coordinates
+        self.boardSurf = pygame.Surface(self.boardRect.size)
+        self.sprites = {}
+        self.ghostSprites = {}
+
+        # What is currently shown on the target surface
+        self._boardVersion = None
+        self._renderedRows = [None] * gridHeight
+        self._pieceKey = None
+        self._pieceRects = []
+        self._needsFullRedraw = True
+
+        # Effects drawn in the last frame and the overlays they are drawn with
+        self._effectRects = []
+        self._overlays = {}
+
+    # One pre-rendered block per color, with the gap baked in
+    def getSprite(self, color):
+        sprite = self.sprites.get(color)
+        if sprite is None:
+            sprite = self.sprites[color] = self._sharedSprite(color, False)
+        return sprite
+
+    # Outline of a block in the given color, for the ghost piece
+    def getGhostSprite(self, color):
+        sprite = self.ghostSprites.get(color)
+        if sprite is None:
+            sprite = self.ghostSprites[color] = self._sharedSprite(color, True)
+        return sprite
+
+    def _sharedSprite(self, color, isGhost):
+        key = (color, self.blockSize, self.blockGapSize, self.bgColor, isGhost)
+        sprite = SPRITES.get(key)
+        if sprite is None:
+            sprite = SPRITES[key] = _makeSprite(color, self.blockSize, self.blockGapSize, self.bgColor, isGhost)
+        return sprite
+
+    # Force redrawing everything, e.g. after something else drew over the board area
+    def invalidate(self):
+        self._needsFullRedraw = True
+
+    # Bring the target surface up to date with the state; returns list of changed rects.
+    # previousPose is Piece.pose() before the last tick, alpha how far to move from it to the current one.
+    # effects is an EffectPool whose effects are drawn as they are at time now (effects.clock() by default).
+    def render(self, state, alpha=1.0, previousPose=None, effects=None, now=None):
+        dirtyRects = []
+        board = state.board
+
+        if self._needsFullRedraw:
+            self._renderedRows = [None] * self.gridHeight
+            self._updateBoardSurf(board)
+            self.targetSurf.blit(self.boardSurf, self.boardRect)
+            dirtyRects.append(self.boardRect)
+            self._pieceRects = []
+            self._pieceKey = None
+            self._effectRects = []
+            self._needsFullRedraw = False
+        elif board.version != self._boardVersion:
+            self._erasePiece(dirtyRects)
+            for rowRect in self._updateBoardSurf(board):
+                self.targetSurf.blit(self.boardSurf, rowRect.move(self.originX, self.originY), rowRect)
+                dirtyRects.append(rowRect.move(self.originX, self.originY))
+
+        hasEffects = effects is not None and (effects.active or self._effectRects)
+        if hasEffects:
+            # Effects change on every frame they play, and the shape has to go on top of them again
+            if now is None:
+                now = effects.clock()
+            self._eraseEffects(dirtyRects)
+            self._erasePiece(dirtyRects)
+            self._drawEffects(effects, now, UNDERPIECE, dirtyRects)
+
+        piece = state.piece
+        left, top = self._interpolatePiecePosition(piece, alpha, previousPose)
+        ghostY = state.landingY() if self.showGhost else None
+        pieceKey = (piece.table, piece.rotationCounter, left, top, ghostY)
+        if pieceKey != self._pieceKey:
+            self._erasePiece(dirtyRects)
+            # Drawn first, so the shape covers the ghost where they overlap
+            if ghostY is not None and ghostY > piece.y:
+                self._drawShape(self.getGhostSprite(piece.color), piece.shape, self.originX + piece.x*self.blockSize,
+                                self.originY + ghostY*self.blockSize, dirtyRects)
+            self._drawShape(self.getSprite(piece.color), piece.shape, left, top, dirtyRects)
+            self._pieceKey = pieceKey
+
+        if hasEffects:
+            self._drawEffects(effects, now, OVERPIECE, dirtyRects)
+        return dirtyRects
+
+    # Redraw rows that changed since last render; returns their rects in board coordinates
+    def _updateBoardSurf(self, board):
+        changedRects = []
+        blockSize = self.blockSize
+        palette = board.palette
+        for y in range(self.gridHeight):
+            mask = board.rows[y]
+            rowColors = board.colors[y]
+            rowKey = (mask, bytes(rowColors))
+            if rowKey == self._renderedRows[y]:
+                continue
+            self._renderedRows[y] = rowKey
+
+            rowRect = pygame.Rect(0, y*blockSize, self.gridWidth*blockSize, blockSize)
+            self.boardSurf.fill(self.bgColor, rowRect)
+            x = 0
+            while mask:
+                if mask & 1:
+                    self.boardSurf.blit(self.getSprite(palette[rowColors[x]]), (x*blockSize, y*blockSize))
+                mask >>= 1
+                x += 1
+            changedRects.append(rowRect)
+        self._boardVersion = board.version
+        return changedRects
+
+    # Restore settled blocks under the shape and ghost drawn in previous frame
+    def _erasePiece(self, dirtyRects):
+        for pieceRect in self._pieceRects:
+            self.targetSurf.blit(self.boardSurf, pieceRect, pieceRect.move(-self.originX, -self.originY))
+            dirtyRects.append(pieceRect)
+        self._pieceRects = []
+        self._pieceKey = None
+
+    # Pixel position of the piece origin, moved back towards previousPose when the shape only shifted by one cell
+    def _interpolatePiecePosition(self, piece, alpha, previousPose):
+        blockSize = self.blockSize
+        left = self.originX + piece.x*blockSize
+        top = self.originY + piece.y*blockSize
+        if previousPose is not None and alpha < 1.0:
+            table, rotationCounter, previousX, previousY = previousPose
+            if table is piece.table and rotationCounter == piece.rotationCounter and \
+                    abs(piece.x - previousX) <= 1 and abs(piece.y - previousY) <= 1:
+                left -= round((piece.x - previousX)*(1.0 - alpha)*blockSize)
+                top -= round((piece.y - previousY)*(1.0 - alpha)*blockSize)
+        return left, top
+
+    def _drawShape(self, sprite, shape, left, top, dirtyRects):
+        blockSize = self.blockSize
+
+        # Blocks above the top edge of the board are not shown
+        previousClip = self.targetSurf.get_clip()
+        self.targetSurf.set_clip(self.boardRect)
+        for dx, dy in shape.cells:
+            self.targetSurf.blit(sprite, (left + dx*blockSize, top + dy*blockSize))
+        self.targetSurf.set_clip(previousClip)
+
+        pieceRect = pygame.Rect(left + shape.minDx*blockSize, top + shape.minDy*blockSize,
+                                (shape.maxDx - shape.minDx + 1)*blockSize,
+                                (shape.maxDy - shape.minDy + 1)*blockSize).clip(self.boardRect)
+        if pieceRect.width and pieceRect.height:
+            self._pieceRects.append(pieceRect)
+            dirtyRects.append(pieceRect)
+
+    # Overlay of the given size and color, made once; effects only change its alpha
+    def _getOverlay(self, name, size, color):
+        overlay = self._overlays.get(name)
+        if overlay is None:
+            overlay = self._overlays[name] = pygame.Surface(size).convert()
+            overlay.fill(color)
+        return overlay
+
+    # Restore settled blocks under the effects drawn in previous frame
+    def _eraseEffects(self, dirtyRects):
+        for effectRect in self._effectRects:
+            self.targetSurf.blit(self.boardSurf, effectRect, effectRect.move(-self.originX, -self.originY))
+            dirtyRects.append(effectRect)
+        self._effectRects = []
+
+    def _drawEffects(self, effects, now, kinds, dirtyRects):
+        for kind in kinds:
+            for effect in effects.active:
+                if effect.kind != kind:
+                    continue
+                if kind == EFFECT_FADE:
+                    effectRect = self._drawFade(effect.progress(now))
+                elif effect.version != self._boardVersion:
+                    # The board changed since the effect started, the rows it was drawn for moved
+                    continue
+                elif kind == EFFECT_COLLAPSE:
+                    effectRect = self._drawCollapse(effect.rows, effect.progress(now))
+                elif kind == EFFECT_ROWFLASH:
+                    effectRect = self._drawRowFlash(effect.rows, effect.progress(now))
+                else:
+                    effectRect = self._drawLockFlash(effect, effect.progress(now))
+                self._effectRects.append(effectRect)
+                dirtyRects.append(effectRect)
+
+    # The board already lost the cleared rows; the rows that were above them are drawn on their way down
+    # from their old places, progress 0.0 showing the board as it was with the cleared rows empty
+    def _drawCollapse(self, rows, progress):
+        blockSize = self.blockSize
+        width = self.boardRect.width
+        lowest = rows.bit_length() - 1
+        regionRect = pygame.Rect(self.originX, self.originY, width, (lowest + 1)*blockSize)
+        target = self.targetSurf
+        target.fill(self.bgColor, regionRect)
+        previousClip = target.get_clip()
+        target.set_clip(regionRect)
+
+        # Rows between two cleared rows fall by the number of cleared rows below them
+        shift = rows.bit_count()
+        top = 0
+        for y in range(lowest + 1):
+            if not rows >> y & 1:
+                continue
+            if y > top:
+                sourceTop = (top + shift)*blockSize
+                destTop = self.originY + sourceTop - round((1.0 - progress)*shift*blockSize)
+                target.blit(self.boardSurf, (self.originX, destTop), (0, sourceTop, width, (y - top)*blockSize))
+            top = y + 1
+            shift -= 1
+        target.set_clip(previousClip)
+        return regionRect
+
+    # Cleared rows (at their places before the clear) fading out
+    def _drawRowFlash(self, rows, progress):
+        blockSize = self.blockSize
+        overlay = self._getOverlay('row', (self.boardRect.width, blockSize), FLASHCOLOR)
+        overlay.set_alpha(int(255*(1.0 - progress)))
+        lowest = rows.bit_length() - 1
+        highest = (rows & -rows).bit_length() - 1
+        for y in range(highest, lowest + 1):
+            if rows >> y & 1:
+                self.targetSurf.blit(overlay, (self.originX, self.originY + y*blockSize))
+        return pygame.Rect(self.originX, self.originY + highest*blockSize, self.boardRect.width,
+                           (lowest - highest + 1)*blockSize)
+
+    def _drawLockFlash(self, effect, progress):
+        blockSize = self.blockSize
+        overlay = self._getOverlay('block', (blockSize, blockSize), FLASHCOLOR)
+        overlay.set_alpha(int(LOCKFLASHALPHA*(1.0 - progress)))
+        shape = effect.table.rotations[effect.rotation]
+        left = self.originX + effect.x*blockSize
+        top = self.originY + effect.y*blockSize
+        previousClip = self.targetSurf.get_clip()
+        self.targetSurf.set_clip(self.boardRect)
+        for dx, dy in shape.cells:
+            self.targetSurf.blit(overlay, (left + dx*blockSize, top + dy*blockSize))
+        self.targetSurf.set_clip(previousClip)
+        return pygame.Rect(left + shape.minDx*blockSize, top + shape.minDy*blockSize,
+                           (shape.maxDx - shape.minDx + 1)*blockSize,
+                           (shape.maxDy - shape.minDy + 1)*blockSize).clip(self.boardRect)
+
+    def _drawFade(self, progress):
+        overlay = self._getOverlay('fade', self.boardRect.size, FADECOLOR)
+        overlay.set_alpha(int(FADEALPHA*progress))
+        self.targetSurf.blit(overlay, self.boardRect)
+        return self.boardRect
@@ -0,0 +1,171 @@
+'''
+Replays: a game is fully determined by its GameState parameters (seed, randomizer, board size,
+speed step) and the inputs of every tick, so that is all a replay stores.
+
+File layout (little endian):
+
+    header   MAGIC, version, seed (u64), width, height, levelUpSpeedStep, lookahead (u8 each),
+             randomizer name (u8 length + ASCII)
+    records  varint ticks since the previous record + input mask byte, written only when the
+             inputs change
+    footer   varint ticks since the last record + ENDMARKER in place of the mask, varint final score
+
+Held keys repeat the same mask for many ticks, so a whole game takes a few KB. ReplayRecorder
+hands filled buffers to a background thread, so the game loop never waits for the disk.
+
+    python replay.py game.rpl              # fast-forward headless and print the result
+    python main.py --replay game.rpl       # watch it in real time
+'''
+import argparse, queue, struct, sys, threading, time
+from collections import namedtuple
+
+from game import GameState
+
+MAGIC = b'TRPL'
+VERSION = 3                 # 2: shift inputs, moves checked at their destination; 3: rotations too
+ENDMARKER = 0xFF            # Never a valid input mask, which only uses the low 7 bits
+HEADER = struct.Struct('<4sBQBBBB')
+BUFFERSIZE = 4096           # Bytes collected before a buffer is handed to the writer thread
+
+Replay = namedtuple('Replay', 'seed width height levelUpSpeedStep lookahead randomizer records ticks score')
+
+def encodeVarint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+# Return (value, position after it)
+def decodeVarint(data, position):
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+class ReplayRecorder:
+    '''Records the inputs of one game; call record() once per GameState.step and close() at the end.'''
+
+    def __init__(self, path, state, bufferSize=BUFFERSIZE):
+        self.path = path
+        self.bufferSize = bufferSize
+        self.ticks = 0
+        self.lastTick = 0
+        self.lastInputs = 0
+
+        randomizer = state.pieceSource.randomizerName.encode('ascii')
+        self.buffer = bytearray(HEADER.pack(MAGIC, VERSION, state.seed, state.board.width, state.board.height,
+                                            state.levelUpSpeedStep, state.pieceSource.lookahead))
+        self.buffer.append(len(randomizer))
+        self.buffer += randomizer
+
+        self.file = open(path, 'wb')
+        self.chunks = queue.Queue()
+        self.writer = threading.Thread(target=self._writeChunks, name='replay-writer', daemon=True)
+        self.writer.start()
+
+    # Inputs of the next tick
+    def record(self, inputs):
+        if inputs != self.lastInputs:
+            encodeVarint(self.ticks - self.lastTick, self.buffer)
+            self.buffer.append(inputs)
+            self.lastTick = self.ticks
+            self.lastInputs = inputs
+            if len(self.buffer) >= self.bufferSize:
+                self.flush()
+        self.ticks += 1
+
+    def flush(self):
+        if self.buffer:
+            self.chunks.put(bytes(self.buffer))
+            self.buffer.clear()
+
+    # Write the footer and wait until everything is on disk
+    def close(self, score):
+        encodeVarint(self.ticks - self.lastTick, self.buffer)
+        self.buffer.append(ENDMARKER)
+        encodeVarint(score, self.buffer)
+        self.flush()
+        self.chunks.put(None)
+        self.writer.join()
+
+    def _writeChunks(self):
+        with self.file:
+            while True:
+                chunk = self.chunks.get()
+                if chunk is None:
+                    return
+                self.file.write(chunk)
+
+def loadReplay(path):
+    with open(path, 'rb') as file:
+        data = file.read()
+    magic, version, seed, width, height, levelUpSpeedStep, lookahead = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'{path} is not a replay file this version can read')
+    position = HEADER.size
+    nameLength = data[position]
+    randomizer = data[position + 1:position + 1 + nameLength].decode('ascii')
+    position += 1 + nameLength
+
+    # (tick, inputs) from which on the inputs apply
+    records = []
+    tick = 0
+    while True:
+        delta, position = decodeVarint(data, position)
+        inputs = data[position]
+        position += 1
+        tick += delta
+        if inputs == ENDMARKER:
+            break
+        records.append((tick, inputs))
+    score, position = decodeVarint(data, position)
+    return Replay(seed, width, height, levelUpSpeedStep, lookahead, randomizer, records, tick, score)
+
+# Inputs for every tick of the replay
+def iterInputs(replay):
+    inputs = 0
+    tick = 0
+    for recordTick, recordInputs in replay.records:
+        while tick < recordTick:
+            yield inputs
+            tick += 1
+        inputs = recordInputs
+    while tick < replay.ticks:
+        yield inputs
+        tick += 1
+
+def createGameState(replay):
+    return GameState(replay.seed, replay.width, replay.height, replay.levelUpSpeedStep, replay.randomizer, replay.lookahead)
+
+# Fast-forward the whole replay without pygame; returns the final GameState
+def playReplay(replay):
+    state = createGameState(replay)
+    step = state.step
+    for inputs in iterInputs(replay):
+        step(inputs)
+    return state
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description='Fast-forward a recorded game and check it reproduces the recorded score.')
+    parser.add_argument('path')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parseArgs(argv)
+    replay = loadReplay(args.path)
+    start = time.perf_counter()
+    state = playReplay(replay)
+    elapsed = time.perf_counter() - start
+    print(f'seed {replay.seed}, {replay.randomizer} randomizer, {replay.ticks} ticks, {len(replay.records)} input changes')
+    print(f'score {state.score} (recorded {replay.score}), level {state.level}, lines {state.lines}, '
+          f'game over: {state.isGameOver}')
+    print(f'played in {elapsed:.3f} s, {replay.ticks / elapsed if elapsed else 0:.0f} ticks/s')
+    if state.score != replay.score:
+        sys.exit('replay diverged from the recorded game')
+
+if __name__ == '__main__':
+    main()
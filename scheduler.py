@@ -0,0 +1,49 @@
+'''
+Fixed-timestep scheduler: game logic runs at TICKRATE ticks per second of real time, no matter
+how fast frames are rendered. Each frame asks advance() how many ticks are due; the remainder
+of the accumulator (alpha) is used to interpolate drawing between the last two ticks.
+'''
+import time
+
+TICKRATE = 60           # Logic ticks per second; the rules were tuned for one tick per frame at 60 FPS
+MAXTICKSPERFRAME = 8    # Don't try to catch up more than this after a long stall
+
+class FixedTimestep:
+    def __init__(self, tickRate=TICKRATE, maxTicksPerFrame=MAXTICKSPERFRAME, clock=time.perf_counter):
+        self.tickDuration = 1 / tickRate
+        self.maxTicksPerFrame = maxTicksPerFrame
+        self.clock = clock
+        self.accumulator = 0.0
+        self.previousTime = None
+
+    # Forget time that passed while the game wasn't running (pause, game over screen)
+    def reset(self):
+        self.accumulator = 0.0
+        self.previousTime = None
+
+    # Return how many logic ticks should run before rendering this frame
+    def advance(self):
+        now = self.clock()
+        if self.previousTime is None:
+            self.previousTime = now
+        self.accumulator += now - self.previousTime
+        self.previousTime = now
+
+        ticks = int(self.accumulator / self.tickDuration)
+        if ticks > self.maxTicksPerFrame:
+            # Drop the backlog instead of spiralling into ever longer frames
+            ticks = self.maxTicksPerFrame
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= ticks * self.tickDuration
+        return ticks
+
+    # Time (on self.clock) up to which the index-th of the `ticks` ticks due this frame takes key input.
+    # The last one takes everything up to the last advance(), the ones before it a tick apart.
+    def tickTime(self, index, ticks):
+        return self.previousTime - (ticks - 1 - index) * self.tickDuration
+
+    # How far (0..1) the current frame is between the last tick and the next one
+    @property
+    def alpha(self):
+        return min(self.accumulator / self.tickDuration, 1.0)
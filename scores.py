@@ -0,0 +1,191 @@
+'''
+High scores and per-game statistics in a local SQLite database.
+
+GameStats counts what happens in a game from GameState.events (clears by size, pieces by
+shape, highest level). At game over the finished GameRecord goes to ScoreStore.submit(), which
+only queues it: a writer thread owns the database connection and inserts everything queued so
+far in one transaction, so the game loop never waits for the disk.
+
+The leaderboard is served from memory: the writer thread loads the best CACHEDSCORES games
+through the score index when the store opens, and submitted games are merged in right away, so
+topScores() is a list slice and the game over screen can draw it without any I/O.
+'''
+import bisect, os, queue, sqlite3, threading, time
+from collections import namedtuple
+
+from game import EVENT_LOCK, EVENT_CLEAR, EVENT_LEVELUP
+from pieces import PIECETABLES
+from scheduler import TICKRATE
+
+SCORESPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scores.sqlite3')
+CACHEDSCORES = 100      # Best games kept in memory for the leaderboard
+BATCHSIZE = 256         # Most games inserted in one transaction
+MAXCLEARSIZE = 4        # A piece spans at most four rows
+
+# playedAt - time.time() at game over
+# seconds  - game time (ticks / tick rate), pauses don't count
+# clears   - number of 1, 2, 3 and 4 row clears
+# pieces   - total pieces; piecesByShape maps shape name to count
+GameRecord = namedtuple('GameRecord', 'playedAt seed score maxLevel lines pieces ticks seconds clears piecesByShape')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    playedAt REAL NOT NULL,
+    seed INTEGER,
+    score INTEGER NOT NULL,
+    maxLevel INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    pieces INTEGER NOT NULL,
+    ticks INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    singles INTEGER NOT NULL,
+    doubles INTEGER NOT NULL,
+    triples INTEGER NOT NULL,
+    tetrises INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS gamesByScore ON games (score DESC, playedAt);
+CREATE TABLE IF NOT EXISTS gamePieces (
+    gameId INTEGER NOT NULL REFERENCES games (id),
+    shape TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (gameId, shape)
+) WITHOUT ROWID;
+'''
+
+INSERTGAME = '''INSERT INTO games (playedAt, seed, score, maxLevel, lines, pieces, ticks, seconds,
+                                   singles, doubles, triples, tetrises)
+                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+INSERTPIECES = 'INSERT INTO gamePieces (gameId, shape, count) VALUES (?, ?, ?)'
+TOPSCORESQUERY = '''SELECT id, playedAt, seed, score, maxLevel, lines, pieces, ticks, seconds,
+                           singles, doubles, triples, tetrises
+                    FROM games ORDER BY score DESC, playedAt LIMIT ?'''
+PIECESQUERY = 'SELECT shape, count FROM gamePieces WHERE gameId = ?'
+
+class GameStats:
+    '''Statistics of one game, collected from GameState.events after every step.'''
+
+    def __init__(self):
+        self.clears = [0]*MAXCLEARSIZE
+        self.piecesByShape = {table.name: 0 for table in PIECETABLES}
+        self.maxLevel = 1
+
+    def update(self, events):
+        for event, value in events:
+            if event == EVENT_LOCK:
+                table = value[0]
+                self.piecesByShape[table.name] += 1
+            elif event == EVENT_CLEAR:
+                self.clears[len(value) - 1] += 1
+            elif event == EVENT_LEVELUP:
+                self.maxLevel = max(self.maxLevel, value)
+
+    def record(self, state, tickRate=TICKRATE):
+        return GameRecord(time.time(), state.seed, state.score, self.maxLevel, state.lines, state.pieces, state.ticks,
+                          state.ticks / tickRate, tuple(self.clears), dict(self.piecesByShape))
+
+# Leaderboard order: higher score first, earlier game first among equal scores
+def rankKey(record):
+    return (-record.score, record.playedAt)
+
+class ScoreStore:
+    def __init__(self, path=SCORESPATH, cachedScores=CACHEDSCORES, batchSize=BATCHSIZE):
+        self.path = path
+        self.cachedScores = cachedScores
+        self.batchSize = batchSize
+
+        # Best games sorted by rankKey, guarded by the lock
+        self._top = []
+        self._topKeys = []
+        self._lock = threading.Lock()
+        self.isLoaded = threading.Event()
+
+        self.gamesWritten = 0
+        self.transactions = 0
+        self.records = queue.Queue()
+        self.writer = threading.Thread(target=self._run, name='score-writer', daemon=True)
+        self.writer.start()
+
+    # Queue a finished game for writing and put it on the leaderboard
+    def submit(self, record):
+        self._addToTop([record])
+        self.records.put(record)
+
+    # Best games so far, without touching the database
+    def topScores(self, count=10):
+        with self._lock:
+            return self._top[:count]
+
+    # Wait until everything submitted so far is committed
+    def flush(self):
+        done = threading.Event()
+        self.records.put(done)
+        done.wait()
+
+    def close(self):
+        self.records.put(None)
+        self.writer.join()
+
+    def _addToTop(self, records):
+        with self._lock:
+            for record in records:
+                key = rankKey(record)
+                index = bisect.bisect_right(self._topKeys, key)
+                if index < self.cachedScores:
+                    self._topKeys.insert(index, key)
+                    self._top.insert(index, record)
+            del self._top[self.cachedScores:]
+            del self._topKeys[self.cachedScores:]
+
+    def _run(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path)
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._addToTop(loadTopScores(connection, self.cachedScores))
+            self.isLoaded.set()
+
+            while True:
+                # Block for the first item, then take whatever else is already waiting
+                items = [self.records.get()]
+                while len(items) < self.batchSize:
+                    try:
+                        items.append(self.records.get_nowait())
+                    except queue.Empty:
+                        break
+                batch = [item for item in items if isinstance(item, GameRecord)]
+                if batch:
+                    self._write(connection, batch)
+                for item in items:
+                    if isinstance(item, threading.Event):
+                        item.set()
+                if None in items:
+                    return
+        finally:
+            self.isLoaded.set()
+            connection.close()
+
+    def _write(self, connection, batch):
+        with connection:
+            for record in batch:
+                gameId = connection.execute(INSERTGAME, (record.playedAt, record.seed, record.score, record.maxLevel,
+                                                         record.lines, record.pieces, record.ticks, record.seconds,
+                                                         *record.clears)).lastrowid
+                connection.executemany(INSERTPIECES, [(gameId, shape, count)
+                                                      for shape, count in record.piecesByShape.items()])
+        self.gamesWritten += len(batch)
+        self.transactions += 1
+
+# Best `count` games from the database, through the score index
+def loadTopScores(connection, count):
+    records = []
+    for row in connection.execute(TOPSCORESQUERY, (count,)).fetchall():
+        gameId, playedAt, seed, score, maxLevel, lines, pieces, ticks, seconds = row[:9]
+        piecesByShape = dict(connection.execute(PIECESQUERY, (gameId,)).fetchall())
+        records.append(GameRecord(playedAt, seed, score, maxLevel, lines, pieces, ticks, seconds, tuple(row[9:]),
+                                  piecesByShape))
+    return records
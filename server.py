@@ -0,0 +1,245 @@
+'''
+Asyncio server for two player versus matches (versus.py) over TCP.
+
+The server is authoritative: it pairs up connecting clients, runs every match's VersusMatch at
+TICKRATE and streams the changes to both players with the delta protocol from protocol.py.
+Clients only send tick-stamped inputs. An input is applied at the tick it was stamped with, or
+at the next tick the server runs if it arrives late; held keys stay in effect until the next
+input message, key presses (rotation, hard drop) are applied exactly once.
+
+All matches of a process share one ticker task, so a tick costs one pass over the live matches
+and one write per player, and a player that stops reading is dropped before its unsent data
+piles up in memory.
+
+    python server.py --port 7777
+    python main.py --connect localhost:7777     # in two terminals
+'''
+import argparse, asyncio, random, time
+from collections import deque
+
+from game import PRESSINPUTS
+from profiler import percentile
+from protocol import (MSG_HELLO, MSG_INPUT, PROTOCOLVERSION, PORT, readMessage, decodeInput, encodeStart, encodeDelta,
+                      encodeEnd, StateEncoder)
+from scheduler import FixedTimestep, TICKRATE
+from versus import VersusMatch, DRAW
+
+HOST = '127.0.0.1'
+MAXQUEUEDINPUTS = 256       # Input messages waiting for their tick before a client counts as flooding
+MAXWRITEBUFFER = 64*1024    # Unsent bytes to a client before it counts as too slow and is dropped
+BANDWIDTHBUDGET = 2048     # Bytes per second a match may use, both players and both directions together
+TICKSTATS = 6000            # Ticks kept for VersusServer.tickPercentiles
+
+class PlayerConnection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.connected = True
+        self.match = None
+        self.player = None
+
+        # (tick, inputs) messages that arrived before their tick
+        self.queuedInputs = deque()
+        self.lastTick = 0
+        self.heldInputs = 0
+
+        self.bytesSent = 0
+        self.bytesReceived = 0
+
+    def queueInputs(self, tick, inputs):
+        # Ticks never go backwards, so reordered or replayed messages can't undo earlier inputs
+        self.lastTick = max(self.lastTick, tick)
+        self.queuedInputs.append((self.lastTick, inputs))
+        if len(self.queuedInputs) > MAXQUEUEDINPUTS:
+            self.disconnect()
+
+    # Inputs for the given tick from all messages stamped with it or earlier
+    def takeInputs(self, tick):
+        queuedInputs = self.queuedInputs
+        presses = 0
+        while queuedInputs and queuedInputs[0][0] <= tick:
+            inputs = queuedInputs.popleft()[1]
+            presses |= inputs & PRESSINPUTS
+            self.heldInputs = inputs & ~PRESSINPUTS
+        return self.heldInputs | presses
+
+    def send(self, data):
+        if not self.connected:
+            return
+        if self.writer.transport.get_write_buffer_size() > MAXWRITEBUFFER:
+            self.disconnect()
+            return
+        self.writer.write(data)
+        self.bytesSent += len(data)
+
+    def disconnect(self):
+        if self.connected:
+            self.connected = False
+            self.writer.close()
+
+class Match:
+    def __init__(self, matchId, seed, players, tickRate=TICKRATE, maxTicks=None):
+        self.id = matchId
+        self.versus = VersusMatch(seed)
+        self.players = players
+        self.tickRate = tickRate
+        self.maxTicks = maxTicks
+        self.encoders = [StateEncoder(state, player) for player, state in enumerate(self.versus.states)]
+        self.isFinished = False
+        for player, connection in enumerate(players):
+            connection.match = self
+            connection.player = player
+
+    def start(self):
+        board = self.versus.states[0].board
+        for player, connection in enumerate(self.players):
+            connection.send(encodeStart(self.id, player, self.versus.seed, board.width, board.height, self.tickRate))
+
+    def tick(self):
+        versus = self.versus
+        connected = [connection.connected for connection in self.players]
+        if not all(connected):
+            # Leaving forfeits the match
+            self.finish(connected.index(True) if any(connected) else DRAW)
+            return
+
+        inputs = [connection.takeInputs(versus.ticks) for connection in self.players]
+        versus.step(inputs)
+        message = encodeDelta(versus.ticks, self.encoders)
+        if message is not None:
+            for connection in self.players:
+                connection.send(message)
+
+        if versus.isOver:
+            self.finish(versus.winner)
+        elif self.maxTicks is not None and versus.ticks >= self.maxTicks:
+            self.finish(DRAW)
+
+    def finish(self, winner):
+        self.isFinished = True
+        self.winner = winner
+        message = encodeEnd(winner)
+        for connection in self.players:
+            connection.send(message)
+            connection.disconnect()
+
+class VersusServer:
+    def __init__(self, host=HOST, port=PORT, tickRate=TICKRATE, seed=None, maxTicks=None):
+        self.host = host
+        self.port = port
+        self.tickRate = tickRate
+        self.maxTicks = maxTicks
+        self.rng = random.Random(seed)
+        self.matches = {}
+        self.waiting = None
+        self.nextMatchId = 1
+        self.server = None
+        self.ticker = None
+
+        # Totals over all finished matches, for bandwidth accounting
+        self.matchesFinished = 0
+        self.matchTicks = 0
+        self.bytesSent = 0
+        self.bytesReceived = 0
+
+        # Seconds every pass over all matches took
+        self.tickTimes = deque(maxlen=TICKSTATS)
+        self.lateTicks = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handleConnection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.ticker = asyncio.create_task(self.runTicker())
+
+    async def close(self):
+        self.ticker.cancel()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def serveForever(self):
+        await self.start()
+        print(f'Versus server on {self.host}:{self.port}')
+        await self.server.serve_forever()
+
+    async def handleConnection(self, reader, writer):
+        connection = PlayerConnection(reader, writer)
+        try:
+            messageType, payload = await readMessage(reader)
+            if messageType != MSG_HELLO or payload[:1] != bytes((PROTOCOLVERSION,)):
+                return
+            connection.bytesReceived += 3 + len(payload)
+            self.pair(connection)
+            while connection.connected:
+                messageType, payload = await readMessage(reader)
+                connection.bytesReceived += 3 + len(payload)
+                if messageType == MSG_INPUT:
+                    connection.queueInputs(*decodeInput(payload))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if self.waiting is connection:
+                self.waiting = None
+            connection.disconnect()
+
+    # Start a match with the player waiting for an opponent, or wait for the next one
+    def pair(self, connection):
+        if self.waiting is None or not self.waiting.connected:
+            self.waiting = connection
+            return
+        players = [self.waiting, connection]
+        self.waiting = None
+        match = Match(self.nextMatchId, self.rng.getrandbits(32), players, self.tickRate, self.maxTicks)
+        self.nextMatchId += 1
+        self.matches[match.id] = match
+        match.start()
+
+    def tickMatches(self):
+        finished = []
+        for match in self.matches.values():
+            match.tick()
+            if match.isFinished:
+                finished.append(match)
+        for match in finished:
+            del self.matches[match.id]
+            self.matchesFinished += 1
+            self.matchTicks += match.versus.ticks
+            self.bytesSent += sum(connection.bytesSent for connection in match.players)
+            self.bytesReceived += sum(connection.bytesReceived for connection in match.players)
+
+    # One task steps all matches at the tick rate
+    async def runTicker(self):
+        loop = asyncio.get_running_loop()
+        timestep = FixedTimestep(self.tickRate, clock=loop.time)
+        while True:
+            ticks = timestep.advance()
+            if ticks > 1:
+                self.lateTicks += ticks - 1
+            for _ in range(ticks):
+                started = time.perf_counter()
+                self.tickMatches()
+                self.tickTimes.append(time.perf_counter() - started)
+            await asyncio.sleep(max(timestep.tickDuration - timestep.accumulator, 0))
+
+    # p50, p95 and p99 seconds of a pass over all matches, over the last TICKSTATS ticks
+    def tickPercentiles(self):
+        values = sorted(self.tickTimes)
+        return tuple(percentile(values, p) for p in (50, 95, 99))
+
+    # Average bytes per second of match time, both directions and both players together
+    def bytesPerMatchSecond(self):
+        if self.matchTicks == 0:
+            return 0.0
+        return (self.bytesSent + self.bytesReceived) / (self.matchTicks / self.tickRate)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Versus server for the Tetris clone.')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(VersusServer(args.host, args.port).serveForever())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
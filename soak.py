@@ -0,0 +1,229 @@
+'''
+Soak test of the game loop: memory, allocations and garbage collection over long sessions.
+
+main.py --soak PIECES runs the real game loop (under the SDL dummy video and audio drivers unless
+others are set) until PIECES pieces locked, with SoakProfiler in place of the frame profiler.
+The games are the autoplayer's, played headless up front with fixed seeds and then watched as
+in-memory replays, so every run plays the same games and neither the autoplayer's search nor its
+transposition cache end up in the numbers. On top of the frame phases SoakProfiler records:
+
+- bytes allocated per frame: the tracemalloc peak above the traced memory at the start of the
+  frame, i.e. what the short-lived objects of a frame take up, and the net change in allocated
+  memory blocks (what a frame leaves behind),
+- every garbage collection with its generation and pause, from gc.callbacks,
+- tracemalloc snapshots after the first WARMUPPIECES pieces (caches of sprites, text and fonts
+  fill up during those) and at CHECKPOINTS points over the rest of the run, taken between games,
+  giving memory growth per 1000 pieces and the source lines it comes from.
+
+Allocations of this module, of the frame profiler (its rolling windows only churn) and of
+tracemalloc itself are left out of the snapshots. The summary can be stored as a JSON baseline;
+later runs are compared to it metric by metric and every metric that got worse by more than its
+tolerance (see TOLERANCES) is reported as a regression.
+'''
+import array, fnmatch, gc, json, sys, time, tracemalloc
+from collections import namedtuple
+
+from game import GameState, LEVELUPSPEEDSTEP
+from policies import makeAIPolicy
+import profiler
+from profiler import FrameProfiler, percentile
+from replay import Replay
+
+WARMUPPIECES = 50
+CHECKPOINTS = 4     # Snapshots after the warm-up, spread evenly over the rest of the run
+TOPLINES = 10       # Source lines with the most memory growth in the report
+GENERATIONS = (0, 1, 2)
+
+PlannedGame = namedtuple('PlannedGame', 'replay pieces')
+
+# metric -> (relative, absolute): a run regresses on a metric when it is above baseline * (1 + relative) + absolute.
+# Counts and bytes hardly vary between runs; pauses are timings and get more room. Full (generation 2) collections
+# are rare enough that a run may see none at all, so their absolute parts are floors that a baseline of zero
+# still allows a full collection (and its pause) under.
+TOLERANCES = {
+    'frameAllocBytes.p50': (0.2, 1024),
+    'frameAllocBytes.p99': (0.2, 4096),
+    'frameBlocks.mean': (0.2, 1),
+    'growthBytesPer1000Pieces': (0.5, 16384),
+    'gc0.perThousandFrames': (0.2, 1),
+    'gc1.perThousandFrames': (0.2, 0.5),
+    'gc2.perThousandFrames': (0.2, 2),
+    'gc0.pauseUs.p99': (1.0, 200),
+    'gc1.pauseUs.p99': (1.0, 500),
+    'gc2.pauseUs.max': (1.0, 20000),
+}
+
+class SoakProfiler(FrameProfiler):
+    def __init__(self, pieces, warmupPieces=WARMUPPIECES, checkpoints=CHECKPOINTS):
+        # No per-frame trace: it would grow with the run and show up as a leak
+        super().__init__(keepTrace=False)
+        warmup = min(warmupPieces, pieces // 2)
+        step = (pieces - warmup) / checkpoints
+        self.checkpointPieces = [warmup + round(step * index) for index in range(checkpoints + 1)]
+
+        # Locked pieces of the whole run, set by the soak loop at every checkpoint
+        self.pieces = 0
+
+        self.frameAllocBytes = array.array('q')
+        self.frameBlocks = array.array('q')
+        self.frameStartMemory = None
+        self.frameStartBlocks = None
+        self.gcPauses = {generation: array.array('q') for generation in GENERATIONS}
+        self.gcStart = None
+
+        # (pieces, frames, traced bytes) at every checkpoint; snapshots of the first and the last one
+        self.checkpoints = []
+        self.firstSnapshot = None
+        self.lastSnapshot = None
+        # The frame profiler's rolling windows churn ints as samples come and go, which reads as noise, not growth
+        self.filters = (tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, profiler.__file__),
+                        tracemalloc.Filter(False, tracemalloc.__file__),
+                        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'), tracemalloc.Filter(False, '<unknown>'))
+        self.startTime = None
+        self.seconds = 0.0
+
+    def start(self):
+        tracemalloc.start()
+        # Filtering compiles and caches the filename patterns; done once here so the first checkpoint doesn't
+        # count them as growth
+        for traceFilter in self.filters:
+            fnmatch.fnmatch(traceFilter.filename_pattern, traceFilter.filename_pattern)
+        gc.callbacks.append(self._onCollect)
+        self.startTime = time.perf_counter()
+
+    def stop(self):
+        self.endFrame()
+        gc.callbacks.remove(self._onCollect)
+        tracemalloc.stop()
+        self.seconds = time.perf_counter() - self.startTime
+
+    def _onCollect(self, phase, info):
+        if phase == 'start':
+            self.gcStart = time.perf_counter_ns()
+        elif self.gcStart is not None:
+            self.gcPauses[info['generation']].append(time.perf_counter_ns() - self.gcStart)
+            self.gcStart = None
+
+    def startFrame(self):
+        self.endFrame()
+        super().startFrame()
+        # Counted from here, after the profiler's own work
+        tracemalloc.reset_peak()
+        self.frameStartMemory = tracemalloc.get_traced_memory()[0]
+        self.frameStartBlocks = sys.getallocatedblocks()
+
+    # Close the frame being measured, if any; the next startFrame starts a new one
+    def endFrame(self):
+        if self.frameStartMemory is not None:
+            peak = tracemalloc.get_traced_memory()[1]
+            self.frameAllocBytes.append(peak - self.frameStartMemory)
+            self.frameBlocks.append(sys.getallocatedblocks() - self.frameStartBlocks)
+            self.frameStartMemory = None
+        if self.frameStart is not None:
+            self._endFrame(time.perf_counter_ns())
+            self.frameStart = None
+
+    # Snapshot of the memory in use; called between games, with self.pieces up to date
+    def checkpoint(self):
+        self.endFrame()
+        snapshot = tracemalloc.take_snapshot().filter_traces(self.filters)
+        size = sum(stat.size for stat in snapshot.statistics('filename'))
+        self.checkpoints.append((self.pieces, self.frames, size))
+        if self.firstSnapshot is None:
+            self.firstSnapshot = snapshot
+        else:
+            self.lastSnapshot = snapshot
+
+    # Flat metric -> number dict of the run, the format of baselines
+    def memorySummary(self):
+        frames = len(self.frameAllocBytes)
+        allocs = sorted(self.frameAllocBytes)
+        summary = {'pieces': self.pieces, 'frames': frames, 'seconds': round(self.seconds, 1),
+                   'frameAllocBytes.mean': sum(allocs) / max(1, frames),
+                   'frameAllocBytes.p50': percentile(allocs, 50),
+                   'frameAllocBytes.p99': percentile(allocs, 99),
+                   'frameAllocBytes.max': allocs[-1] if allocs else 0,
+                   'frameBlocks.mean': sum(self.frameBlocks) / max(1, frames)}
+
+        (firstPieces, _, firstSize), (lastPieces, _, lastSize) = self.checkpoints[0], self.checkpoints[-1]
+        summary['tracedBytes'] = lastSize
+        summary['growthBytesPer1000Pieces'] = (lastSize - firstSize) * 1000 / max(1, lastPieces - firstPieces)
+
+        for generation in GENERATIONS:
+            pauses = sorted(self.gcPauses[generation])
+            summary[f'gc{generation}.collections'] = len(pauses)
+            summary[f'gc{generation}.perThousandFrames'] = len(pauses) * 1000 / max(1, frames)
+            summary[f'gc{generation}.pauseUs.p99'] = percentile(pauses, 99) / 1e3
+            summary[f'gc{generation}.pauseUs.max'] = (pauses[-1] if pauses else 0) / 1e3
+        return summary
+
+    # Source lines whose memory grew the most between the first and the last checkpoint
+    def topGrowth(self, count=TOPLINES):
+        if self.lastSnapshot is None:
+            return []
+        stats = self.lastSnapshot.compare_to(self.firstSnapshot, 'lineno')
+        return [stat for stat in stats if stat.size_diff > 0][:count]
+
+# Autoplayer games played headless as in-memory replays, cut off where a checkpoint is due (a game that goes on
+# continues as a new game after it). Returns [(replays, pieces locked after them)], one entry per checkpoint.
+def planGames(checkpointPieces, width, height, randomizer, lookahead):
+    segments = []
+    seed = 0
+    locked = 0
+    for target in checkpointPieces:
+        replays = []
+        while locked < target:
+            replays.append(planGame(seed, target - locked, width, height, randomizer, lookahead))
+            locked += replays[-1].pieces
+            seed += 1
+        segments.append(([replay.replay for replay in replays], locked))
+    return segments
+
+def planGame(seed, maxPieces, width, height, randomizer, lookahead):
+    state = GameState(seed, width, height, LEVELUPSPEEDSTEP, randomizer, lookahead)
+    policy = makeAIPolicy(seed)
+    records = []
+    previous = None
+    while not state.isGameOver and state.pieces < maxPieces:
+        inputs = policy(state)
+        if inputs != previous:
+            records.append((state.ticks, inputs))
+            previous = inputs
+        state.step(inputs)
+    replay = Replay(seed, width, height, LEVELUPSPEEDSTEP, lookahead, randomizer, records, state.ticks, state.score)
+    return PlannedGame(replay, state.pieces)
+
+# Metrics of summary worse than in baseline by more than their tolerance, as (metric, baseline, value)
+def findRegressions(summary, baseline):
+    regressions = []
+    for metric, (relative, absolute) in TOLERANCES.items():
+        if metric in baseline and metric in summary and summary[metric] > baseline[metric] * (1 + relative) + absolute:
+            regressions.append((metric, baseline[metric], summary[metric]))
+    return regressions
+
+def loadBaseline(path):
+    with open(path) as file:
+        return json.load(file)['summary']
+
+def saveBaseline(path, summary):
+    with open(path, 'w') as file:
+        json.dump({'summary': summary, 'tolerances': TOLERANCES, 'python': sys.version.split()[0]}, file, indent=1)
+
+def printReport(profiler, summary, baseline=None, out=sys.stdout):
+    print(f"{summary['pieces']} pieces, {summary['frames']} frames in {summary['seconds']} s", file=out)
+    for metric, value in summary.items():
+        if metric in ('pieces', 'frames', 'seconds'):
+            continue
+        line = f'  {metric:<28} {value:>14,.1f}'
+        if baseline is not None and metric in baseline:
+            line += f'   baseline {baseline[metric]:>14,.1f}'
+        print(line, file=out)
+
+    print('memory at the checkpoints (pieces, frames, traced bytes):', file=out)
+    for pieces, frames, size in profiler.checkpoints:
+        print(f'  {pieces:>8} {frames:>10} {size:>14,}', file=out)
+    growth = profiler.topGrowth()
+    if growth:
+        print('most growth since the first checkpoint:', file=out)
+        for stat in growth:
+            print(f'  {stat}', file=out)
@@ -0,0 +1,63 @@
+'''
+Bounded LRU cache for surfaces that depend only on their content (rendered text, preview
+windows), plus a cache of loaded fonts. Hit/miss counters show whether per-frame rendering
+is really gone.
+'''
+from collections import OrderedDict
+
+import pygame
+
+class SurfaceCache:
+    def __init__(self, maxSize=64):
+        self.maxSize = maxSize
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Return surface stored under key, creating it with createSurface() on a miss
+    def get(self, key, createSurface):
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = createSurface()
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.maxSize:
+            self.surfaces.popitem(last=False)
+            self.evictions += 1
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+    def resetStats(self):
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self.surfaces), 'hitRate': self.hits / lookups if lookups else 0.0}
+
+SURFACECACHE = SurfaceCache()
+
+# (name or path, size, isSysFont) -> pygame.font.Font
+FONTS = {}
+
+def getFont(path, size):
+    key = (path, size, False)
+    if key not in FONTS:
+        FONTS[key] = pygame.font.Font(path, size)
+    return FONTS[key]
+
+def getSysFont(name, size):
+    key = (name, size, True)
+    if key not in FONTS:
+        FONTS[key] = pygame.font.SysFont(name, size)
+    return FONTS[key]
+
+def renderText(font, text, color, background=None, cache=SURFACECACHE):
+    return cache.get(('text', font, text, color, background), lambda: font.render(text, True, color, background))
@@ -0,0 +1,195 @@
+'''
+Batched game engine: steps B games at once with NumPy, for policy tuning over thousands of
+boards. Needs numpy, which the game itself doesn't.
+
+The playfields are one (B, height, width) uint8 array (0 = empty, otherwise piece index + 1)
+and everything else GameState keeps per game is a length B array. step() applies the same rules
+as GameState.step (gravity, soft and hard drop, shifts and move delay, rotation and move checks,
+lock, line clear, level up and game over) to the whole batch with array operations, so a batch
+fed with the same seeds and inputs ends exactly where the scalar games do. Only drawing the next piece
+stays a Python loop, over the games that locked a piece in that tick.
+'''
+import numpy as np
+
+from board import BOARDWIDTH, BOARDHEIGHT
+from game import (INPUT_LEFT, INPUT_RIGHT, INPUT_DOWN, INPUT_ROTATE, INPUT_HARDDROP, INPUT_SHIFTLEFT, INPUT_SHIFTRIGHT,
+                  INITIALFALLINGSPEED, SOFTDROPFALLINGSPEED,
+                  LEVELUPSPEEDSTEP, MAXLEVEL, MOVEDELAY, FIRSTSPAWNY, SPAWNY, spawnX)
+from pieces import PIECETABLES
+from randomizers import PieceSource
+
+MAXROTATIONS = max(len(table.rotations) for table in PIECETABLES)
+CELLS = 4   # Blocks in every piece
+
+# Cell offsets and bounds of every (piece, rotation); rotations past the last one of a piece are never used
+CELLDX = np.zeros((len(PIECETABLES), MAXROTATIONS, CELLS), np.int32)
+CELLDY = np.zeros((len(PIECETABLES), MAXROTATIONS, CELLS), np.int32)
+MINDY = np.zeros((len(PIECETABLES), MAXROTATIONS), np.int32)
+ROTATIONCOUNT = np.array([len(table.rotations) for table in PIECETABLES], np.int32)
+for table in PIECETABLES:
+    for rotationIndex, rotation in enumerate(table.rotations):
+        CELLDX[table.index, rotationIndex] = [dx for dx, dy in rotation.cells]
+        CELLDY[table.index, rotationIndex] = [dy for dx, dy in rotation.cells]
+        MINDY[table.index, rotationIndex] = rotation.minDy
+
+class BatchedGameState:
+    def __init__(self, seeds, width=BOARDWIDTH, height=BOARDHEIGHT, levelUpSpeedStep=LEVELUPSPEEDSTEP,
+                 randomizer='uniform'):
+        self.seeds = list(seeds)
+        self.size = size = len(self.seeds)
+        self.width = width
+        self.height = height
+        self.levelUpSpeedStep = levelUpSpeedStep
+        self.games = np.arange(size)
+
+        self.boards = np.zeros((size, height, width), np.uint8)
+        self.pieceSources = [PieceSource(seed, randomizer) for seed in self.seeds]
+
+        # Current piece of every game
+        self.table = np.zeros(size, np.int32)
+        self.rotation = np.zeros(size, np.int32)
+        self.x = np.full(size, spawnX(width), np.int32)
+        self.y = np.full(size, FIRSTSPAWNY, np.int32)
+
+        self.fallingTimer = np.zeros(size, np.int32)
+        self.fallingSpeed = np.full(size, INITIALFALLINGSPEED, np.int32)
+        self.isSoftDropping = np.zeros(size, bool)
+        self.moveTicker = np.zeros(size, np.int32)
+
+        self.score = np.zeros(size, np.int32)
+        self.level = np.ones(size, np.int32)
+        self.lines = np.zeros(size, np.int32)
+        self.pieces = np.zeros(size, np.int32)
+        self.ticks = np.zeros(size, np.int32)
+        self.isGameOver = np.zeros(size, bool)
+
+        self._spawn(self.games, FIRSTSPAWNY)
+
+    def _spawn(self, games, y):
+        for game in games:
+            self.table[game] = self.pieceSources[game].next().index
+        self.rotation[games] = 0
+        self.x[games] = spawnX(self.width)
+        self.y[games] = y
+
+    # Row masks of one board, as in Board.rows
+    def boardRows(self, game):
+        weights = 1 << np.arange(self.width)
+        return [int(mask) for mask in (self.boards[game] != 0) @ weights]
+
+    # Absolute cell coordinates (len(games), CELLS) of the pieces of games in the given rotation at x, y
+    def _cells(self, games, rotation, x, y):
+        table = self.table[games]
+        return x[:, None] + CELLDX[table, rotation], y[:, None] + CELLDY[table, rotation]
+
+    # Occupancy of board cells; cells outside the board read as `outside`
+    def _occupied(self, games, cellX, cellY, outside):
+        inside = (cellX >= 0) & (cellX < self.width) & (cellY >= 0) & (cellY < self.height)
+        values = self.boards[games[:, None], np.clip(cellY, 0, self.height - 1), np.clip(cellX, 0, self.width - 1)] != 0
+        return np.where(inside, values, outside)
+
+    # checkCollisionsWithBottom for every game in games
+    def _touchesGround(self, games):
+        cellX, cellY = self._cells(games, self.rotation[games], self.x[games], self.y[games])
+        below = (cellY >= self.height - 1) | ((cellY >= -1) & self._occupied(games, cellX, cellY + 1, False))
+        return below.any(axis=1)
+
+    # checkCollisionsAtDestination (Board.masksCollide): a cell on a settled block, off the sides or below the floor
+    def _collides(self, games, rotation, x):
+        cellX, cellY = self._cells(games, rotation, x, self.y[games])
+        outside = (cellX < 0) | (cellX >= self.width) | (cellY >= self.height)
+        return (outside | self._occupied(games, cellX, cellY, False)).any(axis=1)
+
+    def step(self, inputs):
+        inputs = np.asarray(inputs)
+        games = self.games[~self.isGameOver]
+        if len(games) == 0:
+            return
+        inputs = inputs[games]
+        self.ticks[games] += 1
+
+        # Gravity; pieces resting on the ground lock instead
+        speed = np.where(self.isSoftDropping[games], SOFTDROPFALLINGSPEED, self.fallingSpeed[games])
+        touching = self._touchesGround(games)
+        falling = games[~touching & (self.fallingTimer[games] == speed)]
+        self.y[falling] += 1
+        locking = games[touching]
+        if len(locking):
+            self._lock(locking)
+
+        # Horizontal movement: a shift input moves every step, a held key only when the move delay ran out
+        shiftLeft = inputs & INPUT_SHIFTLEFT != 0
+        shiftRight = inputs & INPUT_SHIFTRIGHT != 0
+        isShift = shiftLeft | shiftRight
+        held = ~isShift & (self.moveTicker[games] == 0)
+        moveRight = shiftRight | (held & (inputs & INPUT_RIGHT != 0))
+        moveLeft = ~moveRight & (shiftLeft | (held & (inputs & INPUT_LEFT != 0)))
+        direction = moveRight.astype(np.int32) - moveLeft.astype(np.int32)
+
+        self.isSoftDropping[games] = inputs & INPUT_DOWN != 0
+
+        rotating = games[inputs & INPUT_ROTATE != 0]
+        if len(rotating):
+            nextRotation = (self.rotation[rotating] + 1) % ROTATIONCOUNT[self.table[rotating]]
+            allowed = ~self._collides(rotating, nextRotation, self.x[rotating])
+            self.rotation[rotating[allowed]] = nextRotation[allowed]
+
+        isMoving = direction != 0
+        moving = games[isMoving]
+        if len(moving):
+            newX = self.x[moving] + direction[isMoving]
+            allowed = ~self._collides(moving, self.rotation[moving], newX)
+            self.x[moving[allowed]] = newX[allowed]
+            # Only moves from held keys restart the move delay
+            self.moveTicker[moving[allowed & ~isShift[isMoving]]] = MOVEDELAY
+
+        hardDropping = games[inputs & INPUT_HARDDROP != 0]
+        if len(hardDropping):
+            # Move every dropping piece down a row at a time until all of them rest on something
+            falling = hardDropping
+            while len(falling):
+                falling = falling[~self._touchesGround(falling)]
+                self.y[falling] += 1
+            self._lock(hardDropping)
+
+        # Falling timer wraps with the speed of the soft drop state just set
+        self.fallingTimer[games] += 1
+        speed = np.where(self.isSoftDropping[games], SOFTDROPFALLINGSPEED, self.fallingSpeed[games])
+        self.fallingTimer[games[self.fallingTimer[games] > speed]] = 0
+        self.moveTicker[games] = np.maximum(self.moveTicker[games] - 1, 0)
+
+        # Game over when a piece sticking out of the top rests on something
+        sticksOut = games[self.y[games] + MINDY[self.table[games], self.rotation[games]] < 0]
+        if len(sticksOut):
+            self.isGameOver[sticksOut[self._touchesGround(sticksOut)]] = True
+
+    def _lock(self, games):
+        cellX, cellY = self._cells(games, self.rotation[games], self.x[games], self.y[games])
+        # Like Board.place, cells above the top are dropped
+        visible = (cellY >= 0) & (cellY < self.height)
+        gameIndex = np.broadcast_to(games[:, None], cellX.shape)
+        self.boards[gameIndex[visible], cellY[visible], cellX[visible]] = (self.table[games] + 1)[:, None].repeat(CELLS, 1)[visible]
+        self.pieces[games] += 1
+
+        # Line clear: full rows go to the top (stable sort keeps the order of the others) and are emptied
+        boards = self.boards[games]
+        full = boards.all(axis=2)
+        cleared = full.sum(axis=1)
+        clearing = cleared > 0
+        if clearing.any():
+            order = np.argsort(~full[clearing], axis=1, kind='stable')
+            compacted = np.take_along_axis(boards[clearing], order[:, :, None], axis=1)
+            compacted[np.arange(self.height)[None, :] < cleared[clearing][:, None]] = 0
+            self.boards[games[clearing]] = compacted
+            self.lines[games] += cleared
+            self.score[games] += 10*cleared
+
+        # checkIflevelUp, repeated while it holds
+        for _ in range(MAXLEVEL):
+            levelUp = games[(self.score[games] >= 100*self.level[games]) & (self.level[games] < MAXLEVEL)]
+            if len(levelUp) == 0:
+                break
+            self.level[levelUp] += 1
+            self.fallingSpeed[levelUp] = np.maximum(self.fallingSpeed[levelUp] - self.levelUpSpeedStep, 0)
+
+        self._spawn(games, SPAWNY)
@@ -0,0 +1,72 @@
+'''
+Two player versus rules on top of GameState: both players get the same piece sequence, and the
+rows one player clears are sent to the other as garbage rows rising from the bottom of their
+board, with one hole in a column picked by the match's own RNG. Whoever tops out first loses.
+
+VersusMatch is headless and fully determined by its seed and the inputs of both players, so the
+server (server.py) runs it as the authoritative simulation of a networked match.
+'''
+import random
+
+from board import BOARDWIDTH, BOARDHEIGHT
+from game import GameState, EVENT_CLEAR, LEVELUPSPEEDSTEP
+
+PLAYERS = 2
+
+# Garbage rows sent for clearing 0, 1, 2, 3 and 4 rows at once
+GARBAGEFORLINES = (0, 0, 1, 2, 4)
+
+# VersusMatch.winner of a match both players lost in the same tick
+DRAW = -1
+
+# Rows sent to the opponent for clearing that many rows with one piece
+def garbageForLines(lines):
+    return GARBAGEFORLINES[min(lines, len(GARBAGEFORLINES) - 1)]
+
+class VersusMatch:
+    def __init__(self, seed=None, width=BOARDWIDTH, height=BOARDHEIGHT, levelUpSpeedStep=LEVELUPSPEEDSTEP,
+                 randomizer='bag', lookahead=1):
+        self.seed = seed
+        self.states = [GameState(seed, width, height, levelUpSpeedStep, randomizer, lookahead) for _ in range(PLAYERS)]
+        self.rng = random.Random(seed)
+        self.ticks = 0
+
+        # Garbage rows each player has sent so far
+        self.garbageSent = [0]*PLAYERS
+
+        # Index of the winning player, DRAW, or None while the match goes on
+        self.winner = None
+
+    @property
+    def isOver(self):
+        return self.winner is not None
+
+    # Step both games with their inputs, then deliver the garbage produced by this tick's line clears
+    def step(self, inputs):
+        if self.isOver:
+            return
+        self.ticks += 1
+        states = self.states
+        for state, playerInputs in zip(states, inputs):
+            state.step(playerInputs)
+
+        for player, state in enumerate(states):
+            lines = sum(len(rows) for event, rows in state.events if event == EVENT_CLEAR)
+            count = garbageForLines(lines)
+            if count:
+                self.garbageSent[player] += count
+                states[1 - player].addGarbage(count, self.rng.randrange(state.board.width))
+
+        lost = [state.isGameOver for state in states]
+        if all(lost):
+            self.winner = DRAW
+        elif any(lost):
+            self.winner = lost.index(False)
+
+# Play a match to the end; policies[player](state) returns that player's inputs for the next step
+def runUntilMatchOver(match, policies, maxTicks=None):
+    while not match.isOver:
+        if maxTicks is not None and match.ticks >= maxTicks:
+            break
+        match.step([policy(state) for policy, state in zip(policies, match.states)])
+    return match